@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Measures FactoryEnvPool throughput in env-steps/sec from 1 to N worker processes."""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from factory import FactoryEnvPool
+
+def throughput(num_workers: int, envs_per_worker: int, steps: int, engine: str) -> float:
+    num_envs = num_workers * envs_per_worker
+    rng = np.random.default_rng(0)
+    with FactoryEnvPool(num_envs, num_workers=num_workers, seed=0, engine=engine) as pool:
+        pool.reset()
+        pool.step(rng.integers(0, pool.action_space.n, num_envs))  # Warm up
+        start = time.perf_counter()
+        for _ in range(steps):
+            pool.step(rng.integers(0, pool.action_space.n, num_envs))
+        return num_envs * steps / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--envs-per-worker", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--engine", default="array")
+    args = parser.parse_args()
+
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    workers = sorted({1, *[2 ** i for i in range(1, 16) if 2 ** i < args.max_workers], args.max_workers})
+    base = None
+    print(f"{'workers':>8} {'steps/sec':>12} {'scaling':>8}")
+    for n in workers:
+        rate = throughput(n, args.envs_per_worker, args.steps, args.engine)
+        base = base or rate
+        print(f"{n:>8} {rate:>12.0f} {rate / base:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Measures Factory steps/sec and reset time versus map size at a fixed equipment count."""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from factory.factory import Factory
+from factory.terrain import TerrainGenerator
+from factory.types import EquipmentType, ResourceType
+
+def build_layout(factory: Factory, map_size: tuple[int, int], num_mines: int, seed: int):
+    """Builds `num_mines` mines, each feeding a short belt line, around the middle of the map."""
+    rng = np.random.default_rng(seed)
+    cx, cy = map_size[0] // 2, map_size[1] // 2
+    for x, y in rng.integers(-12, 12, size=(num_mines, 2)):
+        x, y = int(cx + x), int(cy + y)
+        factory.add_resource(x, y, ResourceType.IRON_DEPOSIT, 10**6)
+        factory.build_equipment(EquipmentType.MINE, (x, y))
+        for i in range(1, 4):
+            factory.build_equipment(EquipmentType.RIGHT_BELT, (x + i, y))
+
+def measure(map_size: tuple[int, int], engine: str, chunk_size, num_mines: int, steps: int) -> tuple[float, float]:
+    factory = Factory(map_size=map_size, engine=engine, chunk_size=chunk_size)
+    terrain = TerrainGenerator()
+    start = time.perf_counter()
+    factory.reset()
+    factory.set_terrain(terrain, 0)
+    reset_time = time.perf_counter() - start
+
+    build_layout(factory, map_size, num_mines, 0)
+    factory.step()  # Warm up
+    start = time.perf_counter()
+    for _ in range(steps):
+        factory.step()
+    return steps / (time.perf_counter() - start), reset_time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[32, 128, 512, 1024, 2048, 4096])
+    parser.add_argument("--mines", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--max-dense", type=int, default=2048, help="largest map size to run without chunks")
+    parser.add_argument("--max-object", type=int, default=1024, help="largest map size to run the object engine on")
+    args = parser.parse_args()
+
+    configs = [("object", None), ("array", None), ("array", args.chunk_size)]
+    print(f"{'map':>10} {'engine':>14} {'steps/sec':>12} {'reset ms':>10}")
+    for size in args.sizes:
+        for engine, chunk_size in configs:
+            if chunk_size is None and size > args.max_dense:
+                continue
+            if engine == "object" and size > args.max_object:
+                continue
+            rate, reset_time = measure((size, size), engine, chunk_size, args.mines, args.steps)
+            name = engine if chunk_size is None else f"{engine}/chunked"
+            print(f"{f'{size}x{size}':>10} {name:>14} {rate:>12.0f} {reset_time * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Measures import and FactoryEnv construction time in fresh interpreters against a budget."""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import factory.factory
+core_import = time.perf_counter() - start
+heavy = sorted(m for m in ("cv2", "gymnasium", "perlin_noise") if m in sys.modules)
+
+start = time.perf_counter()
+from factory import FactoryEnv
+env_import = time.perf_counter() - start
+
+start = time.perf_counter()
+env = FactoryEnv(asset_path="assets")
+construct = time.perf_counter() - start
+start = time.perf_counter()
+FactoryEnv(asset_path="assets")
+construct_again = time.perf_counter() - start
+print(json.dumps(dict(core_import=core_import, heavy=heavy, env_import=env_import,
+    construct=construct, construct_again=construct_again)))
+"""
+
+def probe() -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--core-import-ms", type=float, default=250.0,
+        help="budget for `import factory.factory`")
+    parser.add_argument("--construct-ms", type=float, default=50.0,
+        help="budget for constructing a FactoryEnv once the tile atlas is cached")
+    args = parser.parse_args()
+
+    probe()  # Warm the tile atlas cache
+    runs = [probe() for _ in range(args.repeat)]
+    results = {key: min(run[key] for run in runs) * 1e3 for key in
+        ("core_import", "env_import", "construct", "construct_again")}
+    heavy = runs[0]["heavy"]
+    for key, ms in results.items():
+        print(f"{key:>16}: {ms:8.2f} ms")
+    print(f"{'heavy imports':>16}: {', '.join(heavy) or 'none'}")
+
+    failures = []
+    if heavy:
+        failures.append(f"factory.factory pulled in {heavy}")
+    if results["core_import"] > args.core_import_ms:
+        failures.append(f"core import {results['core_import']:.1f} ms > {args.core_import_ms} ms")
+    if results["construct"] > args.construct_ms:
+        failures.append(f"construction {results['construct']:.1f} ms > {args.construct_ms} ms")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
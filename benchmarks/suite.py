@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""Benchmarks the simulation, rendering and reset hot paths and checks them against a baseline.
+
+Every case builds its factory from a fixed seed, so runs are comparable
+across commits. Results are printed and written as JSON; with `--baseline`
+any case slower than the baseline by more than `--threshold` is reported
+and the script exits with status 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from factory.env import FactoryEnv, FactoryAction
+from factory.factory import Factory
+from factory.types import EquipmentType, ResourceType
+
+def build_layout(factory: Factory, map_size: tuple[int, int], num_equipment: int, seed: int):
+    """Builds about `num_equipment` pieces of equipment as mine -> belt line -> furnace clusters.
+
+    Mines get deposits of their own so every cluster keeps producing for
+    the length of a benchmark.
+    """
+    rng = np.random.default_rng(seed)
+    built = 0
+    while built < num_equipment:
+        x, y = (int(v) for v in rng.integers(2, np.array(map_size) - 8))
+        length = int(rng.integers(1, 5))
+        factory.add_resource(x, y, ResourceType.COAL_DEPOSIT, 10**6)
+        factory.add_resource(x, y, ResourceType.IRON_DEPOSIT, 10**6)
+        factory.build_equipment(EquipmentType.MINE, (x, y))
+        for i in range(1, length + 1):
+            factory.build_equipment(EquipmentType.RIGHT_BELT, (x + i, y))
+        factory.build_equipment(EquipmentType.FURNACE, (x + length + 1, y + 1))
+        built += length + 2
+
+def timed(fn, number: int, repeat: int) -> float:
+    """Best seconds per call of `fn` over `repeat` runs of `number` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+def bench_factory_step(args):
+    for engine in ("object", "array", "graph"):
+        for n in args.equipment:
+            if engine == "object" and n > args.max_object:
+                continue
+            map_size = (max(32, int(4 * n ** 0.5) + 16),) * 2
+            factory = Factory(map_size=map_size, engine=engine)
+            build_layout(factory, map_size, n, seed=0)
+            for _ in range(10):
+                factory.step()
+            yield f"factory_step/{engine}/{n}", 1.0 / timed(factory.step, args.number, args.repeat), "steps/s"
+
+def bench_observe(args):
+    for obs_mode in ("rgb", "symbolic"):
+        env = FactoryEnv(seed=0, engine="array", obs_mode=obs_mode)
+        env.reset()
+        build_layout(env._factory, env._map_size, 40, seed=0)
+        env.step(FactoryAction.WAIT)
+        yield f"observe/{obs_mode}", timed(env.observe, args.number, args.repeat) * 1e6, "us"
+
+        def step_and_observe():
+            env._factory.step()
+            env.observe()
+        yield f"observe_after_step/{obs_mode}", timed(step_and_observe, args.number, args.repeat) * 1e6, "us"
+    env = FactoryEnv(seed=0, engine="array")
+    env.reset()
+    yield "render", timed(env.render, args.number, args.repeat) * 1e6, "us"
+
+def bench_reset(args):
+    for size in args.map_sizes:
+        for chunk_size in (None, 16):
+            env = FactoryEnv(map_size=(size, size), seed=0, engine="array", chunk_size=chunk_size)
+            name = "chunked" if chunk_size else "dense"
+            yield f"reset/{name}/{size}", timed(env.reset, max(1, args.number // 10), args.repeat) * 1e3, "ms"
+
+def scripted_policy():
+    """Repeatedly builds a mine feeding two belts into a furnace, waits, then moves on."""
+    plan = [FactoryAction.BUILD_MINE, FactoryAction.MOVE_CURSOR_LEFT, FactoryAction.BUILD_LEFT_BELT,
+        FactoryAction.MOVE_CURSOR_LEFT, FactoryAction.BUILD_LEFT_BELT, FactoryAction.MOVE_CURSOR_LEFT,
+        FactoryAction.MOVE_CURSOR_DOWN, FactoryAction.BUILD_FURNACE] + [FactoryAction.WAIT] * 24
+    while True:
+        yield from plan
+        yield from [FactoryAction.MOVE_CURSOR_UP] * 3
+
+def bench_env_step(args):
+    for engine in ("object", "array"):
+        for policy in ("random", "scripted"):
+            env = FactoryEnv(seed=0, engine=engine, max_steps=10**9)
+            env.reset()
+            rng = np.random.default_rng(0)
+            actions = iter(rng.integers(0, len(FactoryAction), 10**7)) if policy == "random" else scripted_policy()
+            seconds = timed(lambda: env.step(next(actions)), args.number, args.repeat)
+            yield f"env_step/{engine}/{policy}", 1.0 / seconds, "steps/s"
+
+    # Ticks/sec when waiting 16 ticks per step on a factory that settles into steady flows
+    env = FactoryEnv(seed=0, engine="array", max_steps=10**9)
+    env.reset()
+    build_layout(env._factory, env._map_size, 40, seed=0)
+    seconds = timed(lambda: env.fast_forward(16), args.number, args.repeat)
+    yield "env_fast_forward/array/16", 16 / seconds, "ticks/s"
+
+GROUPS = {
+    "factory_step": bench_factory_step,
+    "observe": bench_observe,
+    "reset": bench_reset,
+    "env_step": bench_env_step,
+}
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Names and slowdowns of results worse than the baseline by more than `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], result["value"]
+        # Rates should not drop, latencies should not grow
+        slowdown = old / new if result["unit"].endswith("/s") else new / old
+        if slowdown > 1.0 + threshold:
+            regressions.append(f"{name}: {old:.4g} -> {new:.4g} {result['unit']} ({slowdown:.2f}x slower)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("groups", nargs="*", help=f"benchmark groups to run out of {', '.join(GROUPS)}, all by default")
+    parser.add_argument("--number", type=int, default=100, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case, the best is kept")
+    parser.add_argument("--equipment", type=int, nargs="+", default=[16, 64, 256, 1024])
+    parser.add_argument("--max-object", type=int, default=256, help="largest layout to run the object engine on")
+    parser.add_argument("--map-sizes", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="tolerated slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+    unknown = set(args.groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    os.chdir(ROOT)
+    results = {}
+    for group in args.groups or GROUPS:
+        for name, value, unit in GROUPS[group](args):
+            results[name] = {"value": value, "unit": unit}
+            print(f"{name:>36}: {value:12.2f} {unit}")
+
+    report = {
+        "machine": {"python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "processor": platform.processor()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Compares FactoryEnv.reset() terrain generation against per-cell PerlinNoise calls."""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from perlin_noise import PerlinNoise
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from factory.factory import Factory
+from factory.terrain import TerrainGenerator
+from factory.types import ResourceType
+
+def per_cell_reset(factory: Factory, map_size, coal_seed, iron_seed):
+    """The terrain loop `FactoryEnv.reset` used before TerrainGenerator."""
+    factory.reset()
+    coal_noise = PerlinNoise(octaves=6, seed=coal_seed)
+    iron_noise = PerlinNoise(octaves=6, seed=iron_seed)
+    for x in range(map_size[0]):
+        for y in range(map_size[1]):
+            if coal_noise([x / 64, y / 64]) > 0.2:
+                factory.add_resource(x, y, ResourceType.COAL_DEPOSIT, 250)
+            if iron_noise([x / 64, y / 64]) > 0.2:
+                factory.add_resource(x, y, ResourceType.IRON_DEPOSIT, 250)
+
+def vectorized_reset(factory: Factory, map_size, generator, seed):
+    factory.reset()
+    factory.set_deposits(generator.generate(map_size, seed))
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[32, 64, 128, 256, 512])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-per-cell-size", type=int, default=256,
+        help="skip the slow per-cell path above this map size")
+    args = parser.parse_args()
+
+    generator = TerrainGenerator()
+    coal_seed, iron_seed = generator.noise_seeds(0)
+    print(f"{'size':>6} {'per-cell ms':>12} {'vectorized ms':>14} {'speedup':>8}")
+    for size in args.sizes:
+        map_size = (size, size)
+        factory = Factory(map_size=map_size)
+        new = timed(lambda: vectorized_reset(factory, map_size, generator, 0), args.repeat)
+        expected = factory._resources.copy()
+        if size <= args.max_per_cell_size:
+            old = timed(lambda: per_cell_reset(factory, map_size, coal_seed, iron_seed), 1)
+            assert np.array_equal(factory._resources, expected), "terrain differs from PerlinNoise"
+            print(f"{size:>6} {old * 1e3:>12.2f} {new * 1e3:>14.2f} {old / new:>7.0f}x")
+        else:
+            print(f"{size:>6} {'-':>12} {new * 1e3:>14.2f} {'-':>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Scores a policy over seeded FactoryEnv episodes, headless and in parallel.
+
+Episodes run in the worker processes of a `FactoryEnvPool`, and each step
+the policy picks the actions of every environment in one batch. Episode
+i plays the map of seed `--seed + i` with a policy seeded the same way, so
+evaluations of different checkpoints over the same seeds are comparable.
+Nothing is rendered unless the policy needs observations or `--video`
+asks for frames.
+
+    python evaluate.py --episodes 200 --envs 16 -o eval.json
+    python evaluate.py --checkpoint ~/logdir/run2/checkpoint.ckpt --episodes 200
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from factory import FactoryAction, FactoryEnvPool
+from factory.types import ResourceType
+
+class RandomPolicy:
+    """Uniformly random actions, only among those `action_masks` allows when `masked`."""
+
+    needs_obs = False
+
+    def __init__(self, num_envs: int, masked: bool = False):
+        self._masked = masked
+        self._rngs = [np.random.default_rng(0) for _ in range(num_envs)]
+
+    def reset(self, env: int, seed: int):
+        self._rngs[env] = np.random.default_rng(seed)
+
+    def __call__(self, obs, rewards, first, masks) -> np.ndarray:
+        if not self._masked:
+            return np.array([rng.integers(len(FactoryAction)) for rng in self._rngs])
+        return np.array([rng.choice(np.flatnonzero(mask)) for rng, mask in zip(self._rngs, masks)])
+
+class DreamerPolicy:
+    """Actor of a DreamerV3 checkpoint, configured like `watch.py`.
+
+    Actions are sampled with the agent's own generator, which is seeded
+    from its config, so results are reproducible for the same `--envs`.
+    """
+
+    needs_obs = True
+
+    def __init__(self, checkpoint: str, num_envs: int, env_kwargs: dict):
+        import dreamerv3
+        from dreamerv3 import embodied
+        from embodied.envs import from_gym
+        from factory import FactoryEnv
+
+        config = embodied.Config(dreamerv3.configs['defaults'])
+        config = config.update(dreamerv3.configs['medium'])
+        config = config.update({
+            'jax.prealloc': False,
+            'encoder.mlp_keys': '$^',
+            'decoder.mlp_keys': '$^',
+            'encoder.cnn_keys': 'image',
+            'decoder.cnn_keys': 'image',
+        })
+        env = dreamerv3.wrap_env(from_gym.FromGym(FactoryEnv(**env_kwargs), obs_key='image'), config)
+        self._agent = dreamerv3.Agent(env.obs_space, env.act_space, embodied.Counter(), config)
+        saved = embodied.Checkpoint()
+        saved.agent = self._agent
+        saved.load(checkpoint, keys=['agent'])
+        self._state = None
+        self._num_envs = num_envs
+
+    def reset(self, env: int, seed: int):
+        pass  # `is_first` restarts the agent's recurrent state
+
+    def __call__(self, obs, rewards, first, masks) -> np.ndarray:
+        batch = {
+            'image': obs,
+            'reward': rewards.astype(np.float32),
+            'is_first': first,
+            'is_last': np.zeros(self._num_envs, dtype=bool),
+            'is_terminal': np.zeros(self._num_envs, dtype=bool),
+        }
+        outs, self._state = self._agent.policy(batch, self._state, mode='eval')
+        return np.asarray(outs['action']).argmax(axis=-1)
+
+def evaluate(policy, seeds: list[int], num_envs: int, num_workers=None, video=None, fps=30.0, **env_kwargs) -> dict:
+    """Plays one episode per seed, `num_envs` at a time, and returns per-episode and aggregate results."""
+    from factory.replay import write_video
+
+    episodes = []
+    steps = 0
+    start = time.perf_counter()
+    observe = policy.needs_obs or video is not None
+    with FactoryEnvPool(num_envs, num_workers=num_workers, seed=seeds[0] if seeds else None, observe=observe,
+            **env_kwargs) as pool:
+        for wave in range(0, len(seeds), num_envs):
+            wave_seeds = seeds[wave:wave + num_envs]
+            live = np.arange(num_envs) < len(wave_seeds)
+            # Spare environments of the last wave replay its first map and are ignored
+            padded = wave_seeds + [wave_seeds[0]] * (num_envs - len(wave_seeds))
+            obs = pool.reset(seeds=padded)
+            for env, seed in enumerate(padded):
+                policy.reset(env, seed)
+            rewards = np.zeros(num_envs, dtype=np.float32)
+            first = np.ones(num_envs, dtype=bool)
+            returns = np.zeros(num_envs, dtype=np.float64)
+            lengths = np.zeros(num_envs, dtype=np.int64)
+            final = np.zeros((num_envs, len(ResourceType)), dtype=np.float64)
+            frames = [[obs[env].copy()] for env in range(num_envs)] if video is not None else None
+            while live.any():
+                actions = policy(obs, rewards, first, pool.action_masks())
+                actions = np.where(live, actions, FactoryAction.WAIT)
+                obs, rewards, dones, info = pool.step(actions)
+                first[:] = False
+                returns[live] += rewards[live]
+                lengths[live] += 1
+                steps += int(live.sum())
+                ended = live & dones
+                final[ended] = info['final_resources'][ended]
+                if frames is not None:
+                    for env in np.flatnonzero(live & ~dones):
+                        frames[env].append(obs[env].copy())
+                live &= ~dones
+            for env, seed in enumerate(wave_seeds):
+                episode = {
+                    "seed": seed,
+                    "return": float(returns[env]),
+                    "length": int(lengths[env]),
+                    "steel": float(final[env, ResourceType.STEEL]),
+                    "paperclips": float(final[env, ResourceType.PAPERCLIP]),
+                }
+                if frames is not None:
+                    episode["video"] = write_video(frames[env], os.path.join(video, f"seed{seed}.mp4"), fps)
+                episodes.append(episode)
+    seconds = time.perf_counter() - start
+
+    returns = np.array([episode["return"] for episode in episodes])
+    total_steps = sum(episode["length"] for episode in episodes)
+    steel = sum(episode["steel"] for episode in episodes)
+    paperclips = sum(episode["paperclips"] for episode in episodes)
+    return {
+        "episodes": len(episodes),
+        "return_mean": float(returns.mean()) if len(episodes) else 0.0,
+        "return_std": float(returns.std()) if len(episodes) else 0.0,
+        "return_min": float(returns.min()) if len(episodes) else 0.0,
+        "return_max": float(returns.max()) if len(episodes) else 0.0,
+        "steel_mean": steel / max(1, len(episodes)),
+        "paperclips_mean": paperclips / max(1, len(episodes)),
+        "steel_per_step": steel / max(1, total_steps),
+        "paperclips_per_step": paperclips / max(1, total_steps),
+        "steps": steps,
+        "seconds": seconds,
+        "steps_per_sec": steps / seconds,
+        "per_episode": episodes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", help="DreamerV3 checkpoint, a random policy without one")
+    parser.add_argument("--masked", action="store_true", help="random policy picks only valid actions")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first episode")
+    parser.add_argument("--envs", type=int, default=16, help="environments stepped per batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--engine", default="array")
+    parser.add_argument("--frame-skip", type=int, default=1)
+    parser.add_argument("--terrain-pool", help="draw maps from this pool, see scripts/build-terrain-pool")
+    parser.add_argument("--video", help="directory to write a seed<N>.mp4 of every episode to")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("-o", "--output", help="JSON file to write the results with every episode to")
+    args = parser.parse_args()
+
+    num_envs = min(args.envs, args.episodes)
+    env_kwargs = dict(max_steps=args.max_steps, engine=args.engine, frame_skip=args.frame_skip,
+        terrain_pool=args.terrain_pool)
+    if args.checkpoint:
+        policy = DreamerPolicy(os.path.expanduser(args.checkpoint), num_envs, env_kwargs)
+    else:
+        policy = RandomPolicy(num_envs, masked=args.masked)
+    if args.video:
+        os.makedirs(args.video, exist_ok=True)
+
+    seeds = list(range(args.seed, args.seed + args.episodes))
+    results = evaluate(policy, seeds, num_envs, num_workers=args.workers, video=args.video, fps=args.fps,
+        **env_kwargs)
+    results["checkpoint"] = args.checkpoint
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps({key: value for key, value in results.items() if key != "per_episode"}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,25 @@
-from .env import FactoryEnv, FactoryAction
\ No newline at end of file
+"""FactoryRL environments.
+
+Submodules such as `factory.factory` and `factory.equipment` only need
+NumPy; the gym environments are imported on first access so that the core
+simulation can be used without loading gymnasium.
+"""
+
+_LAZY = {
+    "FactoryEnv": ".env",
+    "FactoryAction": ".env",
+    "FactoryVecEnv": ".vec_env",
+    "FactoryEnvPool": ".pool",
+    "EpisodeRecorder": ".recording",
+    "ActionLog": ".recording",
+}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
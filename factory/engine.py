@@ -0,0 +1,615 @@
+from .types import EquipmentType, ResourceType
+from .equipment import Belt, Mine, Furnace
+import numpy as np
+from typing import Optional
+
+from .graph import FlowGraph
+from .world import ChunkedWorld
+
+BELT_OFFSETS = {
+    EquipmentType.LEFT_BELT: (1, 0),
+    EquipmentType.RIGHT_BELT: (-1, 0),
+    EquipmentType.UP_BELT: (0, 1),
+    EquipmentType.DOWN_BELT: (0, -1),
+}
+
+# Channel ranges touched by each kind of equipment
+DEPOSITS = slice(ResourceType.COAL_DEPOSIT, ResourceType.IRON_DEPOSIT + 1)
+ORES = slice(ResourceType.COAL_ORE, ResourceType.IRON_ORE + 1)
+ITEMS = slice(min(Belt.moveable_resources), max(Belt.moveable_resources) + 1)
+
+_NONE, _BELT, _MINE, _FURNACE = 0, 1, 2, 3
+
+ORDERS = ("build", "topological")
+
+class _Table:
+    """Growable struct-of-arrays with O(1) append and swap-remove."""
+
+    def __init__(self, **columns):
+        self._spec = columns
+        self.count = 0
+        self._capacity = 0
+        self._grow(16)
+
+    def _grow(self, capacity: int):
+        for name, (shape, dtype) in self._spec.items():
+            column = np.zeros((capacity,) + shape, dtype=dtype)
+            if self._capacity:
+                column[:self._capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self._capacity = capacity
+
+    def extend(self, **values) -> np.ndarray:
+        """Appends one row per entry of the given columns and returns their slots."""
+        n = len(next(iter(values.values())))
+        while self.count + n > self._capacity:
+            self._grow(2 * self._capacity)
+        slots = np.arange(self.count, self.count + n)
+        for name in self._spec:
+            getattr(self, name)[slots] = values.get(name, 0)
+        self.count += n
+        return slots
+
+    def keep(self, mask: np.ndarray):
+        """Drops every row whose entry in `mask` is False, preserving order."""
+        n = int(mask.sum())
+        for name in self._spec:
+            column = getattr(self, name)
+            column[:n] = column[:self.count][mask]
+        self.count = n
+
+    def snapshot(self) -> dict[str, np.ndarray]:
+        return {name: getattr(self, name)[:self.count].copy() for name in self._spec}
+
+    def load(self, columns: dict[str, np.ndarray]):
+        self.count = 0
+        self.extend(**columns)
+
+    def remove(self, slot: int) -> int:
+        """Removes a row by moving the last row into it, returns the moved row's cell or -1."""
+        self.count -= 1
+        last = self.count
+        if slot == last:
+            return -1
+        for name in self._spec:
+            column = getattr(self, name)
+            column[slot] = column[last]
+        return int(self.cell[slot])
+
+class ArrayEngine:
+    """Steps every belt, mine and furnace with batched gather/scatter operations.
+
+    Equipment is kept in flat per-type arrays addressed by cell index, so a
+    tick costs a handful of NumPy calls instead of one `process` call per
+    object. Flows match stepping the `Equipment` objects in list order: belts
+    sharing an input are served in that order, and the few belts and furnaces
+    competing for ore inside an idle furnace's window are resolved one by one.
+    Removing equipment moves the last entry into its place, the same
+    swap-remove `Factory` applies to its list of objects.
+
+    Cells index a dense (num_envs, W, H, len(ResourceType)) array, or the
+    pool of a `ChunkedWorld` when one is given.
+
+    With `order="topological"` contention is instead settled by position in
+    the belt network, see `FlowGraph`: whatever pulls from further upstream
+    goes first, ties broken by cell. Flows then no longer depend on the
+    order equipment was built in.
+    """
+
+    def __init__(self, map_size: tuple[int, int], num_envs: int = 1, world: Optional[ChunkedWorld] = None,
+            order: str = "build"):
+        if world is not None and num_envs != 1:
+            raise ValueError("A chunked world holds a single environment")
+        if order not in ORDERS:
+            raise ValueError(f"Invalid order {order!r}, expected one of {ORDERS}")
+        self._topological = order == "topological"
+        self._map_size = map_size
+        self._num_envs = num_envs
+        self._world = world
+        num_cells = len(world.flat) if world is not None else num_envs * map_size[0] * map_size[1]
+
+        self._kind = np.zeros(num_cells, dtype=np.int8)
+        self._slot = np.full(num_cells, -1, dtype=np.int64)
+        self._order = np.zeros(16, dtype=np.int64)  # Cell of each equipment by seq
+        self._count = 0
+
+        n_items = ITEMS.stop - ITEMS.start
+        self._belts = _Table(cell=((), np.int64), input=((), np.int64), seq=((), np.int64),
+            avail=((len(ResourceType),), np.float32), flow=((n_items,), np.float32))
+        self._mines = _Table(cell=((), np.int64), seq=((), np.int64),
+            flow=((DEPOSITS.stop - DEPOSITS.start,), np.float32))
+        self._furnaces = _Table(cell=((), np.int64), seq=((), np.int64), window=((9,), np.int64),
+            is_cooking=((), bool), time_left=((), np.int32))
+        self._belt_rank = None
+        self._graph = None
+        self._keys = None
+        self.changed_cells = np.zeros(0, dtype=np.int64)
+        self.profiler = None  # `StepProfiler` timing each kind of equipment, if any
+
+        # Scratch space reused across ticks, only entries in use are ever touched
+        self._cover = np.zeros(num_cells, dtype=np.int32)
+        self._old = np.zeros((num_cells, n_items), dtype=np.float32)
+
+    def cell(self, x, y, env=0):
+        """Returns the flat index of map cell (x, y) in environment `env`."""
+        if self._world is not None:
+            return self._world.cells(x, y)
+        return (env * self._map_size[0] + x) * self._map_size[1] + y
+
+    def _reserve(self, num_cells: int):
+        """Grows the per-cell arrays after the world allocated more chunks."""
+        extra = num_cells - len(self._kind)
+        if extra <= 0:
+            return
+        self._kind = np.concatenate([self._kind, np.zeros(extra, dtype=np.int8)])
+        self._slot = np.concatenate([self._slot, np.full(extra, -1, dtype=np.int64)])
+        self._cover = np.concatenate([self._cover, np.zeros(extra, dtype=np.int32)])
+        self._old = np.concatenate([self._old, np.zeros((extra,) + self._old.shape[1:], dtype=np.float32)])
+
+    def _windows(self, x: np.ndarray, y: np.ndarray, env: np.ndarray) -> np.ndarray:
+        """Cells each furnace reads from in row-major order, -1 where the window is cut off."""
+        # Mirror the slices `Furnace` reads from, including the empty window
+        # produced by a negative start index on the top and left edges.
+        w, h = self._map_size
+        dx, dy = np.divmod(np.arange(9), 3)
+        wx, wy = x[:, None] + dx - 1, y[:, None] + dy - 1
+        valid = (x[:, None] > 0) & (y[:, None] > 0) & (wx < w) & (wy < h)
+        return np.where(valid, self.cell(np.clip(wx, 0, w - 1), np.clip(wy, 0, h - 1), env[:, None]), -1)
+
+    def add(self, type: EquipmentType, pos: tuple[int, int], env: int = 0):
+        self.add_batch(np.array([type]), np.array([pos[0]]), np.array([pos[1]]), np.array([env]))
+
+    def add_batch(self, types: np.ndarray, x: np.ndarray, y: np.ndarray, env: np.ndarray):
+        """Registers equipment of the given types, later entries counting as built later."""
+        types = np.asarray(types)
+        is_belt = np.isin(types, list(BELT_OFFSETS))
+        is_mine = types == EquipmentType.MINE
+        is_furnace = types == EquipmentType.FURNACE
+        if not (is_belt | is_mine | is_furnace).all():
+            raise ValueError("Invalid equipment type")
+
+        # Resolve every cell first, a chunked world may allocate chunks for them
+        b, m, f = is_belt, is_mine, is_furnace
+        cell = self.cell(x, y, env)
+        if b.any():
+            dx = np.zeros(len(types), dtype=np.int64)
+            dy = np.zeros(len(types), dtype=np.int64)
+            for type, (ox, oy) in BELT_OFFSETS.items():
+                dx[types == type], dy[types == type] = ox, oy
+            belt_input = self.cell(x[b] + dx[b], y[b] + dy[b], env[b])
+        if f.any():
+            window = self._windows(x[f], y[f], env[f])
+        if self._world is not None:
+            self._reserve(len(self._world.flat))
+
+        seq = self._count + np.arange(len(cell))
+        while self._count + len(cell) > len(self._order):
+            self._order = np.concatenate([self._order, np.zeros_like(self._order)])
+        self._order[seq] = cell
+        self._count += len(cell)
+
+        if b.any():
+            self._slot[cell[b]] = self._belts.extend(cell=cell[b], seq=seq[b], input=belt_input)
+            self._kind[cell[b]] = _BELT
+            self._invalidate()
+        if m.any():
+            self._slot[cell[m]] = self._mines.extend(cell=cell[m], seq=seq[m])
+            self._kind[cell[m]] = _MINE
+        if f.any():
+            self._slot[cell[f]] = self._furnaces.extend(cell=cell[f], seq=seq[f], window=window)
+            self._kind[cell[f]] = _FURNACE
+            self._invalidate()
+
+    def remove(self, pos: tuple[int, int], env: int = 0):
+        cell = self.cell(pos[0], pos[1], env)
+        if cell >= len(self._kind):
+            return
+        kind = self._kind[cell]
+        if kind == _NONE:
+            return
+        table = self._table(kind)
+        seq = table.seq[self._slot[cell]]
+        moved = table.remove(self._slot[cell])
+        if moved >= 0:
+            self._slot[moved] = self._slot[cell]
+        self._invalidate()
+        self._kind[cell] = _NONE
+        self._slot[cell] = -1
+
+        # The most recently ordered equipment takes over the freed seq
+        self._count -= 1
+        if seq != self._count:
+            last = self._order[self._count]
+            self._order[seq] = last
+            self._table(self._kind[last]).seq[self._slot[last]] = seq
+
+    def _table(self, kind: int) -> _Table:
+        return {_BELT: self._belts, _MINE: self._mines, _FURNACE: self._furnaces}[kind]
+
+    def clear(self, env: Optional[int] = None):
+        """Removes all equipment, or only the equipment of environment `env`."""
+        if env is None:
+            cells = self._order[:self._count]
+            self._kind[cells] = _NONE
+            self._slot[cells] = -1
+            self._belts.count = self._mines.count = self._furnaces.count = 0
+            self._count = 0
+            self._invalidate()
+            return
+
+        # Compact the order, shifting each seq down past the removed ones
+        cells_per_env = self._map_size[0] * self._map_size[1]
+        order = self._order[:self._count]
+        dropped = np.flatnonzero(order // cells_per_env == env)
+        kept = np.delete(order, dropped)
+        self._order[:len(kept)] = kept
+        self._count = len(kept)
+        for table in (self._belts, self._mines, self._furnaces):
+            table.keep(table.cell[:table.count] // cells_per_env != env)
+            self._slot[table.cell[:table.count]] = np.arange(table.count)
+            seq = table.seq[:table.count]
+            seq -= np.searchsorted(dropped, seq)
+        self._kind[env * cells_per_env:(env + 1) * cells_per_env] = _NONE
+        self._slot[env * cells_per_env:(env + 1) * cells_per_env] = -1
+        self._invalidate()
+
+    def equipment_cells(self) -> np.ndarray:
+        """Cells of all equipment in the order it is stepped in."""
+        return self._order[:self._count].copy()
+
+    def furnace_timers(self, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Cooking flag and ticks left of the furnace on each cell, False and 0 elsewhere."""
+        cells = np.asarray(cells)
+        furnace = self._kind[cells] == _FURNACE
+        slots = self._slot[cells[furnace]]
+        is_cooking = np.zeros(len(cells), dtype=bool)
+        time_left = np.zeros(len(cells), dtype=np.int32)
+        is_cooking[furnace] = self._furnaces.is_cooking[slots]
+        time_left[furnace] = self._furnaces.time_left[slots]
+        return is_cooking, time_left
+
+    def set_furnace_timers(self, cells: np.ndarray, is_cooking: np.ndarray, time_left: np.ndarray):
+        """Sets the timers of the furnaces among `cells`, other cells are ignored."""
+        cells = np.asarray(cells)
+        furnace = self._kind[cells] == _FURNACE
+        slots = self._slot[cells[furnace]]
+        self._furnaces.is_cooking[slots] = np.asarray(is_cooking)[furnace]
+        self._furnaces.time_left[slots] = np.asarray(time_left)[furnace]
+
+    def snapshot(self) -> dict[str, np.ndarray]:
+        """Copies the equipment tables, to be restored with `load`."""
+        arrays = {'order': self._order[:self._count].copy()}
+        for name, table in (('belts', self._belts), ('mines', self._mines), ('furnaces', self._furnaces)):
+            for column, values in table.snapshot().items():
+                arrays[f'{name}.{column}'] = values
+        return arrays
+
+    def load(self, arrays: dict[str, np.ndarray]):
+        """Replaces all equipment with a `snapshot`, whose cells must address the same resources."""
+        self.clear()
+        if self._world is not None:
+            self._reserve(len(self._world.flat))
+        order = arrays['order']
+        while len(order) > len(self._order):
+            self._order = np.concatenate([self._order, np.zeros_like(self._order)])
+        self._order[:len(order)] = order
+        self._count = len(order)
+        for name, table, kind in (('belts', self._belts, _BELT), ('mines', self._mines, _MINE),
+                ('furnaces', self._furnaces, _FURNACE)):
+            table.load({column: arrays[f'{name}.{column}'] for column in table._spec})
+            cells = table.cell[:table.count]
+            self._kind[cells] = kind
+            self._slot[cells] = np.arange(table.count)
+        self._invalidate()
+
+    def _invalidate(self):
+        """Drops everything derived from the equipment tables after they changed."""
+        self._belt_rank = None
+        self._graph = None
+        self._keys = None
+
+    @property
+    def graph(self) -> FlowGraph:
+        """The belt network, compiled on first use after equipment changed."""
+        if self._graph is None:
+            n = self._belts.count
+            self._graph = FlowGraph(self._belts.cell[:n].copy(), self._belts.input[:n].copy())
+        return self._graph
+
+    def _priorities(self) -> tuple[np.ndarray, np.ndarray]:
+        """Sort keys of the belts and furnaces, lower keys get contended ore first."""
+        belts, furnaces = self._belts, self._furnaces
+        if not self._topological:
+            return belts.seq[:belts.count], furnaces.seq[:furnaces.count]
+        if self._keys is None:
+            # A belt sits one level below the cell it pulls from, a furnace
+            # one level below the deepest belt in its window
+            graph, num_cells = self.graph, len(self._kind)
+            window = furnaces.window[:furnaces.count]
+            window_belt = np.where(window >= 0, graph.belt_at(window), -1)
+            window_depth = np.append(graph.depth, 0)[window_belt]  # -1 picks the appended 0
+            furnace_depth = window_depth.max(axis=1, initial=0) + 1
+            self._keys = (graph.depth * num_cells + graph.belt_cell,
+                furnace_depth * num_cells + furnaces.cell[:furnaces.count])
+        return self._keys
+
+    def _belt_ranks(self) -> np.ndarray:
+        """Position of each belt in the priority-ordered queue of belts pulling from its input."""
+        if self._belt_rank is None:
+            n = self._belts.count
+            inputs = self._belts.input[:n]
+            order = np.lexsort((self._priorities()[0], inputs))
+            sorted_inputs = inputs[order]
+            idx = np.arange(n)
+            starts = np.ones(n, dtype=bool)
+            starts[1:] = sorted_inputs[1:] != sorted_inputs[:-1]
+            rank = np.empty(n, dtype=np.float32)
+            rank[order] = idx - np.maximum.accumulate(np.where(starts, idx, 0))
+            self._belt_rank = rank
+        return self._belt_rank
+
+    def _accumulate(self, changes: np.ndarray, cells: np.ndarray, channels: slice, values):
+        if self._num_envs == 1:
+            changes[0, channels] += values.sum(axis=0)
+        else:
+            np.add.at(changes[:, channels], cells // (self._map_size[0] * self._map_size[1]), values)
+
+    def step(self, resources: np.ndarray) -> np.ndarray:
+        """Advances all equipment one tick in place and returns per-environment resource increases.
+
+        `resources` must be C-contiguous so that it can be viewed as a flat
+        (cells, len(ResourceType)) array. Afterwards `changed_cells` holds the
+        flat index of every cell whose resources were modified.
+        """
+        flat = resources.reshape(-1, len(ResourceType))
+        changes = np.zeros((self._num_envs, len(ResourceType)), dtype=np.float32)
+        belts, mines, furnaces = self._belts, self._mines, self._furnaces
+        nb, nm, nf = belts.count, mines.count, furnaces.count
+
+        # Gather everything from the pre-tick state before any write
+        mine_cell = mines.cell[:nm]
+        mine_flow = mines.flow[:nm]
+        mine_flow[:] = flat[mine_cell, DEPOSITS]  # np.take would copy the strided column view
+        np.minimum(mine_flow, Mine.flow_rate, out=mine_flow)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.lap_equipment("mine")
+
+        belt_cell, belt_input = belts.cell[:nb], belts.input[:nb]
+        belt_avail, belt_flow = belts.avail[:nb], belts.flow[:nb]
+        np.take(flat, belt_input, axis=0, out=belt_avail, mode='clip')
+        np.subtract(belt_avail[:, ITEMS], Belt.flow_rate * self._belt_ranks()[:, None], out=belt_flow)
+        np.clip(belt_flow, 0.0, Belt.flow_rate, out=belt_flow)
+        if profiler is not None:
+            profiler.lap_equipment("belt")
+
+        cooking = furnaces.is_cooking[:nf]
+        idle = np.flatnonzero(~cooking)
+        window = furnaces.window[idle]
+        valid = window >= 0
+        window_cell = np.where(valid, window, 0)
+
+        # Cells read by more than one idle furnace, or by a furnace and a belt,
+        # are order dependent and get resolved sequentially below.
+        cover = self._cover
+        np.add.at(cover, window[valid], 1)
+        contended_belts = np.flatnonzero(cover[belt_input] > 0)
+        cover[belt_input[contended_belts]] += 2
+        contended = ((cover[window_cell] > 1) & valid).any(axis=1)
+        cover[window[valid]] = 0
+
+        free = ~contended
+        free_window, free_valid = window[free], valid[free]
+        ore = flat[window_cell[free], ORES]
+        has_coal = (ore[:, :, 0] > Furnace.coal_per_steel) & free_valid
+        has_iron = (ore[:, :, 1] > Furnace.iron_per_steel) & free_valid
+        start = has_coal.any(axis=1) & has_iron.any(axis=1)
+        rows = np.flatnonzero(start)
+        starting = [idle[free][rows]]
+        coal_cells = [free_window[rows, has_coal[rows].argmax(axis=1)]]
+        iron_cells = [free_window[rows, has_iron[rows].argmax(axis=1)]]
+
+        contended_furnaces = idle[contended]
+        if profiler is not None:
+            profiler.lap_equipment("furnace")
+        if len(contended_belts) or len(contended_furnaces):
+            self._resolve_sequential(flat, contended_belts, contended_furnaces,
+                starting, coal_cells, iron_cells)
+            if profiler is not None:
+                profiler.lap_equipment("contended", len(contended_belts) + len(contended_furnaces))
+        starting = np.concatenate(starting)
+        coal_cells = np.concatenate(coal_cells)
+        iron_cells = np.concatenate(iron_cells)
+
+        # Scatter flows back into the map
+        flat[mine_cell, DEPOSITS] -= mine_flow
+        flat[mine_cell, ORES] += mine_flow
+        self._accumulate(changes, mine_cell, ORES, mine_flow)
+        if profiler is not None:
+            profiler.lap_equipment("mine", nm)
+
+        np.subtract.at(flat[:, ITEMS], belt_input, belt_flow)
+        flat[belt_cell, ITEMS] += belt_flow
+        self._accumulate(changes, belt_cell, ITEMS, belt_flow)
+        if profiler is not None:
+            profiler.lap_equipment("belt", nb)
+
+        cooking_idx = np.flatnonzero(cooking)
+        time_left = furnaces.time_left
+        time_left[cooking_idx] -= 1
+        done = cooking_idx[time_left[cooking_idx] == 0]
+        cooking[done] = False
+        done_cell = furnaces.cell[done]
+        flat[done_cell, ResourceType.STEEL] += 1.0
+        steel = slice(ResourceType.STEEL, ResourceType.STEEL + 1)
+        self._accumulate(changes, done_cell, steel, np.ones((len(done), 1), dtype=np.float32))
+
+        np.subtract.at(flat[:, ResourceType.COAL_ORE], coal_cells, Furnace.coal_per_steel)
+        np.subtract.at(flat[:, ResourceType.IRON_ORE], iron_cells, Furnace.iron_per_steel)
+        cooking[starting] = True
+        time_left[starting] = Furnace.cook_time
+        if profiler is not None:
+            profiler.lap_equipment("furnace", nf)
+
+        moving = belt_flow.any(axis=1)
+        self.changed_cells = np.concatenate([mine_cell[mine_flow.any(axis=1)],
+            belt_cell[moving], belt_input[moving], done_cell, coal_cells, iron_cells])
+        return changes
+
+    def _resolve_sequential(self, flat, belt_idx, furnace_idx, starting, coal_cells, iron_cells):
+        """Replays contended belts and furnaces one at a time in priority order."""
+        belts, furnaces = self._belts, self._furnaces
+        old = self._old
+        cells = np.concatenate([belts.input[belt_idx], furnaces.window[furnace_idx].ravel()])
+        cells = cells[cells >= 0]
+        old[cells] = flat[cells, ITEMS]
+        coal, iron = ORES.start - ITEMS.start, ORES.start - ITEMS.start + 1
+
+        belt_keys, furnace_keys = self._priorities()
+        keys = np.concatenate([belt_keys[belt_idx], furnace_keys[furnace_idx]])
+        started, coal_at, iron_at = [], [], []
+        for k in np.argsort(keys):
+            if k < len(belt_idx):
+                i = belt_idx[k]
+                c = belts.input[i]
+                flow = np.minimum(old[c], Belt.flow_rate)
+                old[c] -= flow
+                belts.flow[i] = flow
+                continue
+            j = furnace_idx[k - len(belt_idx)]
+            window = furnaces.window[j]
+            window = window[window >= 0]
+            has_coal = np.flatnonzero(old[window, coal] > Furnace.coal_per_steel)
+            has_iron = np.flatnonzero(old[window, iron] > Furnace.iron_per_steel)
+            if len(has_coal) > 0 and len(has_iron) > 0:
+                old[window[has_coal[0]], coal] -= Furnace.coal_per_steel
+                old[window[has_iron[0]], iron] -= Furnace.iron_per_steel
+                started.append(j)
+                coal_at.append(window[has_coal[0]])
+                iron_at.append(window[has_iron[0]])
+
+        starting.append(np.array(started, dtype=np.int64))
+        coal_cells.append(np.array(coal_at, dtype=np.int64))
+        iron_cells.append(np.array(iron_at, dtype=np.int64))
+
+    def advance(self, resources: np.ndarray, ticks: int) -> np.ndarray:
+        """Runs `ticks` ticks of `step` and returns the summed per-environment resource increases.
+
+        Once two consecutive ticks move the same flows with every furnace
+        idle, the ticks for which those flows provably stay the same (see
+        `_steady_horizon`) are applied as one multiple of the per-tick
+        change. Results match stepping one tick at a time exactly.
+        `changed_cells` then holds every cell modified over all the ticks.
+        """
+        flat = resources.reshape(-1, len(ResourceType))
+        total = np.zeros((self._num_envs, len(ResourceType)), dtype=np.float64)
+        changed, previous = [], None
+        while ticks > 0:
+            furnaces = self._furnaces.is_cooking[:self._furnaces.count]
+            was_cooking = furnaces.any()
+            changes = self.step(resources)
+            total += changes
+            changed.append(self.changed_cells)
+            ticks -= 1
+            flows = (self._mines.flow[:self._mines.count].copy(), self._belts.flow[:self._belts.count].copy())
+            if (ticks > 0 and previous is not None and not was_cooking and not furnaces.any()
+                    and np.array_equal(flows[0], previous[0]) and np.array_equal(flows[1], previous[1])):
+                n, cells, delta = self._steady_horizon(flat, ticks)
+                if n > 0:
+                    # n * delta need not fit a float32, the sum does
+                    flat[cells] = (flat[cells].astype(np.float64) + delta * n).astype(np.float32)
+                    total += changes * n
+                    changed.append(cells[delta.any(axis=1)])
+                    ticks -= n
+            previous = flows
+        self.changed_cells = np.unique(np.concatenate(changed)) if changed else np.zeros(0, dtype=np.int64)
+        return total
+
+    def _steady_horizon(self, flat: np.ndarray, limit: int) -> tuple[int, np.ndarray, np.ndarray]:
+        """Number of ticks, up to `limit`, that repeat the flows of the last tick, as do the cells they touch.
+
+        Assumes every furnace is idle. Mines and belts keep their flows while
+        the cells they read stay on the same side of the bounds of `min` and
+        `clip` in `step`, and idle furnaces stay idle while all coal or all
+        iron in their window stays at or below what they consume. Each value
+        changes by a fixed delta per tick until then, so the tick every bound
+        would first be crossed is known in advance. The horizon also ends
+        before any value outgrows the float32 precision that makes adding n
+        deltas at once equal to adding them one by one.
+        """
+        belts, mines, furnaces = self._belts, self._mines, self._furnaces
+        nb, nm, nf = belts.count, mines.count, furnaces.count
+        mine_cell, mine_flow = mines.cell[:nm], mines.flow[:nm]
+        belt_cell, belt_input, belt_flow = belts.cell[:nb], belts.input[:nb], belts.flow[:nb]
+        window = furnaces.window[:nf]
+
+        cells = np.unique(np.concatenate([mine_cell, belt_cell, belt_input, window[window >= 0]]))
+        delta = np.zeros((len(cells), len(ResourceType)), dtype=np.float64)
+        mine_at = np.searchsorted(cells, mine_cell)
+        np.add.at(delta[:, DEPOSITS], mine_at, -mine_flow)
+        np.add.at(delta[:, ORES], mine_at, mine_flow)
+        input_at = np.searchsorted(cells, belt_input)
+        np.add.at(delta[:, ITEMS], input_at, -belt_flow)
+        np.add.at(delta[:, ITEMS], np.searchsorted(cells, belt_cell), belt_flow)
+        values = flat[cells].astype(np.float64)
+        if np.any(delta != np.round(delta)):
+            return 0, cells, delta
+
+        horizons = [limit]
+        # Mines move their full rate while deposits last, or nothing once they are gone
+        deposits, deposit_delta = values[mine_at][:, DEPOSITS], delta[mine_at][:, DEPOSITS]
+        full = mine_flow == Mine.flow_rate
+        if not (full | (mine_flow == 0)).all():
+            return 0, cells, delta
+        horizons.append(_horizon(deposits, deposit_delta, lower=np.where(full, Mine.flow_rate, -np.inf),
+            upper=np.where(full, np.inf, 0.0)))
+
+        # A belt of rank r takes clip(avail - r * rate, 0, rate), constant while avail stays within one piece
+        avail, avail_delta = values[input_at][:, ITEMS], delta[input_at][:, ITEMS]
+        floor = self._belt_ranks()[:, None].astype(np.float64) * Belt.flow_rate
+        full, empty = belt_flow == Belt.flow_rate, belt_flow == 0
+        partial = floor + belt_flow
+        lower = np.where(full, floor + Belt.flow_rate, np.where(empty, -np.inf, partial))
+        upper = np.where(full, np.inf, np.where(empty, floor, partial))
+        horizons.append(_horizon(avail, avail_delta, lower, upper))
+
+        # An idle furnace stays idle while none of its cells has enough coal, or none has enough iron
+        # Furnaces whose whole window is cut off by the top or left edge read no cells and never start
+        if nf and len(cells):
+            valid = window >= 0
+            window_at = np.searchsorted(cells, np.where(valid, window, cells[0]))
+            ore, ore_delta = values[window_at][:, :, ORES], delta[window_at][:, :, ORES]
+            ore_delta[~valid] = 0.0
+            ore[~valid] = -np.inf
+            needs = np.array([Furnace.coal_per_steel, Furnace.iron_per_steel], dtype=np.float64)
+            idle = np.stack([_horizon(ore[:, :, i], ore_delta[:, :, i], -np.inf, needs[i], axis=1)
+                for i in range(2)], axis=1)
+            horizons.append(idle.max(axis=1).min())
+
+        # Adding n deltas at once is exact while every value stays a multiple of its lowest set bit (capped
+        # at 1, deltas are integers) representable in float32. Within a tick, items on a cell can swing by
+        # one mine and five belts before settling.
+        moving = delta != 0
+        slack = np.zeros(len(ResourceType))
+        slack[ORES.start:] = Mine.flow_rate + 5 * Belt.flow_rate
+        reach = np.broadcast_to(2.0 ** 24 * _quantum(flat[cells]) - slack, values.shape)[moving]
+        horizons.append(_horizon(values[moving], delta[moving], -reach, reach) - 1)
+        return int(min(np.min(h) for h in horizons)), cells, delta
+
+def _horizon(values: np.ndarray, delta: np.ndarray, lower, upper, axis=None) -> np.ndarray:
+    """Ticks until `values + ticks * delta` first leaves [lower, upper], min over `axis` (all by default)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ticks = np.where(delta < 0, np.floor((values - lower) / -delta) + 1,
+            np.where(delta > 0, np.floor((upper - values) / delta) + 1, np.inf))
+    ticks = np.where((values < lower) | (values > upper), 0.0, ticks)
+    if ticks.size == 0:
+        return np.inf if axis is None else np.full(ticks.shape[:axis] + ticks.shape[axis + 1:], np.inf)
+    return ticks.min(axis=axis)
+
+def _quantum(values: np.ndarray) -> np.ndarray:
+    """Lowest set bit of each float32 value, at most 1 and 1 for zero."""
+    bits = values.view(np.int32) & 0x7fffffff
+    exponent = bits >> 23
+    mantissa = (bits & 0x7fffff) | np.where(exponent > 0, 0x800000, 0)
+    low = np.ldexp((mantissa & -mantissa).astype(np.float64), np.maximum(exponent, 1) - 150)
+    return np.where(mantissa == 0, 1.0, np.minimum(low, 1.0))
@@ -1,12 +1,17 @@
 import gymnasium as gym
 from enum import Enum, IntEnum, auto
 import numpy as np
-import cv2
-import os
-from perlin_noise import PerlinNoise
 import random
+from typing import Optional, Union
 
 from .factory import Factory
+from .lazy import LazyInfo, LazyObservation
+from .minimap import Minimap, minimap_shape
+from .profiling import StepProfiler
+from .render import TileRenderer, TileCache
+from .state import FactoryState
+from .symbolic import observation_shape, symbolic_grid
+from .terrain import TerrainGenerator, TerrainPool
 from .types import EquipmentType, ResourceType
 
 class FactoryAction(IntEnum):
@@ -24,49 +29,154 @@ class FactoryAction(IntEnum):
     DESTROY_EQUIPMENT = auto()
     WAIT = auto()
 
+# Cursor offset of each move action, in `FactoryAction` order
+_MOVES = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+
+def action_masks(cursor: np.ndarray, occupied: np.ndarray, map_size: tuple[int, int]) -> np.ndarray:
+    """Which `FactoryAction`s would change a factory, as a (N, len(FactoryAction)) bool array.
+
+    `cursor` holds N cursor positions and `occupied` whether the cell under
+    each has equipment. Moves into the edge of the map, builds on occupied
+    cells and destroys of empty ones do nothing; waiting always lets the
+    factory run.
+    """
+    cursor = np.asarray(cursor).reshape(-1, 2)
+    occupied = np.asarray(occupied, dtype=bool).reshape(-1)
+    masks = np.empty((len(cursor), len(FactoryAction)), dtype=bool)
+    moved = cursor[:, None, :] + _MOVES
+    masks[:, :FactoryAction.BUILD_LEFT_BELT] = ((moved >= 0) & (moved < np.asarray(map_size))).all(axis=-1)
+    masks[:, FactoryAction.BUILD_LEFT_BELT:FactoryAction.BUILD_FURNACE+1] = ~occupied[:, None]
+    masks[:, FactoryAction.DESTROY_EQUIPMENT] = occupied
+    masks[:, FactoryAction.WAIT] = True
+    return masks
+
+# Terrain the environment starts with before its first reset(). Its iron is always the
+# field of noise seed 1. Coal used seed 0, which `perlin_noise` takes as "unseeded", so it
+# was a random field each run and is now derived from the environment's seed instead.
+INITIAL_TERRAIN = TerrainGenerator(iron_threshold=0.3, coal_amount=1000.0, iron_amount=1000.0,
+    fixed_seeds=(None, 1))
+
 class FactoryEnv(gym.Env):
-    def __init__(self, map_size=(32, 32), obs_size=(64, 64), max_steps=1000, asset_path="assets"):
+    def __init__(self, map_size=(32, 32), obs_size=(64, 64), max_steps=1000, asset_path="assets", engine="object",
+            terrain: Optional[TerrainGenerator] = None, seed: Optional[int] = None, obs_mode: str = "rgb",
+            chunk_size: Optional[int] = None, instrument: bool = False, frame_skip: int = 1, lazy: bool = False,
+            skip_invalid: bool = False, terrain_pool: Optional[Union[str, TerrainPool]] = None,
+            minimap: Optional[tuple[int, int]] = None):
+        """`terrain` configures deposit generation on reset(), `seed` makes cursors and terrain reproducible.
+
+        Without a `terrain` the map starts, until the first reset(), with
+        `INITIAL_TERRAIN`: the same iron for every seed and coal that
+        follows the seed.
+
+        `obs_mode` picks the observation: "rgb" renders the 8x8 tiles around
+        the cursor from sprites, "symbolic" returns the same window as uint8
+        planes (see `factory.symbolic`) and "symbolic_map" those planes for
+        the whole map.
+
+        `chunk_size` stores the map in lazily generated chunks (see `Factory`)
+        for maps much larger than the area the agent builds on. Observations
+        are then rendered from scratch each step, and "symbolic_map" touches
+        every chunk.
+
+        `instrument` times the phases of each step, see `instrument()`.
+
+        `frame_skip` runs that many factory ticks per action, summing their
+        rewards and observing only after the last. `max_steps` counts ticks.
+
+        `lazy` makes `step()` return a `LazyObservation` and a `LazyInfo`,
+        which render and fill in only what is read. They must be read
+        before the next step or reset, afterwards they raise `StaleError`.
+
+        `info['action_mask']` marks the actions that would change the
+        factory, see `action_mask()`. With `skip_invalid` the others are not
+        simulated: they return the last observation again with no reward
+        and set `info['skipped']`. The factory does not run, but the ticks
+        the action would have taken still count towards `max_steps`, so an
+        agent repeating a masked action still reaches the end of the episode.
+
+        `terrain_pool`, a `TerrainPool` or the path of one, replaces terrain
+        generation: every reset copies in one of its pre-generated maps,
+        drawn with the environment's seeded generator. `terrain` is then
+        unused.
+
+        `minimap`, a (w, h) size, adds a summary of the whole map to every
+        observation, which becomes {"image": window, "minimap": summary},
+        see `Minimap`. It is updated from the cells that changed each step.
+        Summarizing the whole map would generate every chunk of a chunked
+        map, so it cannot be combined with `chunk_size`.
+        """
         self._map_size = map_size 
         self._obs_size = obs_size
+        self._obs_shape = observation_shape(obs_mode, obs_size, map_size)
+        self._obs_mode = obs_mode
+        self._asset_path = asset_path
+        self._rng = random.Random(seed) if seed is not None else random
+        if minimap is not None and chunk_size is not None:
+            raise ValueError("minimap summarizes the whole map and needs chunk_size=None")
+        self._terrain = terrain if terrain is not None else TerrainGenerator()
 
-        cursor_pos = (random.randint(0, map_size[0] - 1), random.randint(0, map_size[1] - 1))
-        self._factory = Factory(cursor_pos=cursor_pos, map_size=map_size)
+        cursor_pos = (self._rng.randint(0, map_size[0] - 1), self._rng.randint(0, map_size[1] - 1))
+        self._factory = Factory(cursor_pos=cursor_pos, map_size=map_size, engine=engine, chunk_size=chunk_size)
         self._step = 0
         self._max_steps = max_steps
+        self._frame_skip = frame_skip
+        self._lazy = lazy
+        self._skip_invalid = skip_invalid
+        self._obs = None  # Last observation returned, handed out again for skipped actions
+        self._version = 0  # Bumped whenever the state lazy values refer to changes
+
+        self._tile_cache = None
+        if obs_mode == "rgb" and chunk_size is None:
+            self._tile_cache = TileCache(TileRenderer.for_asset_path(asset_path), map_size)
+        self._minimap = Minimap(map_size, minimap) if minimap is not None else None
 
-        self._assets = {}
-        for asset in os.listdir(asset_path):
-            img = cv2.imread(os.path.join(asset_path, asset), cv2.IMREAD_UNCHANGED)
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA)
-            img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-            img = cv2.flip(img, 1)
-            self._assets[asset] = img
+        self._terrain_pool = TerrainPool(terrain_pool) if isinstance(terrain_pool, str) else terrain_pool
+        if self._terrain_pool is not None and tuple(self._terrain_pool.map_size) != tuple(map_size):
+            raise ValueError(f"Terrain pool of {self._terrain_pool.map_size} maps does not fit a {map_size} map")
+        self._map_index = None
 
         # Generate random terrain
-        coal_noise = PerlinNoise(octaves=6, seed=0)
-        iron_noise = PerlinNoise(octaves=6, seed=1)
-        for x in range(map_size[0]):
-            for y in range(map_size[1]):
-                coal = coal_noise([x / 64, y / 64])
-                if coal > 0.2:
-                    self._factory.add_resource(x, y, ResourceType.COAL_DEPOSIT, 1000)
-                iron = iron_noise([x / 64, y / 64])
-                if iron > 0.3:
-                    self._factory.add_resource(x, y, ResourceType.IRON_DEPOSIT, 1000)
+        initial_terrain = terrain if terrain is not None else INITIAL_TERRAIN
+        self._set_terrain(initial_terrain)
+        self._reset_caches()
+
+        self._profiler = None
+        self._info_stats = False
+        if instrument:
+            self.instrument()
 
     @property
     def observation_space(self):
-        """Returns a image of factory w.r.t. cursor position"""
-        return gym.spaces.Box(low=0, high=255, shape=self._obs_size + (3,), dtype=np.uint8)
+        """Returns a image or symbolic grid of factory w.r.t. cursor position"""
+        window = gym.spaces.Box(low=0, high=255, shape=self._obs_shape, dtype=np.uint8)
+        if self._minimap is None:
+            return window
+        return gym.spaces.Dict({"image": window,
+            "minimap": gym.spaces.Box(low=0, high=255, shape=minimap_shape(self._minimap.size), dtype=np.uint8)})
 
     @property
     def action_space(self):
         """Modifies factory w.r.t. cursor position"""
         return gym.spaces.Discrete(len(FactoryAction))
 
-    def step(self, action: int):
+    def step(self, action: int, ticks: Optional[int] = None):
+        """Applies `action` and runs `ticks` factory ticks, `frame_skip` by default."""
+        if self._skip_invalid and not self.action_mask()[FactoryAction(action)]:
+            self._step += min(ticks or self._frame_skip, max(1, self._max_steps - self._step))
+            x, y = self._factory.get_cursor()
+            info = self._info({'resources': lambda: self._factory.get_resources(x, y),
+                'action_mask': self.action_mask, 'skipped': lambda: True})
+            obs = self._obs if self._obs is not None else self.observe()
+            return obs, 0.0, self._step >= self._max_steps, info
+
+        profiler = self._profiler
+        if profiler is not None:
+            profiler.begin_step()
+
         # Step internal engine
-        self._step += 1
+        self._version += 1
+        ticks = min(ticks or self._frame_skip, max(1, self._max_steps - self._step))
+        self._step += ticks
 
         reward = 0.0
         action = FactoryAction(action)
@@ -106,88 +216,201 @@ class FactoryEnv(gym.Env):
             self._factory.destroy_equipment()
         elif action == FactoryAction.WAIT:
             pass
+        if profiler is not None:
+            profiler.lap("action")
 
-        new_resources = self._factory.step()
+        new_resources = self._factory.step() if ticks == 1 else self._factory.advance(ticks)
         reward += new_resources.get(ResourceType.PAPERCLIP, 0.0) * 20.0
         reward += new_resources.get(ResourceType.STEEL, 0.0) * 10.0
         reward += new_resources.get(ResourceType.IRON_ORE, 0.0) * 0.01
         reward += new_resources.get(ResourceType.COAL_ORE, 0.0) * 0.01
-        obs = self.observe()
+        if profiler is not None:
+            profiler.lap("simulate", ticks)
+        if self._lazy:
+            obs = LazyObservation(self, self._observe_window, self._obs_shape)
+            if self._minimap is not None:
+                obs = {"image": obs,
+                    "minimap": LazyObservation(self, self._observe_minimap, minimap_shape(self._minimap.size))}
+        else:
+            obs = self.observe()
+        if profiler is not None:
+            profiler.lap("observe")
         done = self._step >= self._max_steps
 
         x, y = self._factory.get_cursor()
-        info = {
-            'resources': self._factory.get_resources(x, y),
+        entries = {
+            'resources': lambda: self._factory.get_resources(x, y),
+            'action_mask': self.action_mask,
         }
+        if self._skip_invalid:
+            entries['skipped'] = lambda: False
+        if self._lazy and self._info_stats:
+            entries['stats'] = profiler.stats
+        info = self._info(entries)
+        if profiler is not None:
+            profiler.lap("info")
+            profiler.end_step()
+            if self._info_stats and not self._lazy:
+                info['stats'] = profiler.stats()
 
+        self._obs = obs
         return obs, reward, done, info
 
-    def reset(self):
+    def action_mask(self) -> np.ndarray:
+        """Which `FactoryAction`s would change the factory now, see `action_masks`."""
+        x, y = self._factory.get_cursor()
+        return action_masks((x, y), self._factory.get_equipment(x, y) != EquipmentType.EMPTY, self._map_size)[0]
+
+    def resource_totals(self) -> np.ndarray:
+        """Resources summed over the whole map, indexed by `ResourceType`."""
+        return self._factory.get_resource_totals()
+
+    def _info(self, entries: dict):
+        if self._lazy:
+            return LazyInfo(self, entries)
+        return {key: compute() for key, compute in entries.items()}
+
+    def fast_forward(self, ticks: int):
+        """Waits `ticks` ticks in one step, see `step`."""
+        return self.step(FactoryAction.WAIT, ticks)
+
+    def reset(self, seed: Optional[int] = None, map_index: Optional[int] = None):
+        """Starts a new episode, on map `map_index` of the terrain pool when given."""
+        if seed is not None:
+            self._rng = random.Random(seed)
+        if map_index is not None and self._terrain_pool is None:
+            raise ValueError("map_index needs a terrain pool")
+        self._version += 1
         self._step = 0
-        cursor_pos = (random.randint(0, self._map_size[0] - 1), random.randint(0, self._map_size[1] - 1))
+        cursor_pos = (self._rng.randint(0, self._map_size[0] - 1), self._rng.randint(0, self._map_size[1] - 1))
         self._factory.reset(cursor=cursor_pos)
-        coal_noise = PerlinNoise(octaves=6)
-        iron_noise = PerlinNoise(octaves=6)
-        for x in range(self._map_size[0]):
-            for y in range(self._map_size[1]):
-                coal = coal_noise([x / 64, y / 64])
-                if coal > 0.2:
-                    self._factory.add_resource(x, y, ResourceType.COAL_DEPOSIT, 250)
-                iron = iron_noise([x / 64, y / 64])
-                if iron > 0.2:
-                    self._factory.add_resource(x, y, ResourceType.IRON_DEPOSIT, 250)
-        return self.observe()
-
-    def observe(self) -> np.ndarray:
-        obs = np.full((self._obs_size[0], self._obs_size[1], 3), 255, dtype=np.uint8)
-        def set_block(x, y, img):
-            bg = obs[x*8:(x+1)*8, y*8:(y+1)*8, :].astype(np.float32)
-            fg = img.astype(np.float32)
-            alpha = fg[:, :, 3] / 255.0
-            for c in range(3):
-                obs[x*8:(x+1)*8, y*8:(y+1)*8, c] = ((1.0 - alpha) * bg[:, :, c]) + (alpha * fg[:, :, c])
-        
+        self._set_terrain(self._terrain, map_index)
+        self._reset_caches()
+        self._obs = self.observe()
+        return self._obs
+
+    def _set_terrain(self, terrain: TerrainGenerator, map_index: Optional[int] = None):
+        if self._terrain_pool is None:
+            self._factory.set_terrain(terrain, self._rng.getrandbits(32))
+            return
+        self._map_index = map_index if map_index is not None else self._terrain_pool.sample(self._rng)
+        self._factory.set_deposits(self._terrain_pool[self._map_index])
+
+    @property
+    def map_index(self) -> Optional[int]:
+        """Terrain pool index of the current map, None without a pool."""
+        return self._map_index
+
+    def instrument(self, enabled: bool = True, info: bool = False):
+        """Starts or stops timing steps, see `stats()`. `info` also adds the stats to every step's info.
+
+        Counters are kept for the action, simulation, observation and info
+        phases of each step and for each kind of equipment simulated.
+        Enabling again resets them. While disabled steps pay a few `None`
+        checks and nothing else.
+        """
+        self._profiler = StepProfiler() if enabled else None
+        self._info_stats = enabled and info
+        self._factory.set_profiler(self._profiler)
+
+    def stats(self) -> dict:
+        """Counters of `StepProfiler.stats` since instrumenting, empty while not instrumented."""
+        return self._profiler.stats() if self._profiler is not None else {}
+
+    def capture(self, num_steps: int, trace_path: Optional[str] = None, profile=None):
+        """Writes a Chrome trace of the next `num_steps` steps and/or runs a profiler over them.
+
+        `profile` is anything with `enable()` and `disable()`, typically a
+        `cProfile.Profile`, and only runs inside those steps. Instruments
+        the environment if it is not already.
+        """
+        if self._profiler is None:
+            self.instrument()
+        self._profiler.capture(num_steps, trace_path, profile)
+
+    def get_state(self) -> FactoryState:
+        """Captures the factory and the step counter, see `Factory.get_state`."""
+        return self._factory.get_state()._replace(steps=self._step)
+
+    def set_state(self, state: FactoryState) -> np.ndarray:
+        """Restores a state from `get_state` and returns its observation."""
+        self._factory.set_state(state)
+        self._version += 1
+        self._step = state.steps
+        self._obs = self.observe()
+        return self._obs
+
+    def observe(self):
+        """The cursor's window, or with a minimap {"image": window, "minimap": summary}."""
+        window = self._observe_window()
+        if self._minimap is None:
+            return window
+        return {"image": window, "minimap": self._observe_minimap()}
+
+    def _sync_caches(self):
+        # Passes the cells changed since the last call on to the tile cache and minimap
+        x, y = self._factory.pop_dirty()
+        if len(x) == 0 or (self._tile_cache is None and self._minimap is None):
+            return
+        resources, equipment = self._factory.get_resource_cells(x, y), self._factory.get_equipment_cells(x, y)
+        if self._tile_cache is not None:
+            self._tile_cache.update(x, y, resources, equipment)
+        if self._minimap is not None:
+            self._minimap.update(x, y, resources, equipment)
+
+    def _observe_minimap(self) -> np.ndarray:
+        self._sync_caches()
+        return self._minimap.render(self._factory.get_cursor())
+
+    def _observe_window(self) -> np.ndarray:
+        self._sync_caches()
         cursor = self._factory.get_cursor()
+        if self._obs_mode == "symbolic_map":
+            w, h = self._map_size
+            return symbolic_grid(self._factory.get_resource_window(0, 0, w, h),
+                self._factory.get_equipment_window(0, 0, w, h), cursor)
+
         map_roi = (min(max(0, cursor[0]-4), self._map_size[0]-8),
             min(max(0, cursor[1]-4), self._map_size[1]-8))
-        for x in range(8):
-            for y in range(8):
-                resources = self._factory.get_resources(map_roi[0] + x, map_roi[1] + y)
-                if resources.get(ResourceType.COAL_DEPOSIT, 0) > 0:
-                    set_block(x, y, self._assets["coal_deposit.png"])
-                if resources.get(ResourceType.IRON_DEPOSIT, 0) > 0:
-                    set_block(x, y, self._assets["iron_deposit.png"])
-
-                equipment = self._factory.get_equipment(map_roi[0] + x, map_roi[1] + y)
-                if equipment == EquipmentType.EMPTY:
-                    pass
-                elif equipment == EquipmentType.LEFT_BELT:
-                    set_block(x, y, self._assets["left_belt.png"])
-                elif equipment == EquipmentType.RIGHT_BELT:
-                    set_block(x, y, self._assets["right_belt.png"])
-                elif equipment == EquipmentType.UP_BELT:
-                    set_block(x, y, self._assets["up_belt.png"])
-                elif equipment == EquipmentType.DOWN_BELT:
-                    set_block(x, y, self._assets["down_belt.png"])
-
-                if resources.get(ResourceType.COAL_ORE, 0) > 0:
-                    set_block(x, y, self._assets["coal_deposit.png"])
-                if resources.get(ResourceType.IRON_ORE, 0) > 0:
-                    set_block(x, y, self._assets["iron_deposit.png"])
-
-                if equipment == EquipmentType.MINE:
-                    set_block(x, y, self._assets["mine.png"])
-                elif equipment == EquipmentType.FURNACE:
-                    set_block(x, y, self._assets["furnace.png"])
-
-        obs_cursor_x = cursor[0] - map_roi[0]
-        obs_cursor_y = cursor[1] - map_roi[1] 
-        set_block(obs_cursor_x, obs_cursor_y, self._assets["cursor.png"])
-
-        return obs
+        roi_cursor = (cursor[0] - map_roi[0], cursor[1] - map_roi[1])
+        if self._obs_mode == "symbolic":
+            return symbolic_grid(self._factory.get_resource_window(*map_roi, 8, 8),
+                self._factory.get_equipment_window(*map_roi, 8, 8), roi_cursor)
+
+        if self._tile_cache is None:
+            return self._render_window(map_roi, roi_cursor)
+        return self._tile_cache.render(map_roi, roi_cursor).copy()
+
+    def _render_window(self, map_roi: tuple[int, int], cursor: tuple[int, int]) -> np.ndarray:
+        renderer = TileRenderer.for_asset_path(self._asset_path)
+        return renderer.render(renderer.keys(self._factory.get_resource_window(*map_roi, 8, 8),
+            self._factory.get_equipment_window(*map_roi, 8, 8), cursor))
+
+    @property
+    def tiles_rendered(self) -> int:
+        """Number of tiles re-rendered by the last observation, 0 when observations are not cached."""
+        return self._tile_cache.tiles_rendered if self._tile_cache is not None else 0
+
+    def _reset_caches(self):
+        self._factory.pop_dirty()
+        if self._tile_cache is None and self._minimap is None:
+            return
+        w, h = self._map_size
+        resources, equipment = self._factory.get_resource_window(0, 0, w, h), self._factory.get_equipment_window(0, 0, w, h)
+        if self._tile_cache is not None:
+            self._tile_cache.reset(resources, equipment)
+        if self._minimap is not None:
+            self._minimap.reset(resources, equipment)
 
     def render(self, *args):
-        obs = self.observe()
-        obs.astype(np.float32)
-        img = cv2.resize(obs, (512, 512), interpolation=cv2.INTER_NEAREST)
+        if self._obs_mode == "rgb":
+            obs = self._observe_window()
+        else:
+            # Symbolic observations carry no pixels, draw the cursor's window from sprites
+            cursor = self._factory.get_cursor()
+            x = min(max(0, cursor[0]-4), self._map_size[0]-8)
+            y = min(max(0, cursor[1]-4), self._map_size[1]-8)
+            obs = self._render_window((x, y), (cursor[0] - x, cursor[1] - y))
+        # Nearest-neighbour upscale to 512x512
+        img = obs.repeat(8, axis=0).repeat(8, axis=1)
         return img
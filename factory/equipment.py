@@ -27,12 +27,13 @@ class Belt(Equipment):
         int(ResourceType.COAL_ORE), int(ResourceType.IRON_ORE),
         int(ResourceType.STEEL), int(ResourceType.PAPERCLIP)
     )
+    flow_rate = 25.0
 
     def __init__(self, pos: tuple[int, int], type: EquipmentType):
         x, y = pos
         self._pos = pos
         self._output = (x, y, self.moveable_resources)
-        self._flow = np.full((len(self.moveable_resources),), 25.0, dtype=np.float32)
+        self._flow = np.full((len(self.moveable_resources),), self.flow_rate, dtype=np.float32)
         if type == EquipmentType.LEFT_BELT:
             self._input = (x+1, y, self.moveable_resources)
         elif type == EquipmentType.RIGHT_BELT:
@@ -50,11 +51,13 @@ class Belt(Equipment):
 
 class Mine(Equipment):
 
+    flow_rate = 50.0
+
     def __init__(self, pos: tuple[int, int]):
         self._pos = pos
         self._input = pos + ((ResourceType.COAL_DEPOSIT, ResourceType.IRON_DEPOSIT),)
         self._output = pos + ((ResourceType.COAL_ORE, ResourceType.IRON_ORE),)
-        self._flow = np.array([50.0, 50.0], dtype=np.float32)
+        self._flow = np.array([self.flow_rate, self.flow_rate], dtype=np.float32)
 
     def process(self, block: np.ndarray):
         flow = np.minimum(self._flow, block)
@@ -62,6 +65,10 @@ class Mine(Equipment):
 
 class Furnace(Equipment):
 
+    coal_per_steel = 2.0
+    iron_per_steel = 1.0
+    cook_time = 3
+
     def __init__(self, pos: tuple[int, int]):
         x, y = pos
         self._pos = pos
@@ -84,11 +91,11 @@ class Furnace(Equipment):
                 return np.zeros_like(input), 0.0
         else:
             input_flow = np.zeros_like(input)
-            coal_input = np.where(input[:, :, 0] > 2.0)
-            iron_input = np.where(input[:, :, 1] > 1.0)
+            coal_input = np.where(input[:, :, 0] > self.coal_per_steel)
+            iron_input = np.where(input[:, :, 1] > self.iron_per_steel)
             if len(coal_input[0]) > 0 and len(iron_input[0]) > 0:
-                input_flow[coal_input[0][0], coal_input[1][0], 0] = 2.0
-                input_flow[iron_input[0][0], iron_input[1][0], 1] = 1.0
+                input_flow[coal_input[0][0], coal_input[1][0], 0] = self.coal_per_steel
+                input_flow[iron_input[0][0], iron_input[1][0], 1] = self.iron_per_steel
                 self.is_cooking = True
-                self._time_left = 3
+                self._time_left = self.cook_time
             return input_flow, 0.0
\ No newline at end of file
@@ -1,21 +1,80 @@
 from .types import EquipmentType, ResourceType
 from .equipment import Equipment, Belt, Mine, Furnace
+from .engine import ArrayEngine
+from .graph import FlowGraph
+from .profiling import StepProfiler
+from .state import FactoryState
+from .terrain import TerrainGenerator
+from .world import ChunkedWorld
 import numpy as np
 from typing import Optional
 
+ENGINES = ("object", "array", "graph")
+
+# Names equipment objects are reported under to a `StepProfiler`, as by `ArrayEngine`
+_KINDS = {Belt: "belt", Mine: "mine", Furnace: "furnace"}
+
 class Factory:
-    def __init__(self, cursor_pos=(0, 0), map_size=(32, 32)):
+    def __init__(self, cursor_pos=(0, 0), map_size=(32, 32), engine="object", chunk_size: Optional[int] = None):
+        """Creates an empty factory.
+
+        `engine` selects how equipment is simulated: "object" steps each
+        `Equipment` instance in turn, "array" steps all of them at once with an
+        `ArrayEngine`. Both produce the same resource flows. "graph" is the
+        array engine with contention settled in topological order of the
+        belt network instead of build order, see `flow_graph`. It settles
+        contention differently but does no less work per tick.
+
+        With a `chunk_size` resources live in a `ChunkedWorld` of chunks that
+        many cells wide instead of one dense array, so memory and reset cost
+        follow the area in use rather than the map. This needs the array engine.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Invalid engine {engine!r}, expected one of {ENGINES}")
+        if chunk_size is not None and engine == "object":
+            raise ValueError("Chunked worlds need an array engine")
         self._x = cursor_pos[0]
         self._y = cursor_pos[1]
         self._map_size = map_size
 
-        self._resources = np.zeros((map_size[0], map_size[1], len(ResourceType)), dtype=np.float32)        
+        if chunk_size is not None:
+            self._world = ChunkedWorld(map_size, chunk_size)
+            self._resources = None
+        else:
+            self._world = None
+            self._resources = np.zeros((map_size[0], map_size[1], len(ResourceType)), dtype=np.float32)
         self._resource_amts = {}
+        self._base = None     # Read-only deposits last passed to set_deposits
+        self._terrain = None  # Generator and seed filling chunks on first access
+        self._engine = None
+        if engine != "object":
+            order = "topological" if engine == "graph" else "build"
+            self._engine = ArrayEngine(map_size, world=self._world, order=order)
 
+        # Simulated equipment objects, and the position of each in that list
+        # by cell (-1 where there is none) so it can be swap-removed in O(1).
+        # For each, the x and y of its own and its input cells, which are
+        # marked dirty whenever it moves anything
         self._equipment = []
-        self._equipment_map = [[EquipmentType.EMPTY for _ in range(map_size[1])] for _ in range(map_size[0])]
+        self._equipment_cells = []
+        self._equipment_slot = np.full(map_size, -1, dtype=np.int32) if self._engine is None else None
+        self._equipment_map = np.zeros(map_size, dtype=np.int8)
         self._equipment_amts = {}
 
+        self._dirty = np.zeros(map_size, dtype=bool)
+        self._dirty_cells = []
+
+        # Cells changed since the deposits were laid down, the rest match `_base`
+        self._touched = np.zeros(map_size, dtype=bool)
+        self._touched_cells = []
+        self._profiler = None
+
+    def set_profiler(self, profiler: Optional[StepProfiler]):
+        """Reports the time spent on each kind of equipment in `step` to `profiler`, None to stop."""
+        self._profiler = profiler
+        if self._engine is not None:
+            self._engine.profiler = profiler
+
     def move_cursor(self, dx=0, dy=0):
         if self._x + dx < self._map_size[0] and self._x + dx >= 0: self._x += dx
         if self._y + dy < self._map_size[1] and self._y + dy >= 0: self._y += dy
@@ -24,74 +83,383 @@ class Factory:
         return (self._x, self._y)
 
     def get_equipment(self, x: int, y: int) -> EquipmentType:
-        return self._equipment_map[x][y]
+        return EquipmentType(self._equipment_map[x, y])
 
     def build_equipment(self, type: EquipmentType, pos: Optional[tuple[int, int]] = None):
         x = pos[0] if pos else self._x
         y = pos[1] if pos else self._y
-        if self._equipment_map[x][y] != EquipmentType.EMPTY:
+        if self._equipment_map[x, y] != EquipmentType.EMPTY:
             return
 
-        self._equipment_map[x][y] = type
+        self._equipment_map[x, y] = type
         self._equipment_amts[type] = self._equipment_amts.get(type, 0) + 1
+        self._mark_dirty(x, y)
         if type == EquipmentType.LEFT_BELT or type == EquipmentType.RIGHT_BELT:
             if x == 0 or x == self._map_size[0]-1: return
-            self._equipment.append(Belt((x, y), type))
         elif type == EquipmentType.UP_BELT or type == EquipmentType.DOWN_BELT:
             if y == 0 or y == self._map_size[1]-1: return
-            self._equipment.append(Belt((x, y), type))
-        elif type == EquipmentType.MINE:
-            self._equipment.append(Mine((x, y)))
+        elif type != EquipmentType.MINE and type != EquipmentType.FURNACE:
+            raise ValueError("Invalid equipment type")
+
+        if self._engine is not None:
+            self._engine.add(type, (x, y))
+            return
+        if type == EquipmentType.MINE:
+            self._add_object(Mine((x, y)))
         elif type == EquipmentType.FURNACE:
-            self._equipment.append(Furnace((x, y)))
+            self._add_object(Furnace((x, y)))
         else:
-            raise ValueError("Invalid equipment type")
+            self._add_object(Belt((x, y), type))
+
+    def _add_object(self, equipment: Equipment):
+        self._equipment_slot[equipment.pos] = len(self._equipment)
+        self._equipment.append(equipment)
+        x, y = self._input_cells(equipment.input)
+        self._equipment_cells.append((np.append(x, equipment.pos[0]), np.append(y, equipment.pos[1])))
 
     def destroy_equipment(self, pos: Optional[tuple[int, int]] = None):
         x = pos[0] if pos else self._x
         y = pos[1] if pos else self._y
-        if self._equipment_map[x][y] == EquipmentType.EMPTY:
+        type = EquipmentType(self._equipment_map[x, y])
+        if type == EquipmentType.EMPTY:
             return
 
-        self._equipment_map[x][y] = EquipmentType.EMPTY
+        self._equipment_map[x, y] = EquipmentType.EMPTY
         self._equipment_amts[type] = self._equipment_amts.get(type, 0) - 1
-        for equipment in self._equipment:
-            if equipment.pos == (x, y):
-                self._equipment.remove(equipment)
-                break
+        self._mark_dirty(x, y)
+        if self._engine is not None:
+            self._engine.remove((x, y))
+            return
+
+        # Belts facing off the map are never simulated and have no slot
+        slot = self._equipment_slot[x, y]
+        if slot < 0:
+            return
+        self._equipment_slot[x, y] = -1
+        last, last_cells = self._equipment.pop(), self._equipment_cells.pop()
+        if slot < len(self._equipment):
+            self._equipment[slot] = last
+            self._equipment_cells[slot] = last_cells
+            self._equipment_slot[last.pos] = slot
+
+    @property
+    def flow_graph(self) -> FlowGraph:
+        """The compiled belt network, cached until equipment is built or destroyed.
+
+        Its cells are the array engine's flat cell indices, see `cell_positions`.
+        """
+        if self._engine is None:
+            raise ValueError("The object engine does not compile a flow graph")
+        return self._engine.graph
+
+    def cell_positions(self, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Map coordinates of the array engine's flat cell indices."""
+        if self._world is not None:
+            return self._world.positions(cells)
+        return np.divmod(cells, self._map_size[1])
 
     def get_resources(self, x: int, y: int) -> dict[ResourceType, int]:
-        resources = {}
-        for i in range(len(ResourceType)):
-            resources[ResourceType(i)] = self._resources[x, y, i]
-        return resources
+        return dict(zip(ResourceType, self.get_resource_cell(x, y)))
+
+    def get_resource_cell(self, x: int, y: int) -> np.ndarray:
+        """Returns a read-only view of the resources at (x, y), indexed by `ResourceType`."""
+        if self._world is not None:
+            cell = self._world.cells(x, y)  # May grow the pool, so index `flat` afterwards
+            cell = self._world.flat[cell]
+        else:
+            cell = self._resources[x, y]
+        cell.flags.writeable = False
+        return cell
+
+    def get_resource_window(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Returns a read-only (w, h, len(ResourceType)) view of the resources starting at (x, y).
+
+        Chunked worlds return a copy instead of a view.
+        """
+        if self._world is not None:
+            window = self._world.window(x, y, w, h)
+        else:
+            window = self._resources[x:x+w, y:y+h]
+        window.flags.writeable = False
+        return window
+
+    def get_equipment_window(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Returns a read-only (w, h) view of the `EquipmentType` values starting at (x, y)."""
+        window = self._equipment_map[x:x+w, y:y+h]
+        window.flags.writeable = False
+        return window
+
+    def get_resource_cells(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Returns a (len(x), len(ResourceType)) array of the resources at each (x[i], y[i])."""
+        if self._world is not None:
+            cells = self._world.cells(x, y)
+            return self._world.flat[cells]
+        return self._resources[x, y]
+
+    def get_equipment_cells(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Returns the `EquipmentType` value at each (x[i], y[i])."""
+        return self._equipment_map[x, y]
+
+    def pop_dirty(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the cells whose equipment or resources changed since the last call."""
+        if not self._dirty_cells:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        x = np.concatenate([cells[0] for cells in self._dirty_cells])
+        y = np.concatenate([cells[1] for cells in self._dirty_cells])
+        self._dirty[x, y] = False
+        self._dirty_cells = []
+        return x, y
+
+    def _mark_dirty(self, x, y, touch: bool = True):
+        x, y = np.atleast_1d(x), np.atleast_1d(y)
+        fresh = ~self._dirty[x, y]
+        if fresh.any():
+            self._dirty[x[fresh], y[fresh]] = True
+            self._dirty_cells.append((x[fresh], y[fresh]))
+        if touch:
+            fresh = ~self._touched[x, y]
+            if fresh.any():
+                self._touched[x[fresh], y[fresh]] = True
+                self._touched_cells.append((x[fresh], y[fresh]))
+
+    def _touched_positions(self) -> tuple[np.ndarray, np.ndarray]:
+        if not self._touched_cells:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if len(self._touched_cells) > 1:
+            self._touched_cells = [(np.concatenate([cells[0] for cells in self._touched_cells]),
+                np.concatenate([cells[1] for cells in self._touched_cells]))]
+        return self._touched_cells[0]
 
     def get_resource_amt(self, resource: ResourceType) -> int:
         return self._resource_amts.get(resource, 0)
 
+    def get_resource_totals(self) -> np.ndarray:
+        """Resources summed over the map, over the chunks generated so far in chunked worlds."""
+        if self._world is not None:
+            resources = self._world.chunks[:self._world.num_chunks]
+        else:
+            resources = self._resources
+        return resources.reshape(-1, len(ResourceType)).sum(axis=0, dtype=np.float64)
+
     def get_equipment_amt(self, type: EquipmentType) -> int:
         return self._equipment_amts.get(type, 0)
     
     def add_resource(self, x: int, y: int, resource: ResourceType, amt: int):
-        self._resources[x, y, resource] = amt
+        if self._world is not None:
+            cell = self._world.cells(x, y)
+            self._world.flat[cell, resource] = amt
+        else:
+            self._resources[x, y, resource] = amt
+        self._mark_dirty(x, y)
         self._resource_amts[resource] = self._resource_amts.get(resource, 0) + amt
 
+    def set_deposits(self, deposits: np.ndarray):
+        """Overwrites the coal and iron deposit layers with a (W, H, 2) array in one assignment."""
+        deposit_channels = slice(ResourceType.COAL_DEPOSIT, ResourceType.IRON_DEPOSIT+1)
+        if self._world is not None:
+            self._world.set_window(0, 0, deposits, deposit_channels)
+        else:
+            self._resources[:, :, deposit_channels] = deposits
+            self._base = np.array(deposits, dtype=np.float32)
+            self._base.flags.writeable = False
+        for resource in (ResourceType.COAL_DEPOSIT, ResourceType.IRON_DEPOSIT):
+            self._resource_amts[resource] = self._resource_amts.get(resource, 0) + deposits[:, :, resource].sum()
+        self._mark_dirty(*np.nonzero(deposits.any(axis=2)), touch=self._world is not None)
+
+    def set_terrain(self, terrain: TerrainGenerator, seed: int):
+        """Fills the deposit layers with `terrain.generate(map_size, seed)`.
+
+        Chunked worlds generate each chunk's deposits only when the chunk is
+        first accessed, so deposit totals only count chunks generated so far.
+        """
+        if self._world is None:
+            self.set_deposits(terrain.generate(self._map_size, seed))
+            return
+        self._world.clear()
+        self._set_fill(terrain, seed)
+
+    def _set_fill(self, terrain: Optional[TerrainGenerator], seed: int):
+        self._terrain = (terrain, seed) if terrain is not None else None
+        if terrain is None:
+            self._world.fill = None
+            return
+
+        def fill(chunk: np.ndarray, x: int, y: int):
+            deposits = terrain.generate(chunk.shape[:2], seed, (x, y))
+            chunk[:, :, ResourceType.COAL_DEPOSIT:ResourceType.IRON_DEPOSIT+1] = deposits
+            for resource in (ResourceType.COAL_DEPOSIT, ResourceType.IRON_DEPOSIT):
+                self._resource_amts[resource] = self._resource_amts.get(resource, 0) + deposits[:, :, resource].sum()
+        self._world.fill = fill
+
     def step(self) -> dict[ResourceType, int]:
         """Computes next step in resource flow and returns increases in resources"""
+        if self._engine is not None:
+            resources = self._world.flat if self._world is not None else self._resources
+            resource_changes = self._engine.step(resources)[0]
+            self._mark_dirty(*self.cell_positions(self._engine.changed_cells))
+            return {ResourceType(i): resource_changes[i] for i in range(len(ResourceType))}
+
         old_resources = np.copy(self._resources)
         resource_changes = np.zeros(len(ResourceType), dtype=np.float32)
-        for equipment in self._equipment:
+        profiler = self._profiler
+        moved = np.zeros(len(self._equipment), dtype=bool)
+        for i, equipment in enumerate(self._equipment):
             in_flow, out_flow = equipment.process(old_resources[equipment.input])
             self._resources[equipment.output] += out_flow
             resource_changes[equipment.output[-1],] += out_flow
             self._resources[equipment.input] -= in_flow
             old_resources[equipment.input] -= in_flow
+            # Belts and mines return the same array for both flows
+            moved[i] = in_flow.any() or (out_flow is not in_flow and np.any(out_flow))
+            if profiler is not None:
+                profiler.lap_equipment(_KINDS[type(equipment)], 1)
 
+        if moved.any():
+            cells = [self._equipment_cells[i] for i in np.flatnonzero(moved)]
+            self._mark_dirty(np.concatenate([x for x, _ in cells]), np.concatenate([y for _, y in cells]))
         return {ResourceType(i): resource_changes[i] for i in range(len(ResourceType))}
 
+    def advance(self, ticks: int) -> dict[ResourceType, float]:
+        """Runs `ticks` steps and returns the summed increases in resources.
+
+        Array engines skip stretches where the factory settles into moving
+        the same amounts every tick in bulk, see `ArrayEngine.advance`.
+        """
+        if self._engine is None:
+            totals = np.zeros(len(ResourceType), dtype=np.float64)
+            for _ in range(ticks):
+                totals += list(self.step().values())
+            return {ResourceType(i): totals[i] for i in range(len(ResourceType))}
+
+        resources = self._world.flat if self._world is not None else self._resources
+        totals = self._engine.advance(resources, ticks)[0]
+        self._mark_dirty(*self.cell_positions(self._engine.changed_cells))
+        return {ResourceType(i): totals[i] for i in range(len(ResourceType))}
+
+    def _input_cells(self, input: tuple) -> tuple[np.ndarray, np.ndarray]:
+        x, y = input[0], input[1]
+        if isinstance(x, slice):
+            x, y = np.meshgrid(np.arange(self._map_size[0])[x], np.arange(self._map_size[1])[y], indexing='ij')
+        return np.ravel(x), np.ravel(y)
+
     def reset(self, cursor: tuple[int, int] = (0, 0)):
         self._x, self._y = cursor
-        self._equipment_map = [[EquipmentType.EMPTY for _ in range(self._map_size[1])] for _ in range(self._map_size[0])]
-        self._resource_map = [[{} for _ in range(self._map_size[1])] for _ in range(self._map_size[0])]
-        self._resource_flows = []
-        self._resource_amts = {} 
\ No newline at end of file
+        if self._world is not None:
+            self._world.clear()
+            self._set_fill(None, 0)
+        else:
+            self._resources[:] = 0.0
+        self._resource_amts = {}
+        self._base = None
+
+        self._equipment = []
+        self._equipment_cells = []
+        if self._equipment_slot is not None:
+            self._equipment_slot[:] = -1
+        self._equipment_map[:] = EquipmentType.EMPTY
+        self._equipment_amts = {}
+        if self._engine is not None:
+            self._engine.clear()
+        self._dirty[:] = False
+        self._dirty_cells = []
+        self._touched[:] = False
+        self._touched_cells = []
+
+    def get_state(self) -> FactoryState:
+        """Captures the cursor, resources, equipment and furnace timers.
+
+        The state shares the deposits with the factory and stores only the
+        cells changed since, so taking one costs time proportional to the
+        built-up area. Chunked worlds copy their allocated chunks instead.
+        """
+        x, y = self._touched_positions()
+        if self._engine is not None:
+            order = self._engine.equipment_cells()
+            is_cooking, time_left = self._engine.furnace_timers(order)
+            order = np.stack(self.cell_positions(order), axis=1)
+        else:
+            order = np.array([equipment.pos for equipment in self._equipment], dtype=np.int64).reshape(-1, 2)
+            is_cooking = np.array([getattr(equipment, 'is_cooking', False) for equipment in self._equipment], dtype=bool)
+            time_left = np.array([getattr(equipment, '_time_left', 0) for equipment in self._equipment], dtype=np.int32)
+
+        chunks = None
+        if self._world is not None:
+            chunks = self._world.snapshot()
+        state = FactoryState(map_size=tuple(self._map_size), cursor=self.get_cursor(), steps=0, base=self._base,
+            cells=np.stack([x, y], axis=1), resources=self.get_resource_cells(x, y).copy(),
+            equipment=self._equipment_map[x, y], order=order, is_cooking=is_cooking, time_left=time_left,
+            resource_amts=np.array([self._resource_amts.get(resource, 0) for resource in ResourceType], dtype=np.float64),
+            engine=self._engine.snapshot() if self._engine is not None else None, chunks=chunks, terrain=self._terrain)
+        for array in (state.cells, state.resources, state.equipment, state.order, state.is_cooking,
+                state.time_left, state.resource_amts, *(state.engine or {}).values()):
+            array.flags.writeable = False
+        return state
+
+    def set_state(self, state: FactoryState):
+        """Restores a state from `get_state`, of this or any factory of the same map size.
+
+        Only cells changed since the deposits were laid down are rewritten
+        when the state shares this factory's deposits, otherwise the whole
+        map is. Restored cells are marked dirty.
+        """
+        if tuple(state.map_size) != tuple(self._map_size):
+            raise ValueError(f"State of a {state.map_size} map does not fit a {self._map_size} map")
+        if (state.chunks is not None) != (self._world is not None):
+            raise ValueError("States of chunked and dense worlds are not interchangeable")
+
+        # Undo every change since the deposits were laid down
+        x, y = self._touched_positions()
+        sx, sy = state.cells[:, 0], state.cells[:, 1]
+        if self._world is not None:
+            self._world.load(*state.chunks)
+            self._set_fill(*(state.terrain or (None, 0)))
+        elif state.base is self._base:
+            self._resources[x, y] = 0.0
+            if self._base is not None:
+                self._resources[x, y, ResourceType.COAL_DEPOSIT:ResourceType.IRON_DEPOSIT+1] = self._base[x, y]
+        else:
+            self._resources[:] = 0.0
+            if state.base is not None:
+                self._resources[:, :, ResourceType.COAL_DEPOSIT:ResourceType.IRON_DEPOSIT+1] = state.base
+            self._base = state.base
+            self._mark_dirty(*np.nonzero(np.ones(self._map_size, dtype=bool)), touch=False)
+        if self._world is None:
+            self._resources[sx, sy] = state.resources
+        self._equipment_map[x, y] = EquipmentType.EMPTY
+        self._equipment_map[sx, sy] = state.equipment
+        self._touched[x, y] = False
+        self._touched_cells = []
+        self._mark_dirty(x, y, touch=False)
+        self._mark_dirty(sx, sy)
+
+        self._x, self._y = state.cursor
+        self._resource_amts = {resource: state.resource_amts[resource] for resource in ResourceType}
+        types, counts = np.unique(state.equipment[state.equipment != EquipmentType.EMPTY], return_counts=True)
+        self._equipment_amts = {EquipmentType(type): int(count) for type, count in zip(types, counts)}
+
+        # Rebuild the simulated equipment in stepping order
+        if self._engine is not None and state.engine is not None:
+            self._engine.load(state.engine)
+            return
+        ox, oy = state.order[:, 0], state.order[:, 1]
+        types = self._equipment_map[ox, oy]
+        if self._engine is not None:
+            self._engine.clear()
+            self._engine.add_batch(types, ox, oy, np.zeros(len(ox), dtype=np.int64))
+            self._engine.set_furnace_timers(self._engine.cell(ox, oy), state.is_cooking, state.time_left)
+            return
+        for equipment in self._equipment:
+            self._equipment_slot[equipment.pos] = -1
+        self._equipment = []
+        self._equipment_cells = []
+        for i, (pos, type) in enumerate(zip(state.order.tolist(), types)):
+            pos = tuple(pos)
+            if type == EquipmentType.MINE:
+                equipment = Mine(pos)
+            elif type == EquipmentType.FURNACE:
+                equipment = Furnace(pos)
+                equipment.is_cooking = bool(state.is_cooking[i])
+                equipment._time_left = int(state.time_left[i])
+            else:
+                equipment = Belt(pos, EquipmentType(type))
+            self._add_object(equipment) 
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""Pure-functional `FactoryEnv` step on fixed-shape arrays, for `jax.jit` and `jax.vmap`.
+
+`step(state, action) -> (state, reward)` applies an action and advances
+the factory one tick with the same rules as the object engine, every
+cell at once. Like `ArrayEngine` it sums what is taken from a cell in
+another order than stepping one piece of equipment at a time does, so
+states match `FactoryEnv` exactly while resource amounts are whole
+numbers, as those of generated terrain are. Rewards may differ in the
+last bits, XLA fuses their multiply-adds on CPU.
+Equipment lives in grids; the order it is stepped in, which
+decides who gets contended resources, is kept as a list of cells with a
+fixed capacity that builds append to and destroys swap-remove from, as
+`Factory` does with its equipment objects. Builds beyond the capacity are
+ignored, so pick `max_equipment` above the number of steps an episode
+can build in.
+
+Needs `jax`, which the rest of the package does not.
+"""
+
+import functools
+from typing import NamedTuple
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from .env import FactoryAction
+from .equipment import Belt, Mine, Furnace
+from .engine import BELT_OFFSETS, DEPOSITS, ORES, ITEMS
+from .state import FactoryState
+from .types import EquipmentType, ResourceType
+
+class CoreState(NamedTuple):
+    resources: jax.Array    # (W, H, len(ResourceType)) float32
+    equipment: jax.Array    # (W, H) int8 `EquipmentType`
+    is_cooking: jax.Array   # (W, H) bool, furnace timers by cell
+    time_left: jax.Array    # (W, H) int32
+    slot: jax.Array         # (W, H) int32 position of each cell in `order`, -1 when not simulated
+    order: jax.Array        # (max_equipment,) int32 flat cells (x * H + y) in stepping order
+    count: jax.Array        # () int32 entries of `order` in use
+    cursor: jax.Array       # (2,) int32
+    steps: jax.Array        # () int32
+
+def _action_table(values: dict, default=0, dtype=np.int32) -> np.ndarray:
+    table = np.full(len(FactoryAction), default, dtype=dtype)
+    for action, value in values.items():
+        table[action] = value
+    return table
+
+_MOVE = np.stack([
+    _action_table({FactoryAction.MOVE_CURSOR_LEFT: -1, FactoryAction.MOVE_CURSOR_RIGHT: 1}),
+    _action_table({FactoryAction.MOVE_CURSOR_UP: -1, FactoryAction.MOVE_CURSOR_DOWN: 1})], axis=1)
+_BUILD = _action_table({
+    FactoryAction.BUILD_LEFT_BELT: EquipmentType.LEFT_BELT,
+    FactoryAction.BUILD_RIGHT_BELT: EquipmentType.RIGHT_BELT,
+    FactoryAction.BUILD_UP_BELT: EquipmentType.UP_BELT,
+    FactoryAction.BUILD_DOWN_BELT: EquipmentType.DOWN_BELT,
+    FactoryAction.BUILD_MINE: EquipmentType.MINE,
+    FactoryAction.BUILD_FURNACE: EquipmentType.FURNACE})
+# Same costs as `FactoryEnv.step`
+_COST = _action_table({
+    FactoryAction.MOVE_CURSOR_LEFT: 1.0, FactoryAction.MOVE_CURSOR_RIGHT: 1.0,
+    FactoryAction.MOVE_CURSOR_UP: 1.0, FactoryAction.MOVE_CURSOR_DOWN: 1.0,
+    FactoryAction.BUILD_LEFT_BELT: 5.0, FactoryAction.BUILD_RIGHT_BELT: 5.0,
+    FactoryAction.BUILD_UP_BELT: 5.0, FactoryAction.BUILD_DOWN_BELT: 5.0,
+    FactoryAction.BUILD_MINE: 500.0, FactoryAction.BUILD_FURNACE: 1000.0}, dtype=np.float32)
+
+# Each belt type and the offset of the cell it pulls items from
+_BELTS = tuple(BELT_OFFSETS.items())
+# Furnace window in the order `Furnace.process` searches it, x major
+_WINDOW = tuple((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+_ABSENT = np.iinfo(np.int32).max
+
+def from_factory(factory, max_equipment: int = 256, steps: int = 0) -> CoreState:
+    """Converts any `Factory` to a `CoreState`, its equipment order included."""
+    return from_state(factory.get_state(), factory.get_resource_window(0, 0, *factory._map_size),
+        factory.get_equipment_window(0, 0, *factory._map_size), max_equipment, steps)
+
+def from_state(state: FactoryState, resources: np.ndarray, equipment: np.ndarray, max_equipment: int = 256,
+        steps: int = 0) -> CoreState:
+    """Builds a `CoreState` from a `FactoryState` and the full resource and equipment grids it describes."""
+    w, h = state.map_size
+    if len(state.order) > max_equipment:
+        raise ValueError(f"{len(state.order)} pieces of equipment do not fit max_equipment={max_equipment}")
+    order = np.zeros(max_equipment, dtype=np.int32)
+    slot = np.full((w, h), -1, dtype=np.int32)
+    is_cooking = np.zeros((w, h), dtype=bool)
+    time_left = np.zeros((w, h), dtype=np.int32)
+    if len(state.order):
+        x, y = state.order[:, 0], state.order[:, 1]
+        order[:len(x)] = x * h + y
+        slot[x, y] = np.arange(len(x))
+        is_cooking[x, y] = state.is_cooking
+        time_left[x, y] = state.time_left
+    return CoreState(resources=jnp.asarray(resources, dtype=jnp.float32), equipment=jnp.asarray(equipment, dtype=jnp.int8),
+        is_cooking=jnp.asarray(is_cooking), time_left=jnp.asarray(time_left), slot=jnp.asarray(slot),
+        order=jnp.asarray(order), count=jnp.int32(len(state.order)),
+        cursor=jnp.asarray(state.cursor, dtype=jnp.int32), steps=jnp.int32(steps))
+
+def stack(states: list[CoreState]) -> CoreState:
+    """Batches states along a new leading axis, for `jax.vmap(step)`."""
+    return jax.tree_util.tree_map(lambda *arrays: jnp.stack(arrays), *states)
+
+def step(state: CoreState, action) -> tuple[CoreState, jax.Array]:
+    """Applies `action` and advances the factory one tick, returning the new state and the reward."""
+    action = jnp.asarray(action, dtype=jnp.int32)
+    w, h = state.equipment.shape
+    cursor = state.cursor + jnp.asarray(_MOVE)[action]
+    cursor = jnp.where((cursor >= 0) & (cursor < jnp.array([w, h])), cursor, state.cursor)
+    state = state._replace(cursor=cursor)
+
+    build = jnp.asarray(_BUILD)[action]
+    state = jax.lax.cond(build != EquipmentType.EMPTY, _build, lambda s, _: s, state, build)
+    state = jax.lax.cond(action == FactoryAction.DESTROY_EQUIPMENT, _destroy, lambda s: s, state)
+
+    state, changes = _tick(state)
+    reward = -jnp.asarray(_COST)[action]
+    reward = reward + changes[ResourceType.PAPERCLIP] * 20.0
+    reward = reward + changes[ResourceType.STEEL] * 10.0
+    reward = reward + changes[ResourceType.IRON_ORE] * 0.01
+    reward = reward + changes[ResourceType.COAL_ORE] * 0.01
+    return state._replace(steps=state.steps + 1), reward
+
+def _build(state: CoreState, type) -> CoreState:
+    w, h = state.equipment.shape
+    x, y = state.cursor[0], state.cursor[1]
+    # Belts facing off the map are placed but never simulated
+    horizontal = (type == EquipmentType.LEFT_BELT) | (type == EquipmentType.RIGHT_BELT)
+    vertical = (type == EquipmentType.UP_BELT) | (type == EquipmentType.DOWN_BELT)
+    inert = (horizontal & ((x == 0) | (x == w - 1))) | (vertical & ((y == 0) | (y == h - 1)))
+    full = state.count >= len(state.order)
+    place = (state.equipment[x, y] == EquipmentType.EMPTY) & ~(full & ~inert)
+    simulate = place & ~inert
+    return state._replace(
+        equipment=state.equipment.at[x, y].set(jnp.where(place, type, state.equipment[x, y]).astype(jnp.int8)),
+        is_cooking=state.is_cooking.at[x, y].set(jnp.where(place, False, state.is_cooking[x, y])),
+        time_left=state.time_left.at[x, y].set(jnp.where(place, 0, state.time_left[x, y])),
+        slot=state.slot.at[x, y].set(jnp.where(simulate, state.count, state.slot[x, y])),
+        order=state.order.at[jnp.minimum(state.count, len(state.order) - 1)].set(
+            jnp.where(simulate, x * h + y, state.order[jnp.minimum(state.count, len(state.order) - 1)])),
+        count=state.count + simulate)
+
+def _destroy(state: CoreState) -> CoreState:
+    w, h = state.equipment.shape
+    x, y = state.cursor[0], state.cursor[1]
+    slot = state.slot[x, y]
+    simulated = slot >= 0
+    # Swap-remove: the last entry of the order takes the destroyed one's place
+    last = state.order[jnp.maximum(state.count - 1, 0)]
+    order = state.order.at[jnp.maximum(slot, 0)].set(jnp.where(simulated, last, state.order[jnp.maximum(slot, 0)]))
+    slots = state.slot.reshape(-1)
+    slots = slots.at[last].set(jnp.where(simulated, slot, slots[last]))
+    slots = slots.at[x * h + y].set(-1)
+    return state._replace(equipment=state.equipment.at[x, y].set(jnp.int8(EquipmentType.EMPTY)),
+        is_cooking=state.is_cooking.at[x, y].set(False), time_left=state.time_left.at[x, y].set(0),
+        slot=slots.reshape(w, h), order=order, count=state.count - simulated)
+
+def _shift(grid: jax.Array, dx: int, dy: int, fill=0) -> jax.Array:
+    """`grid` moved by (dx, dy): cell (x, y) holds grid[x - dx, y - dy], `fill` where that is off the map."""
+    w, h = grid.shape[:2]
+    pad = [(max(dx, 0), max(-dx, 0)), (max(dy, 0), max(-dy, 0))] + [(0, 0)] * (grid.ndim - 2)
+    x, y = max(-dx, 0), max(-dy, 0)
+    return jnp.pad(grid, pad, constant_values=fill)[x:x + w, y:y + h]
+
+def _bits(flags) -> jax.Array:
+    """Packs a sequence of boolean grids into the bits of one int32 grid, the first in the lowest bit."""
+    return functools.reduce(jnp.bitwise_or, [flag.astype(jnp.int32) << k for k, flag in enumerate(flags)])
+
+def _tick(state: CoreState) -> tuple[CoreState, jax.Array]:
+    """Advances every simulated piece of equipment one tick, as if stepped one by one in `order`.
+
+    Each cell is read by at most the four belts around it and the nine
+    furnaces whose window holds it, ranked by `slot`. As with the belt ranks
+    of `ArrayEngine`, a reader finds the cell's items at the tick's start
+    less a full `Belt.flow_rate` for each belt ranked before it and the ore
+    of each furnace before it that starts from this cell, floored at zero:
+    a belt only takes less than its rate when it empties the cell, and a
+    furnace only takes from a cell holding more than it needs. Only which
+    furnaces start depends on other readers, and only on those before them,
+    so starting from no furnace taking anything and recomputing them all
+    from what the others took settles on the sequential result once
+    nothing changes, after as many rounds as the longest run of furnaces
+    waiting on each other, usually one.
+
+    Flags per window position are packed into the bits of one grid and
+    counted with `population_count`: under `jax.vmap` every grid written
+    out costs more than the arithmetic on it.
+    """
+    w, h = state.equipment.shape
+    kind, slot, left = state.equipment, state.slot, state.time_left
+    simulated = slot >= 0
+    amounts = [state.resources[..., resource] for resource in range(len(ResourceType))]
+
+    mine = (kind == EquipmentType.MINE) & simulated
+    mine_flow = [jnp.where(mine, jnp.minimum(amounts[deposit], Mine.flow_rate), 0.0)
+        for deposit in range(DEPOSITS.start, DEPOSITS.stop)]
+    furnace = (kind == EquipmentType.FURNACE) & simulated
+    steel = furnace & (left == 1)
+    # Like the slice in `Furnace`, windows against the top and left edges are empty
+    reads = furnace & (left == 0) & (jnp.arange(w) > 0)[:, None] & (jnp.arange(h) > 0)[None, :]
+    belts = [(kind == type) & simulated for type, _ in _BELTS]
+
+    # Slot of every reader of each cell, by the belt type or window position it reads the cell as
+    belt_ranks = [_shift(jnp.where(belt, slot, _ABSENT), dx, dy, _ABSENT) for belt, (_, (dx, dy)) in zip(belts, _BELTS)]
+    window_ranks = [_shift(jnp.where(reads, slot, _ABSENT), dx, dy, _ABSENT) for dx, dy in _WINDOW]
+
+    def belts_before(rank):
+        return sum((other < rank).astype(jnp.float32) for other in belt_ranks) * Belt.flow_rate
+
+    # What each furnace reader finds with no other furnace taking, and which furnace readers go before it
+    coal_left, iron_left = [], []
+    for rank in window_ranks:
+        taken = belts_before(rank)
+        coal_left.append(amounts[ResourceType.COAL_ORE] - taken)
+        iron_left.append(amounts[ResourceType.IRON_ORE] - taken)
+    earlier = [_bits(other < rank for other in window_ranks) for rank in window_ranks]
+
+    def takes(decisions):
+        """Bits of the window positions whose furnace takes coal, and iron, from each cell."""
+        start, coal_at, iron_at = decisions
+        return (_bits(_shift(start & (coal_at == k), dx, dy) for k, (dx, dy) in enumerate(_WINDOW)),
+            _bits(_shift(start & (iron_at == k), dx, dy) for k, (dx, dy) in enumerate(_WINDOW)))
+
+    def decide(coal_found, iron_found):
+        """Which idle furnaces start and where they take their ore from, given the ore each finds."""
+        has_coal = _bits(_shift(found > Furnace.coal_per_steel, -dx, -dy) for found, (dx, dy) in zip(coal_found, _WINDOW))
+        has_iron = _bits(_shift(found > Furnace.iron_per_steel, -dx, -dy) for found, (dx, dy) in zip(iron_found, _WINDOW))
+        start = reads & (has_coal != 0) & (has_iron != 0)
+        # The lowest set bit is the first window position holding enough
+        lowest = lambda bits: jax.lax.population_count((bits & -bits) - 1)
+        return start, jnp.where(start, lowest(has_coal), 0), jnp.where(start, lowest(has_iron), 0)
+
+    def settle(carry):
+        decisions, _ = carry
+        coal_taken, iron_taken = takes(decisions)
+        settled = decide(
+            [found - jax.lax.population_count(first & coal_taken) * Furnace.coal_per_steel
+                for found, first in zip(coal_left, earlier)],
+            [found - jax.lax.population_count(first & iron_taken) * Furnace.iron_per_steel
+                for found, first in zip(iron_left, earlier)])
+        changed = functools.reduce(jnp.logical_or, [jnp.any(a != b) for a, b in zip(settled, decisions)])
+        return settled, changed
+
+    decisions, _ = jax.lax.while_loop(lambda carry: carry[1], settle, (decide(coal_left, iron_left), True))
+    start = decisions[0]
+    coal_taken, iron_taken = takes(decisions)
+
+    new = list(amounts)
+    for deposit, ore, flow in zip(range(DEPOSITS.start, DEPOSITS.stop), range(ORES.start, ORES.stop), mine_flow):
+        new[ore] = new[ore] + flow
+        new[deposit] = new[deposit] - flow
+    new[ResourceType.COAL_ORE] = new[ResourceType.COAL_ORE] - jax.lax.population_count(coal_taken) * Furnace.coal_per_steel
+    new[ResourceType.IRON_ORE] = new[ResourceType.IRON_ORE] - jax.lax.population_count(iron_taken) * Furnace.iron_per_steel
+    new[ResourceType.STEEL] = new[ResourceType.STEEL] + jnp.where(steel, 1.0, 0.0)
+    # Steel and paperclips are only ever taken by belts, ore by belts and furnaces. Stacking
+    # the flows writes each out once rather than XLA recomputing it for every use.
+    flows = []
+    for rank in belt_ranks:
+        taken = belts_before(rank)
+        first = _bits(other < rank for other in window_ranks)
+        furnaces_before = {
+            ResourceType.COAL_ORE: jax.lax.population_count(first & coal_taken) * Furnace.coal_per_steel,
+            ResourceType.IRON_ORE: jax.lax.population_count(first & iron_taken) * Furnace.iron_per_steel}
+        for item in range(ITEMS.start, ITEMS.stop):
+            flow = amounts[item] - taken - furnaces_before.get(item, 0)
+            flows.append(jnp.where(rank != _ABSENT, jnp.clip(flow, 0.0, Belt.flow_rate), 0.0))
+    flows = jnp.stack(flows).reshape(len(_BELTS), ITEMS.stop - ITEMS.start, w, h)
+    moved = []
+    for i, item in enumerate(range(ITEMS.start, ITEMS.stop)):
+        moved.append(sum(jnp.where(belt, _shift(flows[b, i], -dx, -dy), 0.0)
+            for b, (belt, (_, (dx, dy))) in enumerate(zip(belts, _BELTS))))
+        new[item] = new[item] - flows[:, i].sum(axis=0) + moved[i]
+
+    left = jnp.where(furnace & (left > 0), left - 1, left)
+    left = jnp.where(start, Furnace.cook_time, left)
+    changes = jnp.zeros(len(ResourceType), dtype=jnp.float32)
+    changes = changes.at[ORES].add(jnp.stack([flow.sum() for flow in mine_flow]))
+    changes = changes.at[ITEMS].add(jnp.stack([flow.sum() for flow in moved]))
+    changes = changes.at[ResourceType.STEEL].add(steel.sum())
+    return state._replace(resources=jnp.stack(new, axis=-1), is_cooking=left > 0, time_left=left), changes
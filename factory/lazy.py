@@ -0,0 +1,69 @@
+from collections.abc import Mapping
+from typing import Callable
+
+import numpy as np
+
+class StaleError(RuntimeError):
+    """Raised when a lazy value is first read after its environment moved on to another step."""
+
+class LazyObservation:
+    """Observation of one step, rendered the first time it is converted to an array and cached.
+
+    Supports `np.asarray`, indexing, `shape` and `dtype`; `get()` returns
+    the array itself.
+    """
+
+    def __init__(self, env, compute: Callable[[], np.ndarray], shape: tuple, dtype=np.uint8):
+        self._env = env
+        self._version = env._version
+        self._compute = compute
+        self._value = None
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+
+    def get(self) -> np.ndarray:
+        if self._compute is not None:
+            if self._env._version != self._version:
+                raise StaleError("Lazy observation read after the environment was stepped or reset")
+            self._value = self._compute()
+            self._compute = self._env = None
+        return self._value
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.get()
+        if dtype is not None and dtype != array.dtype:
+            return array.astype(dtype)
+        return array.copy() if copy else array
+
+    def __getitem__(self, index):
+        return self.get()[index]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def materialized(self) -> bool:
+        return self._compute is None
+
+class LazyInfo(Mapping):
+    """Info dict of one step, `entries` maps its keys to functions computing them on first access."""
+
+    def __init__(self, env, entries: dict[str, Callable]):
+        self._env = env
+        self._version = env._version
+        self._entries = entries
+        self._values = {}
+
+    def __getitem__(self, key: str):
+        if key not in self._values:
+            compute = self._entries[key]
+            if self._env._version != self._version:
+                raise StaleError(f"Lazy info[{key!r}] read after the environment was stepped or reset")
+            self._values[key] = compute()
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
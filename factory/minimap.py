@@ -0,0 +1,81 @@
+import numpy as np
+
+from .symbolic import AMOUNTS, QUANTIZE_STEP
+from .types import EquipmentType
+
+# Channel layout of a minimap: mean quantized deposit and ore amounts, the
+# density of belts, mines and furnaces, then the cursor's block.
+EQUIPMENT_OFFSET = AMOUNTS.stop - AMOUNTS.start
+CURSOR_CHANNEL = EQUIPMENT_OFFSET + 3
+NUM_CHANNELS = CURSOR_CHANNEL + 1
+
+# Minimap equipment channel of each `EquipmentType`, one-hot
+_CATEGORIES = np.zeros((len(EquipmentType), 3), dtype=np.int64)
+_CATEGORIES[[EquipmentType.LEFT_BELT, EquipmentType.RIGHT_BELT, EquipmentType.UP_BELT, EquipmentType.DOWN_BELT], 0] = 1
+_CATEGORIES[EquipmentType.MINE, 1] = 1
+_CATEGORIES[EquipmentType.FURNACE, 2] = 1
+
+def minimap_shape(size: tuple[int, int]) -> tuple[int, int, int]:
+    return tuple(size) + (NUM_CHANNELS,)
+
+class Minimap:
+    """Low-resolution (size, NUM_CHANNELS) uint8 summary of a whole map, kept current cell by cell.
+
+    The map is split into blocks of ceil(W / size[0]) x ceil(H / size[1])
+    cells. Each block holds the mean of its cells' quantized deposit and ore
+    levels, as in `symbolic_grid` and rounded up, and the share of its cells
+    with each kind of equipment, scaled to 255. Block sums are integers
+    updated only for the cells passed to `update`, so keeping the minimap
+    current costs time proportional to the cells that changed, not the map.
+    """
+
+    def __init__(self, map_size: tuple[int, int], size: tuple[int, int] = (8, 8)):
+        self.size = tuple(size)
+        self._block = (-(-map_size[0] // size[0]), -(-map_size[1] // size[1]))
+        self._levels = np.zeros(tuple(map_size) + (EQUIPMENT_OFFSET,), dtype=np.uint8)
+        self._equipment = np.zeros(map_size, dtype=np.int8)
+        self._sums = np.zeros(self.size + (CURSOR_CHANNEL,), dtype=np.int64)
+
+        # Cells per block, fewer along the right and bottom edges and none past them
+        bx = np.bincount(np.arange(map_size[0]) // self._block[0], minlength=size[0])
+        by = np.bincount(np.arange(map_size[1]) // self._block[1], minlength=size[1])
+        self._cells = np.outer(bx, by)[..., None]
+        self._obs = np.zeros(minimap_shape(size), dtype=np.uint8)
+
+    def reset(self, resources: np.ndarray, equipment: np.ndarray):
+        """Summarizes the whole map from its (W, H, len(ResourceType)) resources and (W, H) equipment."""
+        self._levels[:] = _levels(resources)
+        self._equipment[:] = equipment
+        w, h = equipment.shape
+        bx, by = np.arange(w) // self._block[0], np.arange(h) // self._block[1]
+        self._sums[:] = 0
+        values = np.concatenate([self._levels.astype(np.int64), _CATEGORIES[self._equipment]], axis=-1)
+        np.add.at(self._sums, (bx[:, None], by[None, :]), values)
+
+    def update(self, x: np.ndarray, y: np.ndarray, resources: np.ndarray, equipment: np.ndarray):
+        """Re-summarizes cells (x[i], y[i]) from their current resources and equipment."""
+        if len(x) == 0:
+            return
+        # Each cell's change must be counted once
+        _, first = np.unique(x * self._equipment.shape[1] + y, return_index=True)
+        if len(first) < len(x):
+            x, y, resources, equipment = x[first], y[first], resources[first], equipment[first]
+        levels = _levels(resources)
+        delta = np.concatenate([levels.astype(np.int64) - self._levels[x, y],
+            _CATEGORIES[equipment] - _CATEGORIES[self._equipment[x, y]]], axis=-1)
+        self._levels[x, y] = levels
+        self._equipment[x, y] = equipment
+        np.add.at(self._sums, (x // self._block[0], y // self._block[1]), delta)
+
+    def render(self, cursor: tuple[int, int]) -> np.ndarray:
+        """Returns the minimap with the block holding `cursor` marked, a new array."""
+        cells = np.maximum(self._cells, 1)
+        obs = self._obs
+        obs[..., :EQUIPMENT_OFFSET] = np.minimum(-(-self._sums[..., :EQUIPMENT_OFFSET] // cells), 255)
+        obs[..., EQUIPMENT_OFFSET:CURSOR_CHANNEL] = self._sums[..., EQUIPMENT_OFFSET:] * 255 // cells
+        obs[..., CURSOR_CHANNEL] = 0
+        obs[cursor[0] // self._block[0], cursor[1] // self._block[1], CURSOR_CHANNEL] = 1
+        return obs.copy()
+
+def _levels(resources: np.ndarray) -> np.ndarray:
+    return np.minimum(np.ceil(resources[..., AMOUNTS] / QUANTIZE_STEP), 255).astype(np.uint8)
@@ -0,0 +1,221 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import traceback
+from typing import Optional
+
+from .minimap import minimap_shape
+from .symbolic import observation_shape
+from .types import ResourceType
+
+def _buffer_layout(num_envs: int, obs_shape: tuple, minimap: Optional[tuple] = None) \
+        -> tuple[dict[str, tuple[tuple, np.dtype, int]], int]:
+    """Shape, dtype and byte offset of every array kept in the shared block, and the block size."""
+    from .env import FactoryAction
+
+    arrays = {
+        'obs': ((num_envs,) + obs_shape, np.dtype(np.uint8)),
+        'reward': ((num_envs,), np.dtype(np.float32)),
+        'done': ((num_envs,), np.dtype(bool)),
+        'action': ((num_envs,), np.dtype(np.int64)),
+        'resources': ((num_envs, len(ResourceType)), np.dtype(np.float32)),
+        'action_mask': ((num_envs, len(FactoryAction)), np.dtype(bool)),
+        'final_resources': ((num_envs, len(ResourceType)), np.dtype(np.float64)),
+        'seed': ((num_envs,), np.dtype(np.int64)),
+    }
+    if minimap is not None:
+        arrays['minimap'] = ((num_envs,) + minimap_shape(minimap), np.dtype(np.uint8))
+    layout, offset = {}, 0
+    for name, (shape, dtype) in arrays.items():
+        offset = -(-offset // 64) * 64
+        layout[name] = (shape, dtype, offset)
+        offset += int(np.prod(shape)) * dtype.itemsize
+    return layout, offset
+
+def _attach(shm: shared_memory.SharedMemory, layout: dict) -> dict[str, np.ndarray]:
+    # frombuffer holds an export of the block, so it stays mapped while any view of it is alive
+    return {name: np.frombuffer(shm.buf, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        for name, (shape, dtype, offset) in layout.items()}
+
+def _write_obs(buffers: dict, i: int, obs):
+    if isinstance(obs, dict):
+        buffers['obs'][i] = obs['image']
+        buffers['minimap'][i] = obs['minimap']
+    else:
+        buffers['obs'][i] = obs
+
+def _worker(conn, shm_name: str, layout: dict, env_ids: range, env_kwargs: dict, seed: Optional[int], observe: bool):
+    from .env import FactoryEnv
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffers = _attach(shm, layout)
+    try:
+        # Lazy environments never render observations that are not written out
+        envs = [FactoryEnv(**env_kwargs, seed=None if seed is None else seed + i, lazy=not observe) for i in env_ids]
+        while True:
+            command = conn.recv()
+            if command == 'step':
+                for i, env in zip(env_ids, envs):
+                    obs, reward, done, info = env.step(int(buffers['action'][i]))
+                    buffers['resources'][i] = [info['resources'][r] for r in ResourceType]
+                    if done:
+                        buffers['final_resources'][i] = env.resource_totals()
+                        obs = env.reset()
+                    if observe:
+                        _write_obs(buffers, i, obs)
+                    buffers['reward'][i] = reward
+                    buffers['done'][i] = done
+                    buffers['action_mask'][i] = env.action_mask()
+            elif command in ('reset', 'reset_seeded'):
+                for i, env in zip(env_ids, envs):
+                    obs = env.reset(seed=int(buffers['seed'][i]) if command == 'reset_seeded' else None)
+                    if observe:
+                        _write_obs(buffers, i, obs)
+                    buffers['action_mask'][i] = env.action_mask()
+            elif command == 'close':
+                break
+            conn.send(None)
+    except Exception:
+        conn.send(traceback.format_exc())
+    finally:
+        del buffers
+        shm.close()
+        conn.close()
+
+class FactoryEnvPool:
+    """Steps `FactoryEnv` instances spread over worker processes.
+
+    Workers write observations, rewards, dones and the cursor's resources
+    straight into one shared-memory block, so nothing is pickled per step and
+    the arrays returned by `step_wait` are views of that block. They are
+    overwritten by the next step; copy them to keep them around. Episodes
+    that finish are reset automatically, as in `FactoryVecEnv`; the
+    resources on their whole map at the end are kept in
+    `info['final_resources']`.
+    """
+
+    def __init__(self, num_envs: int, num_workers: Optional[int] = None, seed: Optional[int] = None,
+            context: Optional[str] = None, observe: bool = True, **env_kwargs):
+        """`env_kwargs` are passed to every `FactoryEnv`; `context` picks the multiprocessing start method.
+
+        Without `observe` no observations are rendered and the ones returned stay zero.
+        """
+        num_workers = min(num_envs, num_workers or mp.cpu_count())
+        self.num_envs = num_envs
+        self._obs_shape = observation_shape(env_kwargs.get('obs_mode', 'rgb'),
+            env_kwargs.get('obs_size', (64, 64)), env_kwargs.get('map_size', (32, 32)))
+        self._minimap = env_kwargs.get('minimap')
+        self._layout, size = _buffer_layout(num_envs, self._obs_shape, self._minimap)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._buffers = _attach(self._shm, self._layout)
+        self._waiting = False
+        self._closed = False
+
+        ctx = mp.get_context(context)
+        self._conns, self._procs = [], []
+        for ids in np.array_split(np.arange(num_envs), num_workers):
+            parent, child = ctx.Pipe()
+            env_ids = range(int(ids[0]), int(ids[-1]) + 1)
+            proc = ctx.Process(target=_worker, daemon=True,
+                args=(child, self._shm.name, self._layout, env_ids, env_kwargs, seed, observe))
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+    @property
+    def observation_space(self):
+        """Returns a image or symbolic grid of one factory w.r.t. its cursor position"""
+        import gymnasium as gym
+        window = gym.spaces.Box(low=0, high=255, shape=self._obs_shape, dtype=np.uint8)
+        if self._minimap is None:
+            return window
+        return gym.spaces.Dict({"image": window,
+            "minimap": gym.spaces.Box(low=0, high=255, shape=minimap_shape(self._minimap), dtype=np.uint8)})
+
+    @property
+    def action_space(self):
+        """Modifies one factory w.r.t. its cursor position"""
+        import gymnasium as gym
+        from .env import FactoryAction
+        return gym.spaces.Discrete(len(FactoryAction))
+
+    def _send(self, command: str):
+        for conn in self._conns:
+            conn.send(command)
+
+    def _wait(self):
+        errors = [error for error in (conn.recv() for conn in self._conns) if error is not None]
+        if errors:
+            raise RuntimeError(f"FactoryEnv worker failed:\n{errors[0]}")
+
+    def reset(self, seeds=None) -> np.ndarray:
+        """Resets every environment, the i-th with `seeds[i]` when given, see `FactoryEnv.reset`."""
+        if seeds is not None:
+            self._buffers['seed'][:] = seeds
+        self._send('reset' if seeds is None else 'reset_seeded')
+        self._wait()
+        return self._observations()
+
+    def action_masks(self) -> np.ndarray:
+        """(num_envs, len(FactoryAction)) masks of the actions that would change each factory, a shared view."""
+        return self._buffers['action_mask']
+
+    def step_async(self, actions):
+        """Hands every worker its actions and returns immediately."""
+        if self._waiting:
+            raise RuntimeError("step_async called twice without step_wait")
+        self._buffers['action'][:] = actions
+        self._send('step')
+        self._waiting = True
+
+    def step_wait(self):
+        """Blocks until all workers stepped and returns observations, rewards, dones and info."""
+        if not self._waiting:
+            raise RuntimeError("step_wait called without step_async")
+        self._wait()
+        self._waiting = False
+        info = {'resources': self._buffers['resources'], 'action_mask': self._buffers['action_mask'],
+            'final_resources': self._buffers['final_resources']}
+        return self._observations(), self._buffers['reward'], self._buffers['done'], info
+
+    def _observations(self):
+        if self._minimap is None:
+            return self._buffers['obs']
+        return {"image": self._buffers['obs'], "minimap": self._buffers['minimap']}
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._waiting:
+            self._wait()
+        for conn, proc in zip(self._conns, self._procs):
+            if proc.is_alive():
+                conn.send('close')
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+            conn.close()
+        self._buffers = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views handed out by step_wait are still alive and keep the mapping, which is
+            # unmapped with the last of them; the SharedMemory must not try again when collected
+            self._shm._buf = self._shm._mmap = None
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        if not getattr(self, '_closed', True):
+            self.close()
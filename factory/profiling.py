@@ -0,0 +1,131 @@
+import json
+import time
+from typing import Optional
+
+# Phases of `FactoryEnv.step`, in the order they run
+PHASES = ("action", "simulate", "observe", "info")
+
+class Counter:
+    """Number of calls, cumulative and longest duration in ns."""
+
+    __slots__ = ("count", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns: int, count: int = 1):
+        self.count += count
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "total_ns": self.total_ns, "max_ns": self.max_ns}
+
+class StepProfiler:
+    """Times the phases of each `FactoryEnv.step` and the equipment stepped inside it.
+
+    The environment calls `lap` at the end of every phase, engines call
+    `lap_equipment` at the end of every section working on one kind of
+    equipment. Equipment counters count pieces of equipment stepped and
+    take their maximum over whole ticks, so a kind handled in several
+    sections of one tick is still reported once per tick. Laps only
+    read the clock and add to counters unless `capture` is active.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Zeroes all counters."""
+        self.phases = {phase: Counter() for phase in PHASES}
+        self.equipment = {}
+        self.steps = Counter()
+        self._pending = {}
+        self._start = self._last = self._section = time.perf_counter_ns()
+        self._capture_steps = 0
+        self._trace = None
+        self._trace_path = None
+        self._profile = None
+
+    def begin_step(self):
+        self._start = self._last = self._section = time.perf_counter_ns()
+        if self._profile is not None:
+            self._profile.enable()
+
+    def lap(self, phase: str, count: int = 1):
+        """Ends `phase`, which started at the end of the previous lap, counting it `count` times.
+
+        The environment counts the "simulate" phase once per factory tick.
+        """
+        now = time.perf_counter_ns()
+        self.phases[phase].add(now - self._last, count)
+        if self._trace is not None:
+            self._event(phase, "phase", self._last, now)
+        self._last = self._section = now
+
+    def lap_equipment(self, kind: str, units: int = 0):
+        """Ends a section stepping `units` pieces of equipment of `kind`."""
+        now = time.perf_counter_ns()
+        pending = self._pending.get(kind)
+        if pending is None:
+            pending = self._pending[kind] = [0, 0]
+        pending[0] += now - self._section
+        pending[1] += units
+        if self._trace is not None:
+            self._event(kind, "equipment", self._section, now)
+        self._section = now
+
+    def end_step(self):
+        now = time.perf_counter_ns()
+        if self._profile is not None:
+            self._profile.disable()
+        self.steps.add(now - self._start)
+        for kind, (ns, units) in self._pending.items():
+            counter = self.equipment.get(kind)
+            if counter is None:
+                counter = self.equipment[kind] = Counter()
+            counter.add(ns, units)
+        self._pending.clear()
+        if self._capture_steps > 0:
+            if self._trace is not None:
+                self._event("step", "step", self._start, now)
+            self._capture_steps -= 1
+            if self._capture_steps == 0:
+                self._finish_capture()
+
+    def capture(self, num_steps: int, trace_path: Optional[str] = None, profile=None):
+        """Records the next `num_steps` steps.
+
+        With `trace_path` their phases and equipment sections are written
+        there as Chrome trace JSON (chrome://tracing, Perfetto) once the
+        steps are done. `profile`, e.g. a `cProfile.Profile`, is enabled
+        for the duration of each of those steps.
+        """
+        self._capture_steps = num_steps
+        self._trace = [] if trace_path is not None else None
+        self._trace_path = trace_path
+        self._profile = profile
+
+    def _event(self, name: str, category: str, start_ns: int, end_ns: int):
+        self._trace.append({"name": name, "cat": category, "ph": "X", "pid": 0, "tid": 0,
+            "ts": start_ns / 1000.0, "dur": (end_ns - start_ns) / 1000.0})
+
+    def _finish_capture(self):
+        if self._trace is not None:
+            with open(self._trace_path, "w") as f:
+                json.dump({"traceEvents": self._trace, "displayTimeUnit": "ns"}, f)
+        self._trace = self._trace_path = self._profile = None
+
+    def stats(self) -> dict:
+        """Counters as plain dicts, with steps and simulated ticks per second."""
+        simulate_ns = self.phases["simulate"].total_ns
+        return {
+            "steps": self.steps.as_dict(),
+            "phases": {phase: counter.as_dict() for phase, counter in self.phases.items()},
+            "equipment": {kind: counter.as_dict() for kind, counter in self.equipment.items()},
+            "steps_per_sec": self.steps.count * 1e9 / self.steps.total_ns if self.steps.total_ns else 0.0,
+            "ticks_per_sec": self.phases["simulate"].count * 1e9 / simulate_ns if simulate_ns else 0.0,
+        }
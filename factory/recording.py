@@ -0,0 +1,186 @@
+"""Episodes recorded as action logs instead of frames.
+
+The simulation is deterministic, so an episode is fully described by its
+starting state and the actions taken. `EpisodeRecorder` writes the
+actions, tick counts and rewards of each episode plus a `FactoryState`
+keyframe every `keyframe_interval` steps. `ActionLog` reads one back and
+reconstructs the observation of any step by restoring the nearest
+keyframe before it and replaying forward.
+
+Logs are `.npz` files with "action" and "reward" members like the replay
+episodes DreamerV3 writes, so `ReplayIndex` and `summarize` read them too.
+"""
+
+import json
+import os
+import time
+import uuid
+from typing import Iterator, Optional
+
+import numpy as np
+
+from .env import FactoryEnv
+from .state import FactoryState
+
+def env_kwargs(env: FactoryEnv) -> dict:
+    """Arguments creating an environment that simulates and observes like `env`."""
+    factory = env._factory
+    if factory._engine is None:
+        engine = "object"
+    else:
+        engine = "graph" if factory._engine._topological else "array"
+    return {
+        "map_size": tuple(env._map_size),
+        "obs_size": tuple(env._obs_size),
+        "asset_path": env._asset_path,
+        "engine": engine,
+        "obs_mode": env._obs_mode,
+        "chunk_size": factory._world.chunk_size if factory._world is not None else None,
+        "frame_skip": env._frame_skip,
+        "skip_invalid": env._skip_invalid,
+    }
+
+class EpisodeRecorder:
+    """Wraps a `FactoryEnv`, writing every episode to `directory` as an action log.
+
+    Episodes are written when they end, when the environment is reset and
+    on `close()`. Everything else is forwarded to the environment.
+    """
+
+    def __init__(self, env: FactoryEnv, directory: str, keyframe_interval: int = 100):
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval must be positive, got {keyframe_interval}")
+        self.env = env
+        self.directory = directory
+        self.keyframe_interval = keyframe_interval
+        self._kwargs = env_kwargs(env)
+        self._episode = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def reset(self, *args, **kwargs):
+        self.flush()
+        obs = self.env.reset(*args, **kwargs)
+        self._start()
+        return obs
+
+    def step(self, action: int, ticks: Optional[int] = None):
+        if self._episode is None:
+            # Recording started mid-episode, from the current state
+            self._start()
+        steps = self.env._step
+        obs, reward, done, info = self.env.step(action, ticks)
+        episode = self._episode
+        episode["action"].append(int(action))
+        episode["ticks"].append(self.env._step - steps)
+        episode["reward"].append(reward)
+        if len(episode["action"]) % self.keyframe_interval == 0:
+            episode["keyframes"].append((len(episode["action"]), self.env.get_state()))
+        if done:
+            self.flush()
+        return obs, reward, done, info
+
+    def flush(self) -> Optional[str]:
+        """Writes the episode recorded so far, if it has any steps, and returns its path."""
+        episode, self._episode = self._episode, None
+        if episode is None or not episode["action"]:
+            return None
+        base = episode["keyframes"][0][1].base
+        arrays = {
+            "action": np.array(episode["action"], dtype=np.int8),
+            "ticks": np.array(episode["ticks"], dtype=np.int32),
+            "reward": np.array(episode["reward"], dtype=np.float32),
+            "keyframe_steps": np.array([step for step, _ in episode["keyframes"]], dtype=np.int64),
+            "env": np.array(json.dumps(self._kwargs)),
+        }
+        # The deposits are shared by every keyframe of the episode and stored once
+        if base is not None:
+            arrays["base"] = base
+        for i, (_, state) in enumerate(episode["keyframes"]):
+            if state.base is base:
+                state = state._replace(base=None)
+            arrays[f"keyframe/{i}"] = np.frombuffer(state.to_bytes(), dtype=np.uint8)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}-{len(episode['action'])}.npz"
+        path = os.path.join(self.directory, name)
+        np.savez_compressed(path, **arrays)
+        return path
+
+    def close(self):
+        self.flush()
+        close = getattr(self.env, "close", None)
+        if close is not None:
+            close()
+
+    def _start(self):
+        self._episode = {"action": [], "ticks": [], "reward": [], "keyframes": [(0, self.env.get_state())]}
+
+class ActionLog:
+    """Episode written by `EpisodeRecorder`, with random access to the observation of every step.
+
+    Step `t` is the observation after `t` actions, 0 being the one reset()
+    returned. `env_overrides` replace arguments of the environment replaying
+    the episode, e.g. `obs_mode="rgb"` to view a symbolic episode as pixels.
+    Reading steps in increasing order replays each action once.
+    """
+
+    def __init__(self, path: str, **env_overrides):
+        self.path = path
+        with np.load(path, allow_pickle=False) as data:
+            self.actions = data["action"].astype(np.int64)
+            self.ticks = data["ticks"]
+            self.rewards = data["reward"]
+            self.keyframe_steps = data["keyframe_steps"]
+            self.env_kwargs = {**json.loads(str(data["env"])), **env_overrides}
+            base = data["base"] if "base" in data else None
+            self._keyframes = [data[f"keyframe/{i}"].tobytes() for i in range(len(self.keyframe_steps))]
+        if base is not None:
+            base.flags.writeable = False
+        self._base = base
+        self._env = None
+        self._position = None  # Step the environment is at, None before the first read
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def keyframe(self, i: int) -> FactoryState:
+        state = FactoryState.from_bytes(self._keyframes[i])
+        if state.base is None and self._base is not None:
+            # The same array for every keyframe, so restoring one only rewrites changed cells
+            state = state._replace(base=self._base)
+        return state
+
+    def state(self, t: int) -> FactoryState:
+        """`FactoryState` after `t` actions."""
+        self._seek(t)
+        return self._env.get_state()
+
+    def frame(self, t: int) -> np.ndarray:
+        """Observation after `t` actions."""
+        self._seek(t)
+        return self._env.observe()
+
+    def __getitem__(self, t: int) -> np.ndarray:
+        return self.frame(t)
+
+    def frames(self, start: int = 0, stop: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Yields the observations of steps `start` to `stop`, by default the whole episode."""
+        stop = len(self) + 1 if stop is None else min(stop, len(self) + 1)
+        for t in range(start, stop):
+            yield self.frame(t)
+
+    def _seek(self, t: int):
+        if not 0 <= t <= len(self):
+            raise IndexError(f"Step {t} out of range for an episode of {len(self)} actions")
+        if self._env is None:
+            # Lazy, so that the steps replayed in between are never observed
+            self._env = FactoryEnv(**self.env_kwargs, max_steps=np.iinfo(np.int64).max, lazy=True)
+        i = int(np.searchsorted(self.keyframe_steps, t, side="right")) - 1
+        start = int(self.keyframe_steps[i])
+        if self._position is None or not start <= self._position <= t:
+            self._env.set_state(self.keyframe(i))
+            self._position = start
+        for step in range(self._position, t):
+            self._env.step(int(self.actions[step]), int(self.ticks[step]))
+        self._position = t
@@ -0,0 +1,239 @@
+import hashlib
+import numpy as np
+import os
+
+from .types import EquipmentType, ResourceType
+
+def set_block(obs: np.ndarray, x: int, y: int, img: np.ndarray):
+    """Alpha-blends an 8x8 RGBA sprite onto tile (x, y) of an observation."""
+    bg = obs[x*8:(x+1)*8, y*8:(y+1)*8, :].astype(np.float32)
+    fg = img.astype(np.float32)
+    alpha = fg[:, :, 3] / 255.0
+    for c in range(3):
+        obs[x*8:(x+1)*8, y*8:(y+1)*8, c] = ((1.0 - alpha) * bg[:, :, c]) + (alpha * fg[:, :, c])
+
+def draw_tile(obs: np.ndarray, x: int, y: int, resources, equipment: EquipmentType, assets: dict):
+    """Draws the deposits, equipment and ore of one map cell onto tile (x, y)."""
+    if resources[ResourceType.COAL_DEPOSIT] > 0:
+        set_block(obs, x, y, assets["coal_deposit.png"])
+    if resources[ResourceType.IRON_DEPOSIT] > 0:
+        set_block(obs, x, y, assets["iron_deposit.png"])
+
+    if equipment == EquipmentType.LEFT_BELT:
+        set_block(obs, x, y, assets["left_belt.png"])
+    elif equipment == EquipmentType.RIGHT_BELT:
+        set_block(obs, x, y, assets["right_belt.png"])
+    elif equipment == EquipmentType.UP_BELT:
+        set_block(obs, x, y, assets["up_belt.png"])
+    elif equipment == EquipmentType.DOWN_BELT:
+        set_block(obs, x, y, assets["down_belt.png"])
+
+    if resources[ResourceType.COAL_ORE] > 0:
+        set_block(obs, x, y, assets["coal_deposit.png"])
+    if resources[ResourceType.IRON_ORE] > 0:
+        set_block(obs, x, y, assets["iron_deposit.png"])
+
+    if equipment == EquipmentType.MINE:
+        set_block(obs, x, y, assets["mine.png"])
+    elif equipment == EquipmentType.FURNACE:
+        set_block(obs, x, y, assets["furnace.png"])
+
+def load_assets(asset_path: str) -> dict[str, np.ndarray]:
+    """Loads every sprite in `asset_path` as an RGBA array indexed [x, y]."""
+    import cv2
+
+    assets = {}
+    for asset in _sprite_names(asset_path):
+        img = cv2.imread(os.path.join(asset_path, asset), cv2.IMREAD_UNCHANGED)
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA)
+        img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+        img = cv2.flip(img, 1)
+        assets[asset] = img
+    return assets
+
+# Bit layout of a tile key, see `TileRenderer.keys`
+EQUIPMENT_SHIFT = 2
+ORE_SHIFT = 5
+CURSOR_SHIFT = 7
+NUM_KEYS = 1 << (CURSOR_SHIFT + 1)
+
+# Bump when the tile layout or compositing changes to invalidate cached atlases
+ATLAS_VERSION = 1
+
+def composite_tiles(assets: dict[str, np.ndarray]) -> np.ndarray:
+    """Composites the tile for every key with `draw_tile`, returning (NUM_KEYS, 8, 8, 3) pixels."""
+    tiles = np.empty((NUM_KEYS, 8, 8, 3), dtype=np.uint8)
+    for key in range(NUM_KEYS):
+        resources = np.zeros(len(ResourceType), dtype=np.float32)
+        resources[ResourceType.COAL_DEPOSIT] = key & 1
+        resources[ResourceType.IRON_DEPOSIT] = (key >> 1) & 1
+        resources[ResourceType.COAL_ORE] = (key >> ORE_SHIFT) & 1
+        resources[ResourceType.IRON_ORE] = (key >> (ORE_SHIFT + 1)) & 1
+        equipment = (key >> EQUIPMENT_SHIFT) & 0b111
+
+        tile = np.full((8, 8, 3), 255, dtype=np.uint8)
+        draw_tile(tile, 0, 0, resources, equipment, assets)
+        if key >> CURSOR_SHIFT:
+            set_block(tile, 0, 0, assets["cursor.png"])
+        tiles[key] = tile
+    return tiles
+
+def _sprite_names(asset_path: str) -> list[str]:
+    return sorted(name for name in os.listdir(asset_path) if name.endswith(".png"))
+
+def atlas_cache_dir() -> str:
+    """Directory holding cached tile atlases, `$FACTORYRL_CACHE` or the user cache directory."""
+    default = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "factoryrl")
+    return os.environ.get("FACTORYRL_CACHE", default)
+
+def load_tile_atlas(asset_path: str) -> np.ndarray:
+    """Returns the composited tiles for `asset_path` as a read-only memory map.
+
+    The atlas is built once and stored under `atlas_cache_dir()`, named by a
+    hash of the sprite files, so every process using the same sprites maps
+    the same file and shares its pages instead of decoding the PNGs again.
+    """
+    digest = hashlib.sha1(str(ATLAS_VERSION).encode())
+    for name in _sprite_names(asset_path):
+        digest.update(name.encode())
+        with open(os.path.join(asset_path, name), "rb") as f:
+            digest.update(f.read())
+    path = os.path.join(atlas_cache_dir(), f"tiles-{digest.hexdigest()}.npy")
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, composite_tiles(load_assets(asset_path)))
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+class TileRenderer:
+    """Renders map windows by gathering pre-composited 8x8 tiles.
+
+    Everything visible on a tile is determined by which deposits are present,
+    the equipment type, which ores are present and whether the cursor is on
+    it. Each combination is packed into an 8-bit key and composited once with
+    `draw_tile`, so rendering a window is a single gather with the same pixels.
+    """
+
+    _cache = {}
+
+    def __init__(self, tiles: np.ndarray):
+        """Wraps a (NUM_KEYS, 8, 8, 3) array of tiles, see `composite_tiles`."""
+        self._tiles = tiles
+        px = np.arange(8)
+        self._px = px[None, :, None, None]
+        self._py = px[None, None, None, :]
+
+    @classmethod
+    def for_asset_path(cls, asset_path: str) -> "TileRenderer":
+        """Returns a renderer shared by every caller using the same assets."""
+        if asset_path not in cls._cache:
+            cls._cache[asset_path] = cls(load_tile_atlas(asset_path))
+        return cls._cache[asset_path]
+
+    @staticmethod
+    def keys(resources: np.ndarray, equipment: np.ndarray, cursor=None) -> np.ndarray:
+        """Packs the visible state of each cell into a tile key.
+
+        `resources` is a (..., W, H, len(ResourceType)) window and `equipment`
+        the matching (..., W, H) grid of `EquipmentType` values. `cursor` is
+        the cursor's (x, y) within the window, or a (..., 2) array of them.
+        """
+        present = (resources[..., :ResourceType.IRON_ORE + 1] > 0).astype(np.uint8)
+        keys = present[..., ResourceType.COAL_DEPOSIT].copy()
+        keys |= present[..., ResourceType.IRON_DEPOSIT] << 1
+        keys |= equipment.astype(np.uint8) << EQUIPMENT_SHIFT
+        keys |= present[..., ResourceType.COAL_ORE] << ORE_SHIFT
+        keys |= present[..., ResourceType.IRON_ORE] << (ORE_SHIFT + 1)
+        if cursor is not None:
+            cursor = np.asarray(cursor)
+            batch = np.indices(keys.shape[:-2])
+            keys[tuple(batch) + (cursor[..., 0], cursor[..., 1])] |= 1 << CURSOR_SHIFT
+        return keys
+
+    def render(self, keys: np.ndarray) -> np.ndarray:
+        """Gathers the tiles for a (..., W, H) key grid into (..., 8 * W, 8 * H, 3) pixels."""
+        w, h = keys.shape[-2:]
+        pixels = self._tiles[keys[..., :, None, :, None], self._px, self._py]
+        return pixels.reshape(keys.shape[:-2] + (8 * w, 8 * h, 3))
+
+    def tiles(self, keys: np.ndarray) -> np.ndarray:
+        """Returns the (..., 8, 8, 3) pixels of each tile key."""
+        return self._tiles[keys]
+
+class TileCache:
+    """Keeps a rendered map window current by re-rendering only the tiles that changed.
+
+    `reset` keys every map cell once, baking the deposit terrain into a
+    full-map layer. Afterwards only cells passed to `update` are re-keyed,
+    and `render` shifts the previous window when the view moves, redrawing
+    just the exposed, changed and cursor tiles.
+    """
+
+    def __init__(self, renderer: TileRenderer, map_size: tuple[int, int], window=(8, 8)):
+        self._renderer = renderer
+        self._window = window
+        self._keys = np.zeros(map_size, dtype=np.uint8)
+        self._pixels = np.full((8 * window[0], 8 * window[1], 3), 255, dtype=np.uint8)
+        self._back = np.empty_like(self._pixels)
+        self._stale = np.ones(window, dtype=bool)
+        self._roi = None
+        self._cursor = None
+        self.tiles_rendered = 0
+
+    def reset(self, resources: np.ndarray, equipment: np.ndarray):
+        """Keys the whole map from its (W, H, len(ResourceType)) resources and (W, H) equipment."""
+        self._keys[:] = self._renderer.keys(resources, equipment)
+        self._roi = None
+
+    def update(self, x: np.ndarray, y: np.ndarray, resources: np.ndarray, equipment: np.ndarray):
+        """Re-keys cells (x[i], y[i]) from their current resources and equipment."""
+        if len(x) == 0:
+            return
+        keys = self._renderer.keys(resources, equipment)
+        changed = keys != self._keys[x, y]
+        self._keys[x, y] = keys
+        if self._roi is not None:
+            tx, ty = x[changed] - self._roi[0], y[changed] - self._roi[1]
+            inside = (tx >= 0) & (tx < self._window[0]) & (ty >= 0) & (ty < self._window[1])
+            self._stale[tx[inside], ty[inside]] = True
+
+    def render(self, roi: tuple[int, int], cursor: tuple[int, int]) -> np.ndarray:
+        """Returns the window starting at map cell `roi` with the cursor at window tile `cursor`.
+
+        The returned array is owned by the cache and overwritten by later calls.
+        """
+        w, h = self._window
+        if self._roi is None:
+            self._stale[:] = True
+        elif roi != self._roi:
+            dx, dy = roi[0] - self._roi[0], roi[1] - self._roi[1]
+            old_cursor = (self._cursor[0] - dx, self._cursor[1] - dy)
+            stale = np.ones_like(self._stale)
+            if abs(dx) < w and abs(dy) < h:
+                # Reuse the overlapping tiles of the previous window
+                dst = (slice(max(0, -dx), w - max(0, dx)), slice(max(0, -dy), h - max(0, dy)))
+                src = (slice(max(0, dx), w - max(0, -dx)), slice(max(0, dy), h - max(0, -dy)))
+                pixels = self._pixels.reshape(w, 8, h, 8, 3)
+                back = self._back.reshape(w, 8, h, 8, 3)
+                back[dst[0], :, dst[1]] = pixels[src[0], :, src[1]]
+                self._pixels, self._back = self._back, self._pixels
+                stale[dst] = self._stale[src]
+                if 0 <= old_cursor[0] < w and 0 <= old_cursor[1] < h:
+                    stale[old_cursor] = True
+            self._stale = stale
+        elif cursor != self._cursor:
+            self._stale[self._cursor] = True
+        if roi != self._roi or cursor != self._cursor:
+            self._stale[cursor] = True
+        self._roi, self._cursor = roi, cursor
+
+        tx, ty = np.nonzero(self._stale)
+        keys = self._keys[roi[0] + tx, roi[1] + ty]
+        keys[(tx == cursor[0]) & (ty == cursor[1])] |= 1 << CURSOR_SHIFT
+        self._pixels.reshape(w, 8, h, 8, 3)[tx, :, ty] = self._renderer.tiles(keys)
+        self._stale[:] = False
+        self.tiles_rendered = len(tx)
+        return self._pixels
@@ -0,0 +1,222 @@
+"""Reading, indexing and exporting replay episodes saved as `.npz` files.
+
+Episodes are opened member by member and never loaded whole: members of
+uncompressed archives (`np.savez`, see `convert`) are memory-mapped, and
+members of compressed ones are decompressed frame by frame as they are
+iterated.
+"""
+
+import json
+import multiprocessing as mp
+import os
+import shutil
+import struct
+import zipfile
+from typing import Iterator, Optional
+
+import numpy as np
+
+INDEX_FILE = "replay_index.json"
+
+class Episode:
+    """Lazy view of one episode `.npz`, mapping member names such as "image" and "reward" to arrays."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self._members = {info.filename[:-len(".npy")]: info for info in self._zip.infolist()
+            if info.filename.endswith(".npy")}
+        self._headers = {}
+
+    def keys(self) -> list[str]:
+        return list(self._members)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._members
+
+    def __len__(self) -> int:
+        key = "reward" if "reward" in self._members else next(iter(self._members))
+        return self.header(key)[0][0]
+
+    def header(self, key: str) -> tuple[tuple, np.dtype, bool, int]:
+        """Shape, dtype, Fortran order and data offset within the member of the array `key`."""
+        if key not in self._headers:
+            with self._zip.open(self._members[key]) as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+                self._headers[key] = (shape, dtype, fortran, f.tell())
+        return self._headers[key]
+
+    def mappable(self, key: str) -> bool:
+        """Whether `key` is stored uncompressed and can be memory-mapped."""
+        shape, dtype, fortran, _ = self.header(key)
+        return self._members[key].compress_type == zipfile.ZIP_STORED and not fortran and not dtype.hasobject
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        """The array `key`, memory-mapped read-only when possible and otherwise read in full."""
+        shape, dtype, _, offset = self.header(key)
+        if self.mappable(key) and np.prod(shape) > 0:
+            return np.memmap(self.path, dtype=dtype, mode="r", shape=shape,
+                offset=self._data_offset(self._members[key]) + offset)
+        with self._zip.open(self._members[key]) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+
+    def frames(self, key: str = "image", start: int = 0, stop: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Yields `key` one step at a time, decompressing only what has been yielded so far."""
+        shape, dtype, fortran, offset = self.header(key)
+        stop = shape[0] if stop is None else min(stop, shape[0])
+        if self.mappable(key):
+            array = self[key]
+            for i in range(start, stop):
+                yield array[i]
+            return
+        if fortran:
+            yield from self[key][start:stop]
+            return
+        frame_shape = shape[1:]
+        frame_bytes = int(np.prod(frame_shape)) * dtype.itemsize
+        with self._zip.open(self._members[key]) as f:
+            f.seek(offset + start * frame_bytes)
+            for _ in range(start, stop):
+                yield np.frombuffer(f.read(frame_bytes), dtype=dtype).reshape(frame_shape)
+
+    def _data_offset(self, info: zipfile.ZipInfo) -> int:
+        # The local header's extra field may differ from the central directory's
+        with open(self.path, "rb") as f:
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<HH", f.read(30)[26:30])
+        return info.header_offset + 30 + name_len + extra_len
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def convert(src: str, dst: str):
+    """Rewrites the episode `src` uncompressed at `dst` so `Episode` memory-maps its arrays.
+
+    Members are copied as streams, so this never holds a whole array.
+    """
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, "w", zipfile.ZIP_STORED, allowZip64=True) as zout:
+        for info in zin.infolist():
+            with zin.open(info) as fin, zout.open(info.filename, "w", force_zip64=True) as fout:
+                shutil.copyfileobj(fin, fout, 1 << 20)
+
+def summarize(path: str) -> dict:
+    """Length, return and reward statistics of one episode, plus action counts when actions are stored."""
+    with Episode(path) as episode:
+        reward = np.asarray(episode["reward"], dtype=np.float64)
+        summary = {
+            "file": os.path.basename(path),
+            "length": len(reward),
+            "return": float(reward.sum()),
+            "reward_min": float(reward.min()) if len(reward) else 0.0,
+            "reward_max": float(reward.max()) if len(reward) else 0.0,
+            "reward_mean": float(reward.mean()) if len(reward) else 0.0,
+        }
+        if "action" in episode:
+            action = np.asarray(episode["action"])
+            # One-hot actions, as written by DreamerV3, are counted by index
+            action = action.argmax(axis=-1) if action.ndim > 1 else action.astype(np.int64)
+            summary["actions"] = np.bincount(action.ravel()).tolist()
+    return summary
+
+def _index_entry(path: str) -> dict:
+    stat = os.stat(path)
+    with Episode(path) as episode:
+        reward = episode["reward"]
+        return {"file": os.path.basename(path), "length": len(reward), "return": float(np.sum(reward, dtype=np.float64)),
+            "size": stat.st_size, "mtime": stat.st_mtime}
+
+class ReplayIndex:
+    """Length and return of every episode in a replay directory.
+
+    The index is cached in `INDEX_FILE` inside the directory. Refreshing it
+    only opens episodes that are new or changed since, and of those only
+    their rewards are read.
+    """
+
+    def __init__(self, directory: str, workers: int = 1, context: Optional[str] = None):
+        self.directory = directory
+        cache = {}
+        path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                cache = {entry["file"]: entry for entry in json.load(f)}
+
+        entries, stale = {}, []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".npz"):
+                continue
+            stat = os.stat(os.path.join(directory, name))
+            entry = cache.get(name)
+            if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                entries[name] = entry
+            else:
+                stale.append(os.path.join(directory, name))
+        for entry in _map(_index_entry, stale, workers, context):
+            entries[entry["file"]] = entry
+        self.entries = sorted(entries.values(), key=lambda entry: entry["file"])
+        if stale or len(entries) != len(cache):
+            self.save()
+
+    def save(self):
+        with open(os.path.join(self.directory, INDEX_FILE), "w") as f:
+            json.dump(self.entries, f)
+
+    def top(self, k: int, by: str = "return") -> list[dict]:
+        """The `k` entries with the highest `by`, "return" or "length"."""
+        return sorted(self.entries, key=lambda entry: entry[by], reverse=True)[:k]
+
+    def path(self, entry: dict) -> str:
+        return os.path.join(self.directory, entry["file"])
+
+def write_video(frames, output: str, fps: float = 30.0, scale: int = 8) -> str:
+    """Writes RGB `frames` to the video `output`, nearest-neighbour upscaled by `scale`."""
+    import cv2
+
+    writer = None
+    try:
+        for frame in frames:
+            frame = frame.repeat(scale, axis=0).repeat(scale, axis=1)
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+            writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    finally:
+        if writer is not None:
+            writer.release()
+    return output
+
+def export_video(path: str, output: str, fps: float = 30.0, key: str = "image", scale: int = 8) -> str:
+    """Writes the frames of an episode to the video `output`, see `write_video`."""
+    with Episode(path) as episode:
+        return write_video(episode.frames(key), output, fps, scale)
+
+def _export_video(args):
+    return export_video(*args)
+
+def export_videos(paths: list[str], output_dir: str, fps: float = 30.0, workers: int = 1,
+        context: Optional[str] = None) -> list[str]:
+    """Writes every episode in `paths` to `output_dir/<name>.mp4` in `workers` processes."""
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(path, os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + ".mp4"), fps)
+        for path in paths]
+    return _map(_export_video, jobs, workers, context)
+
+def export_summaries(paths: list[str], workers: int = 1, context: Optional[str] = None) -> list[dict]:
+    """`summarize` of every episode in `paths`, computed in `workers` processes."""
+    return _map(summarize, paths, workers, context)
+
+def _map(fn, items: list, workers: int, context: Optional[str]) -> list:
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with mp.get_context(context).Pool(min(workers, len(items))) as pool:
+        return pool.map(fn, items)
@@ -0,0 +1,78 @@
+import io
+import numpy as np
+from typing import NamedTuple, Optional
+
+from .terrain import TerrainGenerator
+
+# Attributes of `TerrainGenerator` stored with states of chunked worlds
+_TERRAIN_FIELDS = ("octaves", "scale", "coal_threshold", "iron_threshold", "coal_amount", "iron_amount")
+
+class FactoryState(NamedTuple):
+    """Snapshot of a `Factory`, see `Factory.get_state`.
+
+    Only cells modified since the deposits were laid down are stored. The
+    deposits themselves are kept in `base`, a read-only array shared by
+    every state taken in the same episode. All arrays are read-only, so
+    states can be kept around and restored any number of times.
+    """
+
+    map_size: tuple[int, int]
+    cursor: tuple[int, int]
+    steps: int
+    base: Optional[np.ndarray]      # (W, H, 2) deposits, or None for none
+    cells: np.ndarray               # (n, 2) positions differing from `base`
+    resources: np.ndarray           # (n, len(ResourceType)) resources at `cells`
+    equipment: np.ndarray           # (n,) `EquipmentType` values at `cells`
+    order: np.ndarray               # (m, 2) positions of simulated equipment in stepping order
+    is_cooking: np.ndarray          # (m,) furnace timers, False and 0 for other equipment
+    time_left: np.ndarray           # (m,)
+    resource_amts: np.ndarray       # (len(ResourceType),) totals of `Factory.get_resource_amt`
+    engine: Optional[dict[str, np.ndarray]] = None  # `ArrayEngine.snapshot`, restored without rebuilding
+    chunks: Optional[tuple[np.ndarray, np.ndarray, np.ndarray]] = None  # Chunk table, origins and data
+    terrain: Optional[tuple[TerrainGenerator, int]] = None  # Generator and seed of lazy chunks
+
+    def to_bytes(self) -> bytes:
+        """Serializes the state with `np.savez`, without pickling."""
+        arrays = {name: getattr(self, name) for name in
+            ("cells", "resources", "equipment", "order", "is_cooking", "time_left", "resource_amts")}
+        arrays["header"] = np.array(self.map_size + self.cursor + (self.steps,), dtype=np.int64)
+        if self.base is not None:
+            arrays["base"] = self.base
+        for name, values in (self.engine or {}).items():
+            arrays[f"engine/{name}"] = values
+        if self.chunks is not None:
+            arrays["chunk_table"], arrays["chunk_origins"], arrays["chunk_data"] = self.chunks
+        if self.terrain is not None:
+            generator, seed = self.terrain
+            arrays["terrain"] = np.array([getattr(generator, name) for name in _TERRAIN_FIELDS], dtype=np.float64)
+            arrays["terrain_seed"] = np.array(seed, dtype=np.int64)
+            if generator.fixed_seeds is not None:
+                # Layers left to the seed are stored as 0 and flagged in the mask
+                arrays["terrain_fixed_seeds"] = np.array([fixed or 0 for fixed in generator.fixed_seeds], dtype=np.int64)
+                arrays["terrain_fixed_mask"] = np.array([fixed is not None for fixed in generator.fixed_seeds])
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FactoryState":
+        arrays = dict(np.load(io.BytesIO(data), allow_pickle=False))
+        for array in arrays.values():
+            array.flags.writeable = False
+        header = arrays.pop("header").tolist()
+        engine = {name[len("engine/"):]: arrays.pop(name) for name in list(arrays) if name.startswith("engine/")}
+        chunks = None
+        if "chunk_table" in arrays:
+            chunks = (arrays.pop("chunk_table"), arrays.pop("chunk_origins"), arrays.pop("chunk_data"))
+        terrain = None
+        if "terrain" in arrays:
+            fields = dict(zip(_TERRAIN_FIELDS, arrays.pop("terrain").tolist()))
+            if fields["octaves"].is_integer():
+                fields["octaves"] = int(fields["octaves"])
+            if "terrain_fixed_seeds" in arrays:
+                seeds, mask = arrays.pop("terrain_fixed_seeds").tolist(), arrays.pop("terrain_fixed_mask").tolist()
+                fields["fixed_seeds"] = tuple(seed if fixed else None for seed, fixed in zip(seeds, mask))
+            generator = TerrainGenerator(**fields)
+            terrain = (generator, int(arrays.pop("terrain_seed")))
+        return cls(map_size=tuple(header[0:2]), cursor=tuple(header[2:4]), steps=header[4],
+            base=arrays.pop("base", None), engine=engine or None, chunks=chunks, terrain=terrain, **arrays)
@@ -0,0 +1,45 @@
+import numpy as np
+
+from .types import EquipmentType, ResourceType
+
+OBS_MODES = ("rgb", "symbolic", "symbolic_map")
+
+# Channel layout of a symbolic observation: one-hot equipment, quantized
+# deposit and ore amounts, then the cursor.
+AMOUNTS = slice(ResourceType.COAL_DEPOSIT, ResourceType.IRON_ORE + 1)
+AMOUNT_OFFSET = len(EquipmentType)
+CURSOR_CHANNEL = AMOUNT_OFFSET + AMOUNTS.stop - AMOUNTS.start
+NUM_CHANNELS = CURSOR_CHANNEL + 1
+
+# Resource amount per quantization level, any nonzero amount maps to at least 1
+QUANTIZE_STEP = np.array([4.0, 4.0, 1.0, 1.0], dtype=np.float32)
+
+_EQUIPMENT_TYPES = np.arange(len(EquipmentType), dtype=np.int8)
+
+def observation_shape(obs_mode: str, obs_size: tuple[int, int], map_size: tuple[int, int]) -> tuple[int, ...]:
+    """Shape of the observations `FactoryEnv` returns in the given mode."""
+    if obs_mode == "rgb":
+        return tuple(obs_size) + (3,)
+    if obs_mode == "symbolic":
+        return (8, 8, NUM_CHANNELS)
+    if obs_mode == "symbolic_map":
+        return tuple(map_size) + (NUM_CHANNELS,)
+    raise ValueError(f"Invalid obs_mode {obs_mode!r}, expected one of {OBS_MODES}")
+
+def symbolic_grid(resources: np.ndarray, equipment: np.ndarray, cursor=None) -> np.ndarray:
+    """Encodes (..., len(ResourceType)) resources and matching equipment as (..., NUM_CHANNELS) uint8 planes.
+
+    `cursor` is the (x, y) cell of the grid to mark on the cursor plane, a
+    (..., 2) array of them for batched grids, or None for no cursor.
+    """
+    obs = np.empty(equipment.shape + (NUM_CHANNELS,), dtype=np.uint8)
+    np.equal(equipment[..., None], _EQUIPMENT_TYPES, out=obs[..., :AMOUNT_OFFSET].view(bool))
+    amounts = np.ceil(resources[..., AMOUNTS] / QUANTIZE_STEP)
+    np.minimum(amounts, 255, out=amounts)
+    obs[..., AMOUNT_OFFSET:CURSOR_CHANNEL] = amounts
+    obs[..., CURSOR_CHANNEL] = 0
+    if cursor is not None:
+        cursor = np.asarray(cursor)
+        batch = np.indices(equipment.shape[:-2])
+        obs[tuple(batch) + (cursor[..., 0], cursor[..., 1], CURSOR_CHANNEL)] = 1
+    return obs
@@ -0,0 +1,149 @@
+from .types import ResourceType
+import json
+import multiprocessing as mp
+import numpy as np
+import random
+from typing import Optional, Sequence
+
+def _fade(t: np.ndarray) -> np.ndarray:
+    return 6 * np.power(t, 5) - 15 * np.power(t, 4) + 10 * np.power(t, 3)
+
+def perlin(map_size: tuple[int, int], octaves: float, seed: int, scale: float = 64,
+        origin: tuple[int, int] = (0, 0)) -> np.ndarray:
+    """Evaluates `PerlinNoise(octaves, seed)([x / scale, y / scale])` for every cell of the map at once.
+
+    Gradients are drawn exactly like the `perlin_noise` package does, one
+    seeded `random.Random` per lattice corner, so the field matches the
+    per-cell calls for the same seed. `origin` offsets the evaluated region,
+    which gives the same values as the matching slice of a larger map.
+    """
+    cx = (np.arange(origin[0], origin[0] + map_size[0]) / scale) * octaves
+    cy = (np.arange(origin[1], origin[1] + map_size[1]) / scale) * octaves
+    x0, y0 = np.floor(cx).astype(np.int64), np.floor(cy).astype(np.int64)
+
+    # Gradient for every lattice corner touched by the map
+    gx = np.arange(x0.min(), x0.max() + 2)
+    gy = np.arange(y0.min(), y0.max() + 2)
+    grads = np.empty((len(gx), len(gy), 2))
+    for i, x in enumerate(gx):
+        for j, y in enumerate(gy):
+            rng = random.Random(seed * max(1, abs(int(x) + 10 * int(y) + 1)))
+            grads[i, j] = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+
+    noise = np.zeros(map_size)
+    for ox in (0, 1):
+        for oy in (0, 1):
+            dx = (cx - (x0 + ox))[:, None]
+            dy = (cy - (y0 + oy))[None, :]
+            grad = grads[x0 + ox - gx[0]][:, y0 + oy - gy[0]]
+            weight = _fade(1 - np.abs(dx)) * _fade(1 - np.abs(dy))
+            noise = noise + weight * (grad[..., 0] * dx + grad[..., 1] * dy)
+    return noise
+
+class TerrainGenerator:
+    """Generates coal and iron deposit layers by thresholding two Perlin noise fields.
+
+    `fixed_seeds`, a (coal, iron) pair of noise seeds, pins a layer to the
+    same field whatever seed `generate` is passed. Layers whose seed is
+    None are still derived from it.
+    """
+
+    def __init__(self, octaves: float = 6, scale: float = 64, coal_threshold: float = 0.2,
+            iron_threshold: float = 0.2, coal_amount: float = 250.0, iron_amount: float = 250.0,
+            fixed_seeds: Optional[tuple[Optional[int], Optional[int]]] = None):
+        self.octaves = octaves
+        self.scale = scale
+        self.coal_threshold = coal_threshold
+        self.iron_threshold = iron_threshold
+        self.coal_amount = coal_amount
+        self.iron_amount = iron_amount
+        self.fixed_seeds = fixed_seeds
+
+    def noise_seeds(self, seed: Optional[int] = None) -> tuple[int, int]:
+        """Derives the coal and iron noise seeds, drawing from `random` when `seed` is None."""
+        rng = random.Random(seed) if seed is not None else random
+        seeds = rng.randint(1, 10**5), rng.randint(1, 10**5)
+        if self.fixed_seeds is None:
+            return seeds
+        return tuple(derived if fixed is None else fixed for derived, fixed in zip(seeds, self.fixed_seeds))
+
+    def generate(self, map_size: tuple[int, int], seed: Optional[int] = None,
+            origin: tuple[int, int] = (0, 0)) -> np.ndarray:
+        """Returns a (W, H, 2) float32 array of coal and iron deposit amounts.
+
+        With an `origin` the array covers the region of that size starting
+        there, matching the same slice of a larger map generated with `seed`.
+        """
+        coal_seed, iron_seed = self.noise_seeds(seed)
+        deposits = np.zeros(tuple(map_size) + (2,), dtype=np.float32)
+        coal = perlin(map_size, self.octaves, coal_seed, self.scale, origin)
+        iron = perlin(map_size, self.octaves, iron_seed, self.scale, origin)
+        deposits[..., ResourceType.COAL_DEPOSIT][coal > self.coal_threshold] = self.coal_amount
+        deposits[..., ResourceType.IRON_DEPOSIT][iron > self.iron_threshold] = self.iron_amount
+        return deposits
+
+class TerrainPool:
+    """Deposit layers of many maps, pre-generated by `build_terrain_pool` into one `.npy` file.
+
+    The file is memory-mapped read-only, so processes opening the same pool
+    share its pages through the OS page cache. Pools pickle as their path,
+    and can be passed to worker processes as they are.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.maps = np.load(path, mmap_mode="r")
+        if self.maps.ndim != 4 or self.maps.shape[-1] != 2:
+            raise ValueError(f"{path} holds {self.maps.shape} arrays, expected (maps, W, H, 2) deposits")
+        self.map_size = self.maps.shape[1:3]
+        self.seeds = None
+        try:
+            with open(path + ".json") as f:
+                self.seeds = json.load(f)["seeds"]
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.maps)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        """(W, H, 2) deposits of map `i`, a read-only view of the file."""
+        return self.maps[i]
+
+    def sample(self, rng: random.Random) -> int:
+        """Index of a uniformly random map."""
+        return rng.randrange(len(self.maps))
+
+    def __reduce__(self):
+        return TerrainPool, (self.path,)
+
+def _fill_pool(args):
+    path, start, seeds, terrain = args
+    maps = np.load(path, mmap_mode="r+")
+    for i, seed in enumerate(seeds):
+        maps[start + i] = terrain.generate(maps.shape[1:3], seed)
+    maps.flush()
+
+def build_terrain_pool(path: str, map_size: tuple[int, int], seeds: Sequence[int],
+        terrain: Optional[TerrainGenerator] = None, workers: int = 1) -> TerrainPool:
+    """Writes `terrain.generate(map_size, seed)` for every seed to `path`, in `workers` processes.
+
+    Map i is generated from `seeds[i]` exactly as `Factory.set_terrain`
+    would. The seeds and generator settings are saved next to the pool in
+    `path + ".json"`.
+    """
+    terrain = terrain if terrain is not None else TerrainGenerator()
+    seeds = [int(seed) for seed in seeds]
+    maps = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(seeds),) + tuple(map_size) + (2,))
+    del maps
+    step = -(-len(seeds) // max(1, workers * 4)) if seeds else 1
+    jobs = [(path, start, seeds[start:start + step], terrain) for start in range(0, len(seeds), step)]
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            _fill_pool(job)
+    else:
+        with mp.Pool(min(workers, len(jobs))) as pool:
+            pool.map(_fill_pool, jobs)
+    with open(path + ".json", "w") as f:
+        json.dump({"map_size": list(map_size), "terrain": vars(terrain), "seeds": seeds}, f)
+    return TerrainPool(path)
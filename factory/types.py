@@ -1,7 +1,7 @@
-from enum import Enum, IntEnum, auto
+from enum import IntEnum, auto
 
-class EquipmentType(Enum):
-    EMPTY = auto()
+class EquipmentType(IntEnum):
+    EMPTY = 0
     LEFT_BELT = auto()
     RIGHT_BELT = auto()
     UP_BELT = auto()
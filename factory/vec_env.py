@@ -0,0 +1,160 @@
+import gymnasium as gym
+import numpy as np
+import random
+from typing import Optional
+
+from .engine import ArrayEngine
+from .env import FactoryAction, action_masks
+from .render import TileRenderer
+from .symbolic import observation_shape, symbolic_grid
+from .terrain import TerrainGenerator
+from .types import EquipmentType, ResourceType
+
+# Per-action lookup tables mirroring the branches of `FactoryEnv.step`
+ACTION_DX = np.zeros(len(FactoryAction), dtype=np.int64)
+ACTION_DY = np.zeros(len(FactoryAction), dtype=np.int64)
+ACTION_DX[FactoryAction.MOVE_CURSOR_LEFT] = -1
+ACTION_DX[FactoryAction.MOVE_CURSOR_RIGHT] = 1
+ACTION_DY[FactoryAction.MOVE_CURSOR_UP] = -1
+ACTION_DY[FactoryAction.MOVE_CURSOR_DOWN] = 1
+
+ACTION_BUILDS = np.full(len(FactoryAction), EquipmentType.EMPTY, dtype=np.int8)
+ACTION_BUILDS[FactoryAction.BUILD_LEFT_BELT] = EquipmentType.LEFT_BELT
+ACTION_BUILDS[FactoryAction.BUILD_RIGHT_BELT] = EquipmentType.RIGHT_BELT
+ACTION_BUILDS[FactoryAction.BUILD_UP_BELT] = EquipmentType.UP_BELT
+ACTION_BUILDS[FactoryAction.BUILD_DOWN_BELT] = EquipmentType.DOWN_BELT
+ACTION_BUILDS[FactoryAction.BUILD_MINE] = EquipmentType.MINE
+ACTION_BUILDS[FactoryAction.BUILD_FURNACE] = EquipmentType.FURNACE
+
+ACTION_COSTS = np.zeros(len(FactoryAction), dtype=np.float32)
+ACTION_COSTS[[FactoryAction.MOVE_CURSOR_LEFT, FactoryAction.MOVE_CURSOR_RIGHT,
+    FactoryAction.MOVE_CURSOR_UP, FactoryAction.MOVE_CURSOR_DOWN]] = 1.0
+ACTION_COSTS[[FactoryAction.BUILD_LEFT_BELT, FactoryAction.BUILD_RIGHT_BELT,
+    FactoryAction.BUILD_UP_BELT, FactoryAction.BUILD_DOWN_BELT]] = 5.0
+ACTION_COSTS[FactoryAction.BUILD_MINE] = 500.0
+ACTION_COSTS[FactoryAction.BUILD_FURNACE] = 1000.0
+
+RESOURCE_REWARDS = (
+    (ResourceType.PAPERCLIP, 20.0),
+    (ResourceType.STEEL, 10.0),
+    (ResourceType.IRON_ORE, 0.01),
+    (ResourceType.COAL_ORE, 0.01),
+)
+
+class FactoryVecEnv:
+    """Runs `num_envs` factories as stacked arrays stepped by one `ArrayEngine`.
+
+    Follows the dynamics and reward shaping of `FactoryEnv`, but takes an
+    action per environment and returns batched observations, rewards, dones
+    and infos. Environments that finish an episode are reset automatically;
+    their last observation is kept in `info['final_observation']`.
+    `info['action_mask']` holds `action_masks()` for the observations returned.
+    """
+
+    def __init__(self, num_envs: int, map_size=(32, 32), obs_size=(64, 64), max_steps=1000, asset_path="assets",
+            terrain: Optional[TerrainGenerator] = None, seed: Optional[int] = None, obs_mode: str = "rgb"):
+        self.num_envs = num_envs
+        self._rng = random.Random(seed) if seed is not None else random
+        self._terrain = terrain if terrain is not None else TerrainGenerator()
+        self._map_size = map_size
+        self._obs_size = obs_size
+        self._obs_shape = observation_shape(obs_mode, obs_size, map_size)
+        self._obs_mode = obs_mode
+        self._max_steps = max_steps
+        self._renderer = TileRenderer.for_asset_path(asset_path) if obs_mode == "rgb" else None
+
+        self._resources = np.zeros((num_envs, map_size[0], map_size[1], len(ResourceType)), dtype=np.float32)
+        self._equipment = np.zeros((num_envs, map_size[0], map_size[1]), dtype=np.int8)
+        self._cursor = np.zeros((num_envs, 2), dtype=np.int64)
+        self._steps = np.zeros(num_envs, dtype=np.int64)
+        self._engine = ArrayEngine(map_size, num_envs=num_envs)
+
+    @property
+    def observation_space(self):
+        """Returns a image or symbolic grid of one factory w.r.t. its cursor position"""
+        return gym.spaces.Box(low=0, high=255, shape=self._obs_shape, dtype=np.uint8)
+
+    @property
+    def action_space(self):
+        """Modifies one factory w.r.t. its cursor position"""
+        return gym.spaces.Discrete(len(FactoryAction))
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        envs = np.arange(self.num_envs)
+        self._steps += 1
+
+        # Cursor moves, clamped to the map like `Factory.move_cursor`
+        self._cursor[:, 0] = np.clip(self._cursor[:, 0] + ACTION_DX[actions], 0, self._map_size[0] - 1)
+        self._cursor[:, 1] = np.clip(self._cursor[:, 1] + ACTION_DY[actions], 0, self._map_size[1] - 1)
+        x, y = self._cursor[:, 0], self._cursor[:, 1]
+
+        # Destroys
+        destroy = np.flatnonzero(actions == FactoryAction.DESTROY_EQUIPMENT)
+        destroy = destroy[self._equipment[destroy, x[destroy], y[destroy]] != EquipmentType.EMPTY]
+        self._equipment[destroy, x[destroy], y[destroy]] = EquipmentType.EMPTY
+        for env in destroy:
+            self._engine.remove((x[env], y[env]), env)
+
+        # Builds, belts facing off the map are placed but never move anything
+        types = ACTION_BUILDS[actions]
+        build = (types != EquipmentType.EMPTY) & (self._equipment[envs, x, y] == EquipmentType.EMPTY)
+        self._equipment[build, x[build], y[build]] = types[build]
+        horizontal = (types == EquipmentType.LEFT_BELT) | (types == EquipmentType.RIGHT_BELT)
+        vertical = (types == EquipmentType.UP_BELT) | (types == EquipmentType.DOWN_BELT)
+        inert = (horizontal & ((x == 0) | (x == self._map_size[0] - 1))) \
+            | (vertical & ((y == 0) | (y == self._map_size[1] - 1)))
+        build &= ~inert
+        self._engine.add_batch(types[build], x[build], y[build], envs[build])
+
+        changes = self._engine.step(self._resources)
+        rewards = -ACTION_COSTS[actions]
+        for resource, weight in RESOURCE_REWARDS:
+            rewards += changes[:, resource] * weight
+
+        dones = self._steps >= self._max_steps
+        obs = self.observe()
+        info = {'resources': self._resources[envs, x, y].copy()}
+        if dones.any():
+            info['final_observation'] = obs.copy()
+            for env in np.flatnonzero(dones):
+                self._reset_env(env)
+            obs[dones] = self.observe(np.flatnonzero(dones))
+        info['action_mask'] = self.action_masks()
+
+        return obs, rewards, dones, info
+
+    def action_masks(self) -> np.ndarray:
+        """(num_envs, len(FactoryAction)) masks of the actions that would change each factory."""
+        x, y = self._cursor[:, 0], self._cursor[:, 1]
+        occupied = self._equipment[np.arange(self.num_envs), x, y] != EquipmentType.EMPTY
+        return action_masks(self._cursor, occupied, self._map_size)
+
+    def reset(self):
+        for env in range(self.num_envs):
+            self._reset_env(env)
+        return self.observe()
+
+    def _reset_env(self, env: int):
+        self._steps[env] = 0
+        self._cursor[env] = (self._rng.randint(0, self._map_size[0] - 1), self._rng.randint(0, self._map_size[1] - 1))
+        self._equipment[env] = EquipmentType.EMPTY
+        self._engine.clear(env)
+        self._resources[env] = 0.0
+        self._resources[env, :, :, ResourceType.COAL_DEPOSIT:ResourceType.IRON_DEPOSIT+1] = \
+            self._terrain.generate(self._map_size, self._rng.getrandbits(32))
+
+    def observe(self, envs=None) -> np.ndarray:
+        """Renders the window around each cursor, for all or only the given environments."""
+        envs = np.arange(self.num_envs) if envs is None else np.asarray(envs)
+        cursor = self._cursor[envs]
+        if self._obs_mode == "symbolic_map":
+            return symbolic_grid(self._resources[envs], self._equipment[envs], cursor)
+        roi = np.minimum(np.maximum(cursor - 4, 0), np.array(self._map_size) - 8)
+        x = roi[:, 0, None, None] + np.arange(8)[:, None]
+        y = roi[:, 1, None, None] + np.arange(8)[None, :]
+        env = envs[:, None, None]
+        if self._obs_mode == "symbolic":
+            return symbolic_grid(self._resources[env, x, y], self._equipment[env, x, y], cursor - roi)
+        keys = self._renderer.keys(self._resources[env, x, y], self._equipment[env, x, y], cursor - roi)
+        return self._renderer.render(keys)
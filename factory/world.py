@@ -0,0 +1,103 @@
+import numpy as np
+from typing import Callable, Optional
+
+from .types import ResourceType
+
+class ChunkedWorld:
+    """Resource grid stored as square chunks that are allocated on first access.
+
+    A table maps every chunk of the map to its slot in a growable pool of
+    (chunk_size, chunk_size, len(ResourceType)) arrays, or -1 while the chunk
+    was never touched. Cells are addressed by flat index into the pool, see
+    `cells` and `flat`, so memory follows the area in use rather than the map.
+    `fill` is called with the zeroed (w, h, len(ResourceType)) view and map
+    origin of each chunk as it is allocated, e.g. to generate its terrain.
+    """
+
+    def __init__(self, map_size: tuple[int, int], chunk_size: int = 16,
+            fill: Optional[Callable[[np.ndarray, int, int], None]] = None):
+        self.map_size = map_size
+        self.chunk_size = chunk_size
+        self.fill = fill
+        self._table = np.full((-(-map_size[0] // chunk_size), -(-map_size[1] // chunk_size)), -1, dtype=np.int64)
+        self._origins = np.zeros((16, 2), dtype=np.int64)
+        self.chunks = np.zeros((16, chunk_size, chunk_size, len(ResourceType)), dtype=np.float32)
+        self.num_chunks = 0
+
+    @property
+    def flat(self) -> np.ndarray:
+        """(cells, len(ResourceType)) view of the pool, invalidated when the pool grows."""
+        return self.chunks.reshape(-1, len(ResourceType))
+
+    def cells(self, x, y):
+        """Returns the flat pool index of each cell (x, y), allocating chunks as needed."""
+        cs = self.chunk_size
+        cx, cy = np.divmod(np.asarray(x), cs), np.divmod(np.asarray(y), cs)
+        slots = self._table[cx[0], cy[0]]
+        if np.any(slots < 0):
+            self._allocate(cx[0], cy[0])
+            slots = self._table[cx[0], cy[0]]
+        return (slots * cs + cx[1]) * cs + cy[1]
+
+    def positions(self, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Inverse of `cells`, returns the map coordinates of flat pool indices."""
+        cs = self.chunk_size
+        slots, local = np.divmod(cells, cs * cs)
+        lx, ly = np.divmod(local, cs)
+        return self._origins[slots, 0] + lx, self._origins[slots, 1] + ly
+
+    def window(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Returns a copy of the (w, h, len(ResourceType)) resources starting at (x, y)."""
+        gx, gy = np.meshgrid(np.arange(x, x + w), np.arange(y, y + h), indexing='ij')
+        cells = self.cells(gx, gy)
+        return self.flat[cells]
+
+    def set_window(self, x: int, y: int, values: np.ndarray, channels=slice(None)):
+        """Writes a (w, h, channels) array into the resources starting at (x, y)."""
+        w, h = values.shape[:2]
+        gx, gy = np.meshgrid(np.arange(x, x + w), np.arange(y, y + h), indexing='ij')
+        cells = self.cells(gx, gy)
+        self.flat[cells, channels] = values
+
+    def snapshot(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns read-only copies of the chunk table, chunk origins and allocated chunks."""
+        n = self.num_chunks
+        arrays = (self._table.copy(), self._origins[:n].copy(), self.chunks[:n].copy())
+        for array in arrays:
+            array.flags.writeable = False
+        return arrays
+
+    def load(self, table: np.ndarray, origins: np.ndarray, chunks: np.ndarray):
+        """Restores the chunks from a `snapshot`."""
+        n = len(chunks)
+        while n > len(self.chunks):
+            self.chunks = np.concatenate([self.chunks, np.zeros_like(self.chunks)])
+            self._origins = np.concatenate([self._origins, np.zeros_like(self._origins)])
+        self._table[:] = table
+        self._origins[:n] = origins
+        self.chunks[:n] = chunks
+        self.num_chunks = n
+
+    def clear(self):
+        """Frees every chunk, the next access allocates and fills them again."""
+        self._table[:] = -1
+        self.num_chunks = 0
+
+    def _allocate(self, cx: np.ndarray, cy: np.ndarray):
+        missing = self._table[cx, cy] < 0
+        coords = np.unique(np.stack([np.ravel(cx[missing]), np.ravel(cy[missing])], axis=1), axis=0)
+        n = len(coords)
+        while self.num_chunks + n > len(self.chunks):
+            self.chunks = np.concatenate([self.chunks, np.zeros_like(self.chunks)])
+            self._origins = np.concatenate([self._origins, np.zeros_like(self._origins)])
+
+        slots = np.arange(self.num_chunks, self.num_chunks + n)
+        self.num_chunks += n
+        self._table[coords[:, 0], coords[:, 1]] = slots
+        self._origins[slots] = coords * self.chunk_size
+        self.chunks[slots] = 0.0
+        if self.fill is not None:
+            for slot, (ox, oy) in zip(slots, self._origins[slots]):
+                w = min(self.chunk_size, self.map_size[0] - ox)
+                h = min(self.chunk_size, self.map_size[1] - oy)
+                self.fill(self.chunks[slot, :w, :h], int(ox), int(oy))
@@ -51,6 +51,7 @@ def main():
         map = factory.render()
         screen.blit(pygame.surfarray.make_surface(map), (0, 0))
         screen.blit(reward_font.render(f"reward: {total_reward:.2f}", 1, (0, 0, 0)), (10, 10))
+        screen.blit(reward_font.render(f"tiles rendered: {factory.tiles_rendered}", 1, (0, 0, 0)), (10, 25))
         pygame.display.flip()
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # Environments load their sprites from the relative "assets" directory
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+import pytest
+
+from factory.env import FactoryAction, FactoryEnv, action_masks
+from factory.vec_env import FactoryVecEnv
+
+def changes(env: FactoryEnv, action: int) -> bool:
+    cursor, equipment = env._factory.get_cursor(), env._factory._equipment_map.copy()
+    env.step(action)
+    return cursor != env._factory.get_cursor() or not np.array_equal(equipment, env._factory._equipment_map)
+
+@pytest.mark.parametrize("engine", ["object", "array"])
+def test_mask_marks_actions_that_change_the_factory(engine):
+    env = FactoryEnv(seed=0, engine=engine, map_size=(12, 12), max_steps=10**6)
+    env.reset()
+    rng = random.Random(0)
+    for _ in range(1000):
+        mask = env.action_mask()
+        action = rng.randrange(len(FactoryAction))
+        if action == FactoryAction.WAIT:
+            env.step(action)
+            continue
+        assert changes(env, action) == mask[action]
+
+def test_masks_at_corner():
+    masks = action_masks([[0, 0], [4, 4]], [True, False], (5, 5))
+    assert not masks[0, FactoryAction.MOVE_CURSOR_LEFT] and not masks[0, FactoryAction.MOVE_CURSOR_UP]
+    assert masks[0, FactoryAction.MOVE_CURSOR_RIGHT] and masks[0, FactoryAction.DESTROY_EQUIPMENT]
+    assert not masks[0, FactoryAction.BUILD_MINE]
+    assert not masks[1, FactoryAction.MOVE_CURSOR_RIGHT] and not masks[1, FactoryAction.MOVE_CURSOR_DOWN]
+    assert masks[1, FactoryAction.BUILD_MINE] and not masks[1, FactoryAction.DESTROY_EQUIPMENT]
+    assert masks[:, FactoryAction.WAIT].all()
+
+def test_vec_env_masks():
+    env = FactoryVecEnv(4, seed=0)
+    env.reset()
+    _, _, _, info = env.step(np.full(4, FactoryAction.BUILD_MINE))
+    assert info["action_mask"].shape == (4, len(FactoryAction))
+    assert not info["action_mask"][:, FactoryAction.BUILD_MINE].any()
+    assert info["action_mask"][:, FactoryAction.DESTROY_EQUIPMENT].all()
+
+def test_skip_invalid_keeps_valid_dynamics():
+    plain = FactoryEnv(seed=3, engine="array")
+    skipping = FactoryEnv(seed=3, engine="array", skip_invalid=True)
+    plain.reset()
+    last = skipping.reset()
+    rng = random.Random(1)
+    skipped = 0
+    for _ in range(500):
+        action = rng.randrange(len(FactoryAction))
+        obs, reward, _, info = skipping.step(action)
+        if info["skipped"]:
+            skipped += 1
+            assert obs is last and reward == 0.0
+            continue
+        expected, expected_reward, _, _ = plain.step(action)
+        assert np.array_equal(obs, expected) and reward == expected_reward
+        last = obs
+    assert skipped > 0
+
+def test_skipped_actions_end_the_episode():
+    env = FactoryEnv(seed=0, max_steps=20, frame_skip=2, skip_invalid=True)
+    env.reset()
+    env._factory._x = 0
+    done = False
+    for _ in range(10):
+        assert not done
+        _, _, done, info = env.step(FactoryAction.MOVE_CURSOR_LEFT)
+        assert info["skipped"]
+    assert done
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from factory.env import FactoryAction, FactoryEnv
+from factory.factory import Factory
+from factory.types import EquipmentType, ResourceType
+
+from test_engine import MAP_SIZE, make_factory
+
+def steady_factory(engine: str) -> Factory:
+    """Mines feeding belt lines into furnaces, which settle into moving the same amounts every tick."""
+    factory = make_factory(engine, seed=0)
+    deposits = np.zeros(MAP_SIZE + (2,), dtype=np.float32)
+    deposits[2:14, 2:14] = 1e6
+    factory.set_deposits(deposits)
+    for y in (3, 7, 11):
+        factory.build_equipment(EquipmentType.MINE, (2, y))
+        for x in range(3, 9):
+            factory.build_equipment(EquipmentType.RIGHT_BELT, (x, y))
+        factory.build_equipment(EquipmentType.FURNACE, (9, y))
+    return factory
+
+@pytest.mark.parametrize("engine", ["object", "array", "graph"])
+def test_advance_matches_stepping(engine):
+    stepped, advanced = steady_factory(engine), steady_factory(engine)
+    totals = np.zeros(len(ResourceType))
+    for _ in range(500):
+        totals += [value for value in stepped.step().values()]
+    changes = advanced.advance(500)
+    w, h = MAP_SIZE
+    assert np.array_equal(stepped.get_resource_window(0, 0, w, h), advanced.get_resource_window(0, 0, w, h))
+    assert np.allclose([changes[resource] for resource in ResourceType], totals)
+    assert totals[ResourceType.STEEL] > 0
+
+@pytest.mark.parametrize("engine", ["object", "array", "graph"])
+@pytest.mark.parametrize("pos", [(0, 5), (5, 0), (0, 0)])
+def test_advance_with_only_edge_furnaces(engine, pos):
+    # Furnaces against the top or left edge read no cells at all
+    env = FactoryEnv(seed=0, engine=engine, max_steps=10**6)
+    env.reset()
+    env._factory.build_equipment(EquipmentType.FURNACE, pos)
+    _, reward, _, _ = env.fast_forward(50)
+    assert reward == 0.0
+    _, reward, _, _ = env.step(FactoryAction.WAIT, ticks=7)
+    assert reward == 0.0
+
+def test_profiler_counts_ticks():
+    env = FactoryEnv(seed=0, engine="array", frame_skip=4, instrument=True)
+    env.reset()
+    for _ in range(5):
+        env.step(FactoryAction.WAIT)
+    env.fast_forward(10)
+    stats = env.stats()
+    assert stats["steps"]["count"] == 6
+    assert stats["phases"]["simulate"]["count"] == 30
@@ -0,0 +1,90 @@
+import random
+
+import numpy as np
+import pytest
+
+from factory.factory import Factory
+from factory.types import EquipmentType, ResourceType
+
+MAP_SIZE = (16, 16)
+BUILDABLE = [EquipmentType.LEFT_BELT, EquipmentType.RIGHT_BELT, EquipmentType.UP_BELT, EquipmentType.DOWN_BELT,
+    EquipmentType.MINE, EquipmentType.FURNACE]
+
+def add_deposits(factory: Factory, seed: int):
+    """Coal and iron deposits on a random half of the cells."""
+    rng = random.Random(seed)
+    for x in range(MAP_SIZE[0]):
+        for y in range(MAP_SIZE[1]):
+            if rng.random() < 0.5:
+                factory.add_resource(x, y, rng.choice([ResourceType.COAL_DEPOSIT, ResourceType.IRON_DEPOSIT]), 1000)
+
+def make_factory(engine: str, seed: int = 0) -> Factory:
+    factory = Factory(map_size=MAP_SIZE, engine=engine)
+    add_deposits(factory, seed)
+    return factory
+
+def random_ops(seed: int, steps: int):
+    """Per step, None or a ("build", type, pos) / ("destroy", pos) operation."""
+    rng = random.Random(seed)
+    ops = []
+    for _ in range(steps):
+        pos = (rng.randrange(MAP_SIZE[0]), rng.randrange(MAP_SIZE[1]))
+        roll = rng.random()
+        if roll < 0.3:
+            ops.append(("build", rng.choice(BUILDABLE), pos))
+        elif roll < 0.4:
+            ops.append(("destroy", pos))
+        else:
+            ops.append(None)
+    return ops
+
+def apply(factory: Factory, op):
+    if op is None:
+        return
+    if op[0] == "build":
+        factory.build_equipment(op[1], op[2])
+    else:
+        factory.destroy_equipment(op[1])
+
+def snapshot(factory: Factory):
+    """Resources and equipment of every cell."""
+    cells = [(x, y) for x in range(MAP_SIZE[0]) for y in range(MAP_SIZE[1])]
+    resources = np.array([[factory.get_resources(x, y)[r] for r in ResourceType] for x, y in cells])
+    equipment = np.array([factory.get_equipment(x, y) for x, y in cells])
+    return resources, equipment
+
+def trajectory(factory: Factory, ops):
+    for op in ops:
+        apply(factory, op)
+        changes = factory.step()
+        yield snapshot(factory) + (np.array([changes[resource] for resource in ResourceType]),)
+
+def assert_same_trajectory(expected, actual):
+    produced = 0.0
+    for t, ((res, eq, changes), (res2, eq2, changes2)) in enumerate(zip(expected, actual)):
+        assert np.array_equal(eq, eq2), f"equipment differs at step {t}"
+        assert np.array_equal(res, res2), f"resources differ at step {t}"
+        assert np.array_equal(changes, changes2), f"resource changes differ at step {t}"
+        produced += changes[ResourceType.COAL_ORE] + changes[ResourceType.IRON_ORE]
+    assert produced > 0
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_array_engine_matches_object_engine(seed):
+    ops = random_ops(seed, 300)
+    assert_same_trajectory(trajectory(make_factory("object", seed), ops), trajectory(make_factory("array", seed), ops))
+
+@pytest.mark.parametrize("engine", ["object", "array"])
+def test_dirty_cells_cover_every_change(engine):
+    factory = make_factory(engine, 4)
+    factory.pop_dirty()
+    before = snapshot(factory)
+    for op in random_ops(4, 300):
+        apply(factory, op)
+        factory.step()
+        after = snapshot(factory)
+        changed = (before[0] != after[0]).any(axis=1) | (before[1] != after[1])
+        x, y = factory.pop_dirty()
+        dirty = np.zeros(MAP_SIZE, dtype=bool)
+        dirty[x, y] = True
+        assert not (changed & ~dirty.ravel()).any()
+        before = after
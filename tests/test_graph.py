@@ -0,0 +1,28 @@
+import numpy as np
+
+from factory.graph import FlowGraph
+
+from test_engine import make_factory, random_ops, trajectory
+
+def test_depth_counts_belts_from_source():
+    # 0 is a mine, belts on 1..3 pull downstream in a line, 4 pulls from 2
+    graph = FlowGraph(np.array([3, 1, 2, 4]), np.array([2, 0, 1, 2]))
+    assert graph.depth.tolist() == [3, 1, 2, 3]
+    assert graph.belt_at(np.array([0, 1, 2, 3, 4, 5])).tolist() == [-1, 1, 2, 0, 3, -1]
+
+def test_cycles_are_cut_at_their_lowest_cell():
+    # 5 -> 6 -> 7 -> 5 feed each other, 8 pulls from 7
+    graph = FlowGraph(np.array([7, 8, 6, 5]), np.array([6, 7, 5, 7]))
+    assert graph.depth.tolist() == [3, 4, 2, 1]
+
+def test_empty_graph():
+    graph = FlowGraph(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    assert graph.belt_at(np.array([0, 1])).tolist() == [-1, -1]
+
+def test_graph_engine_conserves_resources():
+    # Contention is settled in another order, so only the totals of each tick must agree
+    ops = random_ops(3, 300)
+    for (res, eq, _), (res2, eq2, _) in zip(trajectory(make_factory("object", 3), ops),
+            trajectory(make_factory("graph", 3), ops)):
+        assert np.array_equal(eq, eq2)
+        assert np.allclose(res.sum(axis=0), res2.sum(axis=0))
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from factory.env import FactoryAction, FactoryEnv
+from factory.equipment import Furnace
+from factory.factory import Factory
+from factory.types import EquipmentType, ResourceType
+from test_engine import MAP_SIZE
+
+jax = pytest.importorskip("jax")
+from factory.jax_core import from_factory, stack, step
+
+NUM_ENVS = 3
+STEPS = 150
+
+def assert_matches(env: FactoryEnv, state, reward, expected_reward, where: str):
+    expected = from_factory(env._factory, max_equipment=len(state.order))
+    for name in ("resources", "equipment", "is_cooking", "time_left", "cursor"):
+        assert np.array_equal(np.asarray(getattr(state, name)), np.asarray(getattr(expected, name))), \
+            f"{name} differs {where}"
+    # XLA fuses the reward's multiply-adds, so it may round differently
+    assert np.isclose(np.float32(reward), np.float32(expected_reward), rtol=1e-6, atol=1e-6), f"reward differs {where}"
+
+def test_step_matches_object_engine():
+    """Random episodes played in FactoryEnv and in jax_core, one at a time and under vmap, from the same start."""
+    envs = [FactoryEnv(seed=i, engine="object", obs_mode="symbolic", max_steps=10**9) for i in range(NUM_ENVS)]
+    for env in envs:
+        env.reset()
+    states = [from_factory(env._factory, max_equipment=256) for env in envs]
+    batch = stack(states)
+    single_step, batch_step = jax.jit(step), jax.jit(jax.vmap(step))
+
+    rng = np.random.default_rng(0)
+    # Bias towards building so that factories actually produce and furnaces compete for ore
+    weights = np.ones(len(FactoryAction))
+    weights[[FactoryAction.BUILD_MINE, FactoryAction.BUILD_FURNACE, FactoryAction.WAIT]] = 3.0
+    actions = rng.choice(len(FactoryAction), size=(STEPS, NUM_ENVS), p=weights / weights.sum())
+    for t in range(STEPS):
+        batch, batch_rewards = batch_step(batch, actions[t])
+        for i, env in enumerate(envs):
+            _, expected_reward, _, _ = env.step(int(actions[t, i]))
+            states[i], reward = single_step(states[i], actions[t, i])
+            where = f"in env {i} at step {t} ({FactoryAction(actions[t, i]).name})"
+            assert_matches(env, states[i], reward, expected_reward, where)
+            batched = jax.tree_util.tree_map(lambda array: array[i], batch)
+            assert_matches(env, batched, batch_rewards[i], expected_reward, "under vmap " + where)
+
+def crowded_factory(seed: int) -> Factory:
+    """A row of small coal and iron deposits under mines, lined with furnaces and belts built in random order.
+
+    Every furnace's window overlaps its neighbours' and the belts', and the
+    ore runs short, so who is stepped first decides who gets it.
+    """
+    rng = np.random.default_rng(seed)
+    factory = Factory(map_size=MAP_SIZE, engine="object")
+    builds = []
+    for x in range(1, MAP_SIZE[0] - 1):
+        deposit = ResourceType.COAL_DEPOSIT if x % 2 else ResourceType.IRON_DEPOSIT
+        factory.add_resource(x, 5, deposit, float(rng.choice([3, 5, 8, 60])))
+        builds.append((EquipmentType.MINE, (x, 5)))
+        builds.append((EquipmentType.FURNACE, (x, 6)))
+        builds.append((EquipmentType.UP_BELT if x % 2 else EquipmentType.FURNACE, (x, 4)))
+        builds.append((EquipmentType.LEFT_BELT, (x, 3)))
+    for i in rng.permutation(len(builds)):
+        factory.build_equipment(*builds[i])
+    return factory
+
+def test_tick_matches_object_engine_under_contention():
+    seeds = [0, 1, 2, 3]
+    factories = [crowded_factory(seed) for seed in seeds]
+    batch_step = jax.jit(jax.vmap(step))
+    wait = np.full(len(seeds), FactoryAction.WAIT)
+    started = 0
+    for t in range(40):
+        batch, _ = batch_step(stack([from_factory(factory) for factory in factories]), wait)
+        for i, factory in enumerate(factories):
+            factory.step()
+            expected = from_factory(factory)
+            for name in ("resources", "is_cooking", "time_left"):
+                assert np.array_equal(np.asarray(getattr(batch, name)[i]), np.asarray(getattr(expected, name))), \
+                    f"{name} differs for seed {seeds[i]} at step {t}"
+            started += int((np.asarray(expected.time_left) == Furnace.cook_time).sum())
+    assert started > 0
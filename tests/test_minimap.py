@@ -0,0 +1,24 @@
+import random
+
+import numpy as np
+import pytest
+
+from factory.env import FactoryAction, FactoryEnv
+from factory.minimap import CURSOR_CHANNEL, EQUIPMENT_OFFSET, Minimap
+
+@pytest.mark.parametrize("engine", ["object", "array"])
+def test_incremental_minimap_matches_rebuilt(engine):
+    env = FactoryEnv(seed=0, engine=engine, map_size=(20, 12), obs_mode="symbolic", minimap=(6, 4))
+    env.reset()
+    rng = random.Random(0)
+    for _ in range(300):
+        obs, _, _, _ = env.step(rng.randrange(len(FactoryAction)))
+    w, h = env._map_size
+    rebuilt = Minimap(env._map_size, (6, 4))
+    rebuilt.reset(env._factory.get_resource_window(0, 0, w, h), env._factory.get_equipment_window(0, 0, w, h))
+    assert np.array_equal(obs["minimap"], rebuilt.render(env._factory.get_cursor()))
+    assert obs["minimap"][..., EQUIPMENT_OFFSET:CURSOR_CHANNEL].any()
+
+def test_minimap_rejects_chunked_maps():
+    with pytest.raises(ValueError):
+        FactoryEnv(chunk_size=8, minimap=(4, 4))
@@ -0,0 +1,38 @@
+import numpy as np
+
+from factory.env import FactoryAction, FactoryEnv
+from factory.pool import FactoryEnvPool
+from factory.types import ResourceType
+
+KWARGS = dict(map_size=(12, 12), max_steps=30, engine="array", obs_mode="symbolic")
+
+def test_pool_matches_sequential_envs():
+    num_envs, rng = 3, np.random.default_rng(0)
+    envs = [FactoryEnv(**KWARGS, seed=10 + i) for i in range(num_envs)]
+    with FactoryEnvPool(num_envs, num_workers=2, seed=10, **KWARGS) as pool:
+        obs = pool.reset()
+        assert np.array_equal(obs, np.stack([env.reset() for env in envs]))
+        for _ in range(70):
+            actions = rng.integers(len(FactoryAction), size=num_envs)
+            obs, rewards, dones, info = pool.step(actions)
+            for i, env in enumerate(envs):
+                expected, reward, done, expected_info = env.step(actions[i])
+                assert rewards[i] == np.float32(reward) and dones[i] == done
+                assert np.allclose(info["resources"][i], [expected_info["resources"][r] for r in ResourceType])
+                if done:
+                    assert np.allclose(info["final_resources"][i], env.resource_totals())
+                    expected = env.reset()
+                assert np.array_equal(obs[i], expected)
+            assert np.array_equal(pool.action_masks(), np.stack([env.action_mask() for env in envs]))
+
+def test_seeded_reset_without_observations():
+    with FactoryEnvPool(2, num_workers=1, observe=False, **KWARGS) as pool:
+        obs = pool.reset(seeds=[4, 4])
+        assert not obs.any()
+        pool.step(np.full(2, FactoryAction.BUILD_MINE))
+        masks = pool.action_masks()
+    assert np.array_equal(masks[0], masks[1])
+    env = FactoryEnv(**KWARGS, seed=0)
+    env.reset(seed=4)
+    env.step(FactoryAction.BUILD_MINE)
+    assert np.array_equal(masks[0], env.action_mask())
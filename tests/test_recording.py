@@ -0,0 +1,28 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from factory.env import FactoryAction, FactoryEnv
+from factory.recording import ActionLog, EpisodeRecorder
+from factory.replay import summarize
+
+@pytest.mark.parametrize("skip_invalid", [False, True])
+def test_action_log_replays_observations(tmp_path, skip_invalid):
+    env = FactoryEnv(seed=0, engine="array", obs_mode="symbolic", max_steps=60, frame_skip=2,
+        skip_invalid=skip_invalid)
+    recorder = EpisodeRecorder(env, str(tmp_path), keyframe_interval=7)
+    frames = [recorder.reset()]
+    rng, done = random.Random(0), False
+    while not done:
+        obs, _, done, _ = recorder.step(rng.randrange(len(FactoryAction)))
+        frames.append(obs)
+    path, = [os.path.join(tmp_path, name) for name in os.listdir(tmp_path)]
+
+    log = ActionLog(path)
+    assert len(log) == len(frames) - 1
+    assert np.array_equal(np.stack(list(log.frames())), np.stack(frames))
+    for t in (17, 3, len(log), 0):
+        assert np.array_equal(log[t], frames[t])
+    assert summarize(path)["length"] == len(log)
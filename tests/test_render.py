@@ -0,0 +1,42 @@
+import random
+
+import numpy as np
+import pytest
+
+from factory.env import FactoryAction, FactoryEnv
+from factory.render import draw_tile, load_assets, set_block
+
+pytest.importorskip("cv2")
+
+def reference_observation(env: FactoryEnv, assets: dict) -> np.ndarray:
+    """The cursor's window drawn sprite by sprite, as observations were before tiles were cached."""
+    obs = np.full((64, 64, 3), 255, dtype=np.uint8)
+    cursor = env._factory.get_cursor()
+    roi = (min(max(0, cursor[0] - 4), env._map_size[0] - 8), min(max(0, cursor[1] - 4), env._map_size[1] - 8))
+    resources = env._factory.get_resource_window(*roi, 8, 8)
+    equipment = env._factory.get_equipment_window(*roi, 8, 8)
+    for x in range(8):
+        for y in range(8):
+            draw_tile(obs, x, y, resources[x, y], equipment[x, y], assets)
+    set_block(obs, cursor[0] - roi[0], cursor[1] - roi[1], assets["cursor.png"])
+    return obs, roi
+
+@pytest.mark.parametrize("kwargs", [
+    dict(engine="object"),
+    dict(engine="array", frame_skip=3),
+    dict(engine="graph", lazy=True),
+    dict(engine="array", chunk_size=8),
+])
+def test_observations_match_sprite_drawing(kwargs):
+    assets = load_assets("assets")
+    env = FactoryEnv(seed=0, map_size=(24, 20), max_steps=10**6, **kwargs)
+    obs = env.reset()
+    rng = random.Random(0)
+    rois = set()
+    for _ in range(600):
+        expected, roi = reference_observation(env, assets)
+        assert np.array_equal(np.asarray(obs), expected), f"observation differs at view {roi}"
+        rois.add(roi)
+        obs = env.step(rng.randrange(len(FactoryAction)))[0]
+    # The view scrolled in both directions
+    assert len({x for x, _ in rois}) > 3 and len({y for _, y in rois}) > 3
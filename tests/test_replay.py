@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+from factory.replay import Episode, ReplayIndex, convert, summarize
+
+def write_episode(path: str, length: int, seed: int = 0, compressed: bool = True):
+    rng = np.random.default_rng(seed)
+    save = np.savez_compressed if compressed else np.savez
+    save(path, image=rng.integers(0, 256, (length, 8, 8, 3), dtype=np.uint8),
+        reward=rng.normal(size=length).astype(np.float32), action=rng.integers(0, 9, length))
+    return path
+
+def test_compressed_and_converted_episodes_read_the_same(tmp_path):
+    src = write_episode(str(tmp_path / "a.npz"), 20)
+    dst = str(tmp_path / "b.npz")
+    convert(src, dst)
+    with np.load(src) as data, Episode(src) as compressed, Episode(dst) as stored:
+        assert not compressed.mappable("image") and stored.mappable("image")
+        assert isinstance(stored["image"], np.memmap)
+        assert len(compressed) == len(stored) == 20
+        for episode in (compressed, stored):
+            assert np.array_equal(episode["reward"], data["reward"])
+            frames = list(episode.frames("image", 5, 12))
+            assert np.array_equal(np.stack(frames), data["image"][5:12])
+    assert summarize(src) == {**summarize(dst), "file": "a.npz"}
+
+def test_index_ranks_and_refreshes(tmp_path):
+    for i, length in enumerate([5, 30, 12]):
+        write_episode(str(tmp_path / f"{i}.npz"), length, seed=i)
+    index = ReplayIndex(str(tmp_path))
+    assert [entry["file"] for entry in index.top(2, by="length")] == ["1.npz", "2.npz"]
+    returns = {entry["file"]: entry["return"] for entry in index.entries}
+    assert max(returns, key=returns.get) == index.top(1)[0]["file"]
+
+    write_episode(str(tmp_path / "3.npz"), 50, seed=3)
+    os.remove(tmp_path / "0.npz")
+    index = ReplayIndex(str(tmp_path))
+    assert [entry["file"] for entry in index.entries] == ["1.npz", "2.npz", "3.npz"]
+    assert index.top(1, by="length")[0]["file"] == "3.npz"
@@ -0,0 +1,58 @@
+import random
+
+import numpy as np
+import pytest
+
+from factory.env import FactoryAction, FactoryEnv
+from factory.env import INITIAL_TERRAIN
+from factory.state import FactoryState
+from factory.terrain import TerrainGenerator
+
+def play(env: FactoryEnv, seed: int, steps: int) -> list:
+    rng = random.Random(seed)
+    return [env.step(rng.randrange(len(FactoryAction)))[:2] for _ in range(steps)]
+
+@pytest.mark.parametrize("engine,chunk_size", [("object", None), ("array", None), ("array", 8)])
+def test_restored_state_continues_identically(engine, chunk_size):
+    env = FactoryEnv(seed=0, engine=engine, chunk_size=chunk_size, max_steps=10**6)
+    env.reset()
+    play(env, 0, 200)
+    state = env.get_state()
+    expected = play(env, 1, 200)
+    totals = env.resource_totals()
+
+    restored = FactoryEnv(seed=5, engine=engine, chunk_size=chunk_size, max_steps=10**6)
+    restored.reset()
+    for snapshot in (state, FactoryState.from_bytes(state.to_bytes())):
+        restored.set_state(snapshot)
+        actual = play(restored, 1, 200)
+        assert all(np.array_equal(a[0], e[0]) and a[1] == e[1] for a, e in zip(actual, expected))
+        assert np.array_equal(restored.resource_totals(), totals)
+
+@pytest.mark.parametrize("terrain", [TerrainGenerator(octaves=4, coal_threshold=0.0, iron_threshold=0.0, fixed_seeds=(7, 9)), None])
+def test_bytes_keep_the_terrain_of_chunks_not_generated_yet(terrain):
+    # Without a terrain the state is taken before reset(), on `INITIAL_TERRAIN`
+    env = FactoryEnv(seed=0, engine="array", map_size=(32, 32), chunk_size=8, obs_mode="symbolic", terrain=terrain)
+    if terrain is not None:
+        env.reset()
+    state = env.get_state()
+    generator, seed = state.terrain
+    restored = FactoryState.from_bytes(state.to_bytes()).terrain
+    assert vars(restored[0]) == vars(generator) and restored[1] == seed
+    assert type(restored[0].octaves) is int
+
+    # Every chunk but the cursor's is generated only after restoring
+    expected = (terrain or INITIAL_TERRAIN).generate((32, 32), seed)
+    assert expected.any()
+    for snapshot in (state, FactoryState.from_bytes(state.to_bytes())):
+        other = FactoryEnv(seed=1, engine="array", map_size=(32, 32), chunk_size=8, obs_mode="symbolic")
+        other.set_state(snapshot)
+        assert np.array_equal(other._factory.get_resource_window(0, 0, 32, 32)[..., :2], expected)
+
+def test_state_is_not_changed_by_later_steps():
+    env = FactoryEnv(seed=0, engine="array")
+    first = env.reset()
+    state = env.get_state()
+    play(env, 0, 100)
+    assert np.array_equal(env.set_state(state), first)
+    assert env.get_state().steps == 0
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from factory.env import FactoryEnv
+from factory.terrain import TerrainGenerator, perlin
+from factory.types import ResourceType
+
+def test_perlin_matches_package():
+    PerlinNoise = pytest.importorskip("perlin_noise").PerlinNoise
+    noise = PerlinNoise(octaves=6, seed=7)
+    expected = np.array([[noise([x / 64, y / 64]) for y in range(12)] for x in range(10)])
+    assert np.allclose(perlin((10, 12), 6, 7), expected)
+
+def test_origin_matches_slice():
+    terrain = TerrainGenerator()
+    full = terrain.generate((24, 24), seed=3)
+    assert np.array_equal(terrain.generate((8, 10), seed=3, origin=(16, 5)), full[16:24, 5:15])
+
+def test_initial_iron_is_fixed():
+    iron = perlin((20, 24), 6, 1) > 0.3
+    for seed in (None, 0, 5):
+        env = FactoryEnv(map_size=(20, 24), seed=seed, engine="array", obs_mode="symbolic")
+        deposits = env._factory.get_resource_window(0, 0, 20, 24)[..., ResourceType.IRON_DEPOSIT]
+        assert np.array_equal(deposits > 0, iron)
+    assert iron.any()
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from factory.factory import Factory
+from factory.terrain import TerrainGenerator
+from factory.types import ResourceType
+
+from test_engine import MAP_SIZE, assert_same_trajectory, random_ops
+
+TERRAIN = TerrainGenerator(iron_threshold=0.3, coal_amount=1000.0, iron_amount=1000.0)
+
+def trajectory(factory: Factory, ops):
+    w, h = MAP_SIZE
+    for op in ops:
+        if op is not None and op[0] == "build":
+            factory.build_equipment(op[1], op[2])
+        elif op is not None:
+            factory.destroy_equipment(op[1])
+        changes = factory.step()
+        yield (factory.get_resource_window(0, 0, w, h).copy(), factory.get_equipment_window(0, 0, w, h).copy(),
+            np.array([changes[resource] for resource in ResourceType]))
+
+def make_factory(chunk_size, seed: int) -> Factory:
+    factory = Factory(map_size=MAP_SIZE, engine="array", chunk_size=chunk_size)
+    factory.set_terrain(TERRAIN, seed)
+    return factory
+
+@pytest.mark.parametrize("chunk_size", [4, 5, 16])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_chunked_world_matches_dense(chunk_size, seed):
+    ops = random_ops(seed, 300)
+    assert_same_trajectory(trajectory(make_factory(None, seed), ops), trajectory(make_factory(chunk_size, seed), ops))
+
+def test_chunks_generate_on_first_access():
+    factory = make_factory(4, 0)
+    dense = make_factory(None, 0)
+    assert not factory.get_resource_totals().any()
+    # Exactly one chunk
+    window = dense.get_resource_window(4, 8, 4, 4)
+    assert np.array_equal(factory.get_resource_window(4, 8, 4, 4), window)
+    assert np.allclose(factory.get_resource_totals(), window.sum(axis=(0, 1)))
+    assert window.any()